@@ -0,0 +1,110 @@
+"""
+Show the query plans and timings of the hot collection lookups with and without the
+indexes from migrations/add_lookup_indexes.py.
+
+    python benchmarks/index_query_plans.py [--rows 1000000] [--database-url URL]
+
+Without --database-url a throwaway SQLite file is used. Never point it at a real database:
+the tables are filled with generated rows.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+parser.add_argument('--rows', type=int, default=1000000, help='number of collection rows to generate')
+parser.add_argument('--repeat', type=int, default=200, help='executions per query when timing')
+parser.add_argument('--database-url', default=None)
+args = parser.parse_args()
+
+# main.py reads DATABASE_URL at import time
+workdir = tempfile.mkdtemp(prefix='photogenic-bench-')
+os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+sys.path.append(os.path.join(parent_dir, 'migrations'))
+
+from main import app, db, User, Collection, SharedFile, UserFavorites, UserTrash
+from add_lookup_indexes import create_indexes, drop_indexes
+
+USERS = 1000
+CHUNK = 50000
+
+
+def fill(rows):
+    files_per_user = max(rows // USERS, 1)
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x',
+         'reset_token': f'token{i}'}
+        for i in range(1, USERS + 1)
+    ])
+
+    batch = []
+    for i in range(rows):
+        owner = i // files_per_user % USERS + 1
+        folder = f'folder{i % 50}'
+        batch.append({'owner_id': owner, 'path': f'{folder}/photo{i}.jpg', 'parent_path': folder,
+                      'name': f'photo{i}.jpg', 'is_folder': False, 'size': 1024})
+        if len(batch) == CHUNK:
+            db.session.execute(Collection.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Collection.__table__.insert(), batch)
+
+    side_rows = max(rows // 10, 1)
+    db.session.execute(SharedFile.__table__.insert(), [
+        {'owner_id': i % USERS + 1, 'shared_with_id': (i + 7) % USERS + 1, 'path': f'folder{i % 50}/photo{i}.jpg'}
+        for i in range(side_rows)
+    ])
+    db.session.execute(UserFavorites.__table__.insert(), [
+        {'user_id': i % USERS + 1, 'file_path': f'folder{i % 50}/photo{i}.jpg'} for i in range(side_rows)
+    ])
+    db.session.execute(UserTrash.__table__.insert(), [
+        {'user_id': i % USERS + 1, 'file_path': f'trash/photo{i}.jpg', 'original_path': f'photo{i}.jpg'}
+        for i in range(side_rows)
+    ])
+    db.session.commit()
+
+
+def hot_queries():
+    """The lookups behind verify_collection_ownership, listings, get_collection_file, favorites, trash and reset"""
+    return {
+        'collection by owner+path': Collection.query.filter_by(path='folder3/photo503.jpg', owner_id=1),
+        'collection listing': Collection.query.filter_by(owner_id=1, parent_path='folder3'),
+        'shared file check': SharedFile.query.filter_by(path='folder3/photo3.jpg', owner_id=4, shared_with_id=11),
+        'favorite toggle': UserFavorites.query.filter_by(user_id=2, file_path='folder1/photo1.jpg'),
+        'trash listing': UserTrash.query.filter_by(user_id=2),
+        'reset token': User.query.filter_by(reset_token='token500'),
+    }
+
+
+def explain(query):
+    sql = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = db.session.execute(db.text(prefix + sql)).fetchall()
+    return ' | '.join(str(row[-1]) for row in rows)
+
+
+def report(label):
+    print(f"\n== {label} ==")
+    for name, query in hot_queries().items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            query.all()
+        elapsed = (time.perf_counter() - start) / args.repeat * 1000
+        print(f"{name:28} {elapsed:9.3f} ms  {explain(query)}")
+
+
+with app.app_context():
+    db.drop_all()
+    db.create_all()
+    drop_indexes()
+    print(f"Generating {args.rows} collection rows...")
+    fill(args.rows)
+
+    report('without indexes')
+    create_indexes()
+    report('with indexes')
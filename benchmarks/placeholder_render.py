@@ -0,0 +1,86 @@
+"""
+Time the animation placeholder frame: the per-pixel gradient loop it used to run against the NumPy
+gradient, and a full frame with a cold and a warm background cache. Then time the image placeholder
+of /generate-ai-image rendered from scratch against a repeated request served from its stored file.
+
+    python benchmarks/placeholder_render.py [--repeat 20] [--width 800 --height 600]
+
+The gradients of both implementations are compared for every palette before timing.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+parser.add_argument('--repeat', type=int, default=20, help='renders per measurement')
+parser.add_argument('--width', type=int, default=800)
+parser.add_argument('--height', type=int, default=600)
+args = parser.parse_args()
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from main import app, ANIMATION_PLACEHOLDER_PALETTES, render_animation_gradient, generate_animation_placeholder_image, \
+    render_placeholder_image, generate_placeholder_image
+
+
+def loop_gradient(palette, width, height):
+    """The nested loop generate_animation_placeholder_image ran before, driven by the same palette"""
+    base, x_weight, y_weight, _ = ANIMATION_PLACEHOLDER_PALETTES[palette]
+    gradient = np.zeros((height, width, 3), dtype=np.uint8)
+    for y in range(height):
+        for x in range(width):
+            gradient[y, x] = [int(base[c] + (x / width) * x_weight[c] + (y / height) * y_weight[c]) for c in range(3)]
+    return gradient
+
+
+def measure(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+for palette in ANIMATION_PLACEHOLDER_PALETTES:
+    if not np.array_equal(loop_gradient(palette, args.width, args.height),
+                          render_animation_gradient(palette, args.width, args.height)):
+        sys.exit(f"Gradient of palette {palette!r} differs from the loop implementation")
+print(f"Gradients identical for {len(ANIMATION_PLACEHOLDER_PALETTES)} palettes at {args.width}x{args.height}\n")
+
+size = (args.width, args.height)
+loop_ms = measure(lambda: loop_gradient('picsart', *size), max(args.repeat // 10, 1))
+numpy_ms = measure(lambda: render_animation_gradient('picsart', *size), args.repeat)
+
+
+def cold_frame():
+    main._animation_backgrounds.clear()
+    generate_animation_placeholder_image('Title', 'A prompt', providers='picsart', width=args.width, height=args.height)
+
+
+cold_ms = measure(cold_frame, args.repeat)
+warm_ms = measure(lambda: generate_animation_placeholder_image(
+    'Title', 'A prompt', providers='picsart', width=args.width, height=args.height), args.repeat)
+
+print(f"{'gradient, per-pixel loop':32} {loop_ms:9.2f} ms")
+print(f"{'gradient, numpy':32} {numpy_ms:9.2f} ms  ({loop_ms / numpy_ms:.0f}x)")
+print(f"{'frame, background not cached':32} {cold_ms:9.2f} ms")
+print(f"{'frame, background cached':32} {warm_ms:9.2f} ms  ({cold_ms / warm_ms:.1f}x)")
+
+
+def uncached_placeholder():
+    main._placeholder_backgrounds.clear()
+    main._fonts.clear()
+    render_placeholder_image('A prompt', 'realistic', '', args.width, args.height)
+
+
+with app.test_request_context():
+    render_ms = measure(uncached_placeholder, args.repeat)
+    generate_placeholder_image('A prompt', 'realistic', width=args.width, height=args.height)
+    repeat_ms = measure(lambda: generate_placeholder_image(
+        'A prompt', 'realistic', width=args.width, height=args.height), args.repeat)
+
+print(f"{'placeholder, rendered':32} {render_ms:9.2f} ms")
+print(f"{'placeholder, repeated request':32} {repeat_ms:9.2f} ms  ({render_ms / repeat_ms:.0f}x)")
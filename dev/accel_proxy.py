@@ -0,0 +1,81 @@
+"""
+Local stand-in for the nginx X-Accel-Redirect setup, so FILE_DELIVERY=x-accel can be tried without a proxy.
+
+    python dev/accel_proxy.py [--port 5000]
+
+The app is wrapped in AccelRedirectEmulator. Responses carrying X-Accel-Redirect are replaced by the
+mapped file, served with werkzeug's Range and conditional request handling, the way an internal nginx
+location would. Internal locations cannot be requested directly.
+"""
+import argparse
+import os
+import sys
+from urllib.parse import unquote
+
+from werkzeug.utils import send_file
+from werkzeug.wrappers import Response
+
+# Headers nginx keeps from the upstream response when following X-Accel-Redirect
+PASSTHROUGH_HEADERS = ('Content-Type', 'Content-Disposition', 'Cache-Control', 'Expires', 'Set-Cookie')
+
+
+class AccelRedirectEmulator:
+	"""WSGI middleware that follows X-Accel-Redirect to files, like nginx internal locations"""
+
+	def __init__(self, app, locations):
+		# locations: (internal URI prefix, directory) pairs
+		self.app = app
+		self.locations = [(prefix.rstrip('/') + '/', os.path.realpath(directory)) for prefix, directory in locations]
+
+	def resolve(self, uri):
+		for prefix, directory in self.locations:
+			if uri.startswith(prefix):
+				file_path = os.path.realpath(os.path.join(directory, unquote(uri[len(prefix):])))
+				if file_path.startswith(directory + os.sep) and os.path.isfile(file_path):
+					return file_path
+		return None
+
+	def __call__(self, environ, start_response):
+		# Like nginx 'internal': clients cannot fetch protected locations themselves
+		if any(environ.get('PATH_INFO', '').startswith(prefix) for prefix, _ in self.locations):
+			return Response('Not Found', status=404)(environ, start_response)
+
+		response = Response.from_app(self.app, environ)
+		internal_uri = response.headers.get('X-Accel-Redirect')
+		if not internal_uri:
+			return response(environ, start_response)
+
+		file_path = self.resolve(internal_uri)
+		if file_path is None:
+			return Response('Not Found', status=404)(environ, start_response)
+
+		file_response = send_file(file_path, environ, mimetype=response.mimetype, conditional=True)
+		for header in PASSTHROUGH_HEADERS:
+			values = response.headers.getlist(header)
+			if values:
+				file_response.headers.setlist(header, values)
+		file_response.headers['X-Delivered-By'] = 'accel-proxy-emulator'
+		return file_response(environ, start_response)
+
+
+def wrap(app):
+	"""Wrap a Flask app from main.py with the emulator using its ACCEL_REDIRECT_LOCATIONS"""
+	import main
+	app.wsgi_app = AccelRedirectEmulator(
+		app.wsgi_app,
+		[(location, root) for root, location in main.ACCEL_REDIRECT_LOCATIONS]
+	)
+	return app
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Run the app behind an X-Accel-Redirect emulator')
+	parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+	args = parser.parse_args()
+
+	# main.py reads FILE_DELIVERY at import time
+	os.environ['FILE_DELIVERY'] = 'x-accel'
+	sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+	from main import app
+
+	wrap(app).run(host='127.0.0.1', port=args.port, debug=False)
@@ -1,7 +1,8 @@
 from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, session, flash, \
-	send_file
+	send_file, g
 import os
 import shutil
+import stat
 import time
 import json
 import re
@@ -24,19 +25,27 @@ import sys
 import traceback
 import uuid
 import threading
+import fcntl
+from concurrent.futures import ThreadPoolExecutor
 import openai
 from openai.types.chat import ChatCompletionSystemMessageParam, ChatCompletionUserMessageParam
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_mail import Mail, Message
 from authlib.integrations.flask_client import OAuth
-from urllib.parse import urlparse, unquote
+from urllib.parse import urlparse, unquote, quote
 from threading import Thread
 from openai import OpenAI
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageOps
 import replicate
 import hashlib
+import hmac
 import mimetypes
+import posixpath
 from flask_migrate import Migrate
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import validates
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-key-for-sessions')
@@ -65,6 +74,14 @@ class User(db.Model, UserMixin):
 	api_keys = db.Column(db.String(1000), nullable=True, default='{}')  # Store user's API keys as JSON string
 	reset_token = db.Column(db.String(32), nullable=True)
 	reset_token_expiration = db.Column(db.DateTime, nullable=True)
+	# Bytes of the user's collection files and trash, kept current by the operations that change them
+	storage_used = db.Column(db.BigInteger, nullable=False, default=0)
+	# Last time reconcile_storage_usage confirmed storage_used against the disk
+	storage_checked_at = db.Column(db.DateTime, nullable=True)
+
+	__table_args__ = (
+		db.Index('uq_user_reset_token', 'reset_token', unique=True),
+	)
 
 	# Add relationship to Collection
 	collections = db.relationship('Collection', backref='owner', lazy='dynamic')
@@ -100,14 +117,28 @@ class Collection(db.Model):
 	__tablename__ = 'collection'
 	id = db.Column(db.Integer, primary_key=True)
 	path = db.Column(db.String(255), nullable=False)
+	# Directory part of path ('' for top-level items), used to list a folder without touching the disk
+	parent_path = db.Column(db.String(255), nullable=True)
 	name = db.Column(db.String(255), nullable=False)
 	is_folder = db.Column(db.Boolean, default=False)
-	size = db.Column(db.Integer, nullable=True)
+	size = db.Column(db.BigInteger, nullable=True)
 	mime_type = db.Column(db.String(100), nullable=True)
+	# SHA-256 of the content; the file is a hard link to BLOBS_ROOT/<hash[:2]>/<hash>
+	content_hash = db.Column(db.String(64), nullable=True)
 	created_at = db.Column(db.DateTime, default=datetime.utcnow)
 	modified_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 	owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+	__table_args__ = (
+		db.Index('uq_collection_owner_path', 'owner_id', 'path', unique=True),
+		db.Index('ix_collection_owner_parent', 'owner_id', 'parent_path'),
+	)
+
+	@validates('path')
+	def _sync_parent_path(self, key, value):
+		self.parent_path = posixpath.dirname(value.strip('/')) if value else ''
+		return value
+
 	def to_dict(self):
 		item = {
 			'id': self.id,
@@ -123,11 +154,14 @@ class Collection(db.Model):
 
 		if not self.is_folder:
 			item['size'] = self.size
-			item['url'] = url_for('get_collection_file', path=self.path)
+			item['version'] = get_file_version(self.size, self.modified_at)
+			item['url'] = url_for('get_collection_file', path=self.path, v=item['version'])
 
 			# Add preview URL for images
 			if is_image_file(self.name):
-				item['preview'] = url_for('get_collection_thumbnail', path=self.path)
+				item['preview'] = url_for('get_collection_thumbnail', path=self.path, v=item['version'])
+				# Larger renditions: same URL with ?size=<px>
+				item['previewSizes'] = list(THUMBNAIL_SIZES)
 				item['isImage'] = True
 
 		return item
@@ -147,6 +181,11 @@ class SharedFile(db.Model):
 	shared_with = db.relationship('User', foreign_keys=[shared_with_id],
 	                              backref=db.backref('shared_with_me', lazy='dynamic'))
 
+	__table_args__ = (
+		db.Index('uq_shared_file_owner_grantee_path', 'owner_id', 'shared_with_id', 'path', unique=True),
+		db.Index('ix_shared_file_grantee_path', 'shared_with_id', 'path'),
+	)
+
 
 # User Favorites model
 class UserFavorites(db.Model):
@@ -156,6 +195,48 @@ class UserFavorites(db.Model):
 	file_path = db.Column(db.String(500), nullable=False)
 	created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+	__table_args__ = (
+		db.Index('uq_user_favorites_user_path', 'user_id', 'file_path', unique=True),
+	)
+
+
+# Folder listing index: the directory mtime the Collection rows of a folder were last reconciled against
+class FolderIndex(db.Model):
+	__tablename__ = 'folder_index'
+	id = db.Column(db.Integer, primary_key=True)
+	owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+	path = db.Column(db.String(255), nullable=False)
+	dir_mtime = db.Column(db.BigInteger, nullable=True)
+	scanned_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+	__table_args__ = (
+		db.UniqueConstraint('owner_id', 'path', name='uq_folder_index_owner_path'),
+	)
+
+
+# Resumable upload: bytes are appended to a .part file until received reaches total_size
+class UploadSession(db.Model):
+	__tablename__ = 'upload_session'
+	id = db.Column(db.String(32), primary_key=True)
+	owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+	path = db.Column(db.String(255), nullable=False)
+	filename = db.Column(db.String(255), nullable=False)
+	mime_type = db.Column(db.String(100), nullable=True)
+	total_size = db.Column(db.BigInteger, nullable=False)
+	received = db.Column(db.BigInteger, nullable=False, default=0)
+	created_at = db.Column(db.DateTime, default=datetime.utcnow)
+	updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+	def to_dict(self):
+		return {
+			'upload_id': self.id,
+			'path': self.path,
+			'filename': self.filename,
+			'size': self.total_size,
+			'offset': self.received,
+			'chunk_size': UPLOAD_CHUNK_SIZE
+		}
+
 
 # User Trash model
 class UserTrash(db.Model):
@@ -165,6 +246,36 @@ class UserTrash(db.Model):
 	file_path = db.Column(db.String(500), nullable=False)
 	original_path = db.Column(db.String(500), nullable=False)
 	deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+	# Bytes the item still counts towards the owner's storage_used until it is purged
+	size = db.Column(db.BigInteger, nullable=True)
+	# Shares and favorites taken off the live path while the item is trashed, as JSON relative to the item
+	shares = db.Column(db.Text, nullable=True)
+	favorites = db.Column(db.Text, nullable=True)
+	# The item's Collection rows (content hashes included) as JSON relative to the item, re-created on restore
+	contents = db.Column(db.Text, nullable=True)
+
+	__table_args__ = (
+		db.Index('ix_user_trash_user', 'user_id'),
+	)
+
+
+class Activity(db.Model):
+	"""Append-only log behind the recent feed; user_id is the user whose feed the entry appears in"""
+	__tablename__ = 'activity'
+	id = db.Column(db.Integer, primary_key=True)
+	user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+	actor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+	owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+	path = db.Column(db.String(255), nullable=False)
+	# upload, open, share or edit
+	action = db.Column(db.String(20), nullable=False)
+	created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+	__table_args__ = (
+		db.Index('ix_activity_user_ts', 'user_id', 'created_at'),
+		# Finds newer entries for the same item, so the feed lists each item once
+		db.Index('ix_activity_user_item', 'user_id', 'owner_id', 'path'),
+	)
 
 
 # Initialize the database if it doesn't exist
@@ -236,9 +347,83 @@ def load_user(user_id):
 UPLOAD_FOLDER = os.path.join(app.static_folder, 'uploads')
 COLLECTIONS_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'collections')
 THUMBNAILS_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thumbnails')
+# Partial files of resumable uploads; kept under COLLECTIONS_ROOT so finalizing is a same-filesystem rename
+UPLOAD_SESSIONS_ROOT = os.path.join(COLLECTIONS_ROOT, '.uploads')
+# Content-addressed store: identical uploads are hard links to one blob, so it must share a filesystem
+# with the collections. A blob's link count is its reference count (1 = only the store's own link).
+BLOBS_ROOT = os.path.join(COLLECTIONS_ROOT, '.blobs')
+DEDUP_UPLOADS = os.environ.get('DEDUP_UPLOADS', '1') != '0'
+# Deleted items are moved here until their transaction commits
+DELETE_STAGING_ROOT = os.path.join(COLLECTIONS_ROOT, '.deleting')
+# Per-user trash areas, TRASH_ROOT/<user_id>/<storage key>: outside the listed tree but on the same
+# filesystem, so trashing and restoring are renames. Items are purged TRASH_RETENTION after trashing.
+TRASH_ROOT = os.path.join(COLLECTIONS_ROOT, '.trash')
+TRASH_RETENTION = timedelta(days=int(os.environ.get('TRASH_RETENTION_DAYS', 30)))
+TRASH_PURGE_INTERVAL = int(os.environ.get('TRASH_PURGE_INTERVAL', 60 * 60))
+TRASH_PURGE_BATCH = 500
+# Storage accounting: User.storage_used counts the bytes of a user's files, trash included, and changes in
+# the same transaction as the upload, delete or purge. Deduplicated files count in full for every user
+# holding them. A reconciliation pass recomputes the counters from disk. STORAGE_QUOTA 0 means unlimited.
+STORAGE_QUOTA = int(os.environ.get('STORAGE_QUOTA', 0))
+STORAGE_RECONCILE_INTERVAL = int(os.environ.get('STORAGE_RECONCILE_INTERVAL', 24 * 60 * 60))
+STORAGE_SCAN_WORKERS = int(os.environ.get('STORAGE_SCAN_WORKERS', 4))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(COLLECTIONS_ROOT, exist_ok=True)
 os.makedirs(THUMBNAILS_ROOT, exist_ok=True)
+os.makedirs(UPLOAD_SESSIONS_ROOT, exist_ok=True)
+os.makedirs(BLOBS_ROOT, exist_ok=True)
+
+# Image renditions (longest edge in px) rendered once per image; the smallest is the gallery thumbnail
+THUMBNAIL_SIZES = tuple(sorted({int(size) for size in os.environ.get('THUMBNAIL_SIZES', '240,640,1280,2048').split(',')}))
+THUMBNAIL_FORMAT = os.environ.get('THUMBNAIL_FORMAT', 'WEBP').upper()
+Image.init()
+if THUMBNAIL_FORMAT not in Image.SAVE:
+	print(f"Thumbnail format {THUMBNAIL_FORMAT} is not supported by this Pillow build, using WEBP")
+	THUMBNAIL_FORMAT = 'WEBP'
+THUMBNAIL_EXTENSION = next(ext for ext, fmt in Image.registered_extensions().items() if fmt == THUMBNAIL_FORMAT)
+THUMBNAIL_MIMETYPE = Image.MIME.get(THUMBNAIL_FORMAT)
+# Cache lifetime of file and thumbnail URLs that carry the current ?v= version
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Signed direct-download URLs handed out in shared listings. They stay valid for at least SIGNED_URL_TTL
+# seconds; the expiry is rounded up to SIGNED_URL_WINDOW so repeated listings return the same URL and
+# browsers keep their cached copy. Revoking a share does not revoke URLs already handed out.
+SIGNED_URL_TTL = int(os.environ.get('SIGNED_URL_TTL', 6 * 60 * 60))
+SIGNED_URL_WINDOW = 60 * 60
+SIGNED_URL_KEY = hmac.new(app.secret_key.encode(), b'collection-signed-url', hashlib.sha256).digest()
+
+# File delivery: 'flask' streams bytes through this process. 'x-accel' only authorizes and answers with an
+# X-Accel-Redirect to an internal nginx location, e.g.
+#     location /_protected/collections/ { internal; alias /srv/photogenic/collections/; }
+#     location /_protected/thumbnails/ { internal; alias /srv/photogenic/thumbnails/; }
+# 'x-sendfile' sends the absolute path in X-Sendfile for Apache mod_xsendfile or lighttpd.
+FILE_DELIVERY = os.environ.get('FILE_DELIVERY', 'flask')
+ACCEL_REDIRECT_LOCATIONS = (
+	(COLLECTIONS_ROOT, os.environ.get('ACCEL_COLLECTIONS_LOCATION', '/_protected/collections/')),
+	(THUMBNAILS_ROOT, os.environ.get('ACCEL_THUMBNAILS_LOCATION', '/_protected/thumbnails/'))
+)
+app.use_x_sendfile = FILE_DELIVERY == 'x-sendfile'
+THUMBNAIL_SAVE_OPTIONS = {
+	'WEBP': {'quality': 80, 'method': 4},
+	'AVIF': {'quality': 60},
+	'JPEG': {'quality': 85, 'optimize': True}
+}
+
+# ZIP downloads: already-compressed formats are stored as is, everything else is deflated
+ZIP_STORED_EXTENSIONS = {
+	'.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.heif', '.avif',
+	'.mp4', '.m4v', '.mov', '.webm', '.mkv', '.mp3', '.m4a', '.aac', '.ogg',
+	'.zip', '.gz', '.7z', '.rar'
+}
+ZIP_STREAM_CHUNK = 1024 * 1024
+
+# Largest batch accepted by /api/collections/bulk
+BULK_MAX_OPERATIONS = 1000
+
+# Resumable uploads: clients send chunks of at most UPLOAD_CHUNK_SIZE (below MAX_CONTENT_LENGTH)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_SIZE', 20 * 1024 * 1024 * 1024))
+UPLOAD_SESSION_TTL = timedelta(hours=24)
 
 
 # Helper function to get user collections directory
@@ -275,20 +460,27 @@ def verify_collection_ownership(path, user_id):
     Verify that the specified collection belongs to the user according to database records.
     For folders, checks if any parent folder is owned by the user.
     Returns True if the collection is owned by the user, False otherwise.
+    The exact path and all ancestors are checked in one query; results are cached for the request.
     """
-	# Exact path match
-	collection = Collection.query.filter_by(path=path, owner_id=user_id).first()
-	if collection:
-		return True
+	cache = g.setdefault('collection_ownership', {})
+	cache_key = (path, user_id)
+	if cache_key in cache:
+		return cache[cache_key]
+
+	# Exact path match, or any ancestor folder (including the root) owned by the user
+	parts = path.split('/') if path else []
+	ancestors = ['/'.join(parts[:i]) for i in range(len(parts))]
+	match = db.session.query(Collection.id).filter(
+		Collection.owner_id == user_id,
+		db.or_(
+			Collection.path == path,
+			db.and_(Collection.path.in_(ancestors), Collection.is_folder == True)
+		)
+	).first()
 
-	# For folders, check parent folders
-	if path:
-		parts = path.split('/')
-		for i in range(len(parts)):
-			parent_path = '/'.join(parts[:i]) if i > 0 else ''
-			parent = Collection.query.filter_by(path=parent_path, is_folder=True, owner_id=user_id).first()
-			if parent:
-				return True
+	if match:
+		cache[cache_key] = True
+		return True
 
 	# For new paths that don't exist in DB yet, default to filesystem check
 	filesystem_check = verify_directory_ownership(path, user_id)
@@ -298,9 +490,215 @@ def verify_collection_ownership(path, user_id):
 		app.logger.warning(
 			f"Unauthorized access attempt: User {user_id} tried to access path '{path}' which is outside their directory")
 
+	cache[cache_key] = filesystem_check
 	return filesystem_check
 
 
+# --- Activity log ---
+# Uploads, opens, shares and edits are appended to Activity and the recent feed reads it back through
+# the (user_id, created_at) index. Opens are logged at most once per ACTIVITY_OPEN_THROTTLE per item.
+ACTIVITY_OPEN_THROTTLE = 10 * 60
+ACTIVITY_RETENTION = timedelta(days=int(os.environ.get('ACTIVITY_RETENTION_DAYS', 180)))
+ACTIVITY_TRIM_INTERVAL = 24 * 60 * 60
+_recent_opens = {}
+_recent_opens_lock = threading.Lock()
+
+
+def log_activity(user_id, action, owner_id, path, actor_id=None):
+	"""Append an entry to user_id's feed; the caller commits"""
+	db.session.add(Activity(
+		user_id=user_id,
+		actor_id=actor_id or user_id,
+		owner_id=owner_id,
+		path=path.strip('/'),
+		action=action
+	))
+
+
+def log_file_open(user_id, owner_id, path):
+	"""Record that user_id opened a file; repeated opens (range requests, reloads) are throttled"""
+	key = (user_id, owner_id, path.strip('/'))
+	now = time.monotonic()
+	with _recent_opens_lock:
+		last = _recent_opens.get(key)
+		if last is not None and now - last < ACTIVITY_OPEN_THROTTLE:
+			return
+		if len(_recent_opens) > 10000:
+			_recent_opens.clear()
+		_recent_opens[key] = now
+
+	try:
+		log_activity(user_id, 'open', owner_id, path)
+		db.session.commit()
+	except Exception as e:
+		db.session.rollback()
+		app.logger.error(f"Error logging open of {path} by user {user_id}: {str(e)}")
+
+
+def get_recent_feed(user_id, limit, cursor=None):
+	"""
+    Items the user recently uploaded, opened, edited or had shared with them, newest first, each listed
+    once at its latest activity. Keyset-paged on (created_at, id); cursor is an opaque token.
+    Items that are gone, or no longer shared, are left out. Returns (items, next_cursor).
+    """
+	key = decode_listing_cursor(cursor, 'activity', 'desc') if cursor else None
+	if key is not None and len(key) != 2:
+		raise ValueError('Invalid cursor')
+
+	newer = db.aliased(Activity)
+	superseded = db.exists().where(
+		newer.user_id == Activity.user_id,
+		newer.owner_id == Activity.owner_id,
+		newer.path == Activity.path,
+		db.or_(newer.created_at > Activity.created_at,
+		       db.and_(newer.created_at == Activity.created_at, newer.id > Activity.id))
+	)
+	query = db.session.query(Activity, Collection).join(
+		Collection, db.and_(Collection.owner_id == Activity.owner_id, Collection.path == Activity.path)
+	).filter(
+		Activity.user_id == user_id,
+		~superseded
+	).order_by(Activity.created_at.desc(), Activity.id.desc())
+
+	# Entries of items no longer shared are skipped, so keep reading until the page is full
+	accepted = []
+	batch_size = limit + 1
+	while len(accepted) <= limit:
+		batch = query
+		if key is not None:
+			batch = batch.filter(db.or_(
+				Activity.created_at < key[0],
+				db.and_(Activity.created_at == key[0], Activity.id < key[1])
+			))
+		rows = batch.limit(batch_size).all()
+		for activity, row in rows:
+			key = (activity.created_at, activity.id)
+			if activity.owner_id == user_id or get_share_grants(activity.owner_id, user_id).covers(activity.path):
+				accepted.append((activity, row))
+				if len(accepted) > limit:
+					break
+		if len(rows) < batch_size:
+			break
+
+	next_cursor = None
+	if len(accepted) > limit:
+		accepted = accepted[:limit]
+		last = accepted[-1][0]
+		next_cursor = encode_listing_cursor('activity', 'desc', (last.created_at, last.id))
+
+	owner_ids = {activity.owner_id for activity, _ in accepted if activity.owner_id != user_id}
+	owner_names = dict(db.session.query(User.id, User.username).filter(User.id.in_(owner_ids)).all()) if owner_ids else {}
+
+	items = []
+	for activity, row in accepted:
+		item = row.to_dict()
+		item['isDir'] = bool(row.is_folder)
+		item['activity'] = activity.action
+		item['activityTime'] = activity.created_at.isoformat()
+		if activity.owner_id != user_id:
+			item['shared_by'] = owner_names.get(activity.owner_id)
+			add_signed_urls(item, activity.owner_id)
+		items.append(item)
+	return items, next_cursor
+
+
+def trim_activity_log():
+	"""Drop feed entries older than ACTIVITY_RETENTION in one DELETE; returns the number removed"""
+	removed = Activity.query.filter(
+		Activity.created_at < datetime.utcnow() - ACTIVITY_RETENTION
+	).delete(synchronize_session=False)
+	db.session.commit()
+	app.logger.info(f"Activity trim removed {removed} entries")
+	return removed
+
+
+# --- Shared-folder grant cache ---
+# Paths one owner shared with one grantee, kept as a prefix trie so deep navigation inside a
+# shared tree is a segment walk. Entries are dropped when this process changes shares and
+# expire after SHARE_GRANT_TTL seconds so other workers pick up new shares.
+SHARE_GRANT_TTL = 30
+SHARE_GRANT_MAX_ENTRIES = 10000
+_share_grants = {}
+_share_grants_lock = threading.Lock()
+
+
+class ShareGrantTrie:
+	"""Prefix trie over the path segments shared by one owner with one grantee"""
+	__slots__ = ('children', 'granted')
+
+	def __init__(self):
+		self.children = {}
+		self.granted = False
+
+	def add(self, path):
+		node = self
+		for segment in path.strip('/').split('/'):
+			node = node.children.setdefault(segment, ShareGrantTrie())
+		node.granted = True
+
+	def node(self, path):
+		"""Return the trie node for path, or None if path is not on any shared branch"""
+		node = self
+		for segment in path.strip('/').split('/'):
+			node = node.children.get(segment)
+			if node is None:
+				return None
+		return node
+
+	def covers(self, path):
+		"""True if path is a shared item or lies inside one (not the folders merely leading to one)"""
+		node = self
+		for segment in path.strip('/').split('/'):
+			node = node.children.get(segment)
+			if node is None:
+				return False
+			if node.granted:
+				return True
+		return False
+
+	def allows(self, path):
+		"""True if path is a shared item, lies inside one, or is a folder leading to one"""
+		if not path.strip('/'):
+			return False
+		node = self
+		for segment in path.strip('/').split('/'):
+			if node.granted:
+				return True
+			node = node.children.get(segment)
+			if node is None:
+				return False
+		return True
+
+
+def get_share_grants(owner_id, grantee_id):
+	"""Return the cached ShareGrantTrie for an (owner, grantee) pair, loading it on a miss"""
+	key = (owner_id, grantee_id)
+	now = time.monotonic()
+	with _share_grants_lock:
+		entry = _share_grants.get(key)
+	if entry and now - entry[0] < SHARE_GRANT_TTL:
+		return entry[1]
+
+	trie = ShareGrantTrie()
+	for (shared_path,) in db.session.query(SharedFile.path).filter_by(owner_id=owner_id, shared_with_id=grantee_id):
+		trie.add(shared_path)
+
+	with _share_grants_lock:
+		if len(_share_grants) >= SHARE_GRANT_MAX_ENTRIES:
+			for stale_key in [k for k, (loaded, _) in _share_grants.items() if now - loaded >= SHARE_GRANT_TTL]:
+				del _share_grants[stale_key]
+		_share_grants[key] = (now, trie)
+	return trie
+
+
+def invalidate_share_grants(owner_id, grantee_id=None):
+	"""Drop cached grants of an owner, for one grantee or all of them"""
+	with _share_grants_lock:
+		for key in list(_share_grants):
+			if key[0] == owner_id and (grantee_id is None or key[1] == grantee_id):
+				del _share_grants[key]
+
+
 # Configure generation output paths
 GENERATED_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'generated')
 os.makedirs(GENERATED_FOLDER, exist_ok=True)
@@ -317,8 +715,70 @@ OPENAI_IMAGE_ENDPOINT = "https://api.openai.com/v1/images/generations"
 PIXABAY_API_KEY = os.environ.get('PIXABAY_API_KEY', '')
 PIXABAY_API_ENDPOINT = "https://pixabay.com/api/"
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Initialize OpenAI client, shared by every OpenAI call (it keeps its own connection pool)
+OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 60))
+client = OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT, max_retries=2)
+
+
+# --- Outbound HTTP ---
+# Pixabay, Hugging Face and provider downloads go through long-lived sessions, so connections are kept
+# alive and reused instead of paying a TCP+TLS handshake per call. Every session caps the connections per
+# host at HTTP_MAX_CONNECTIONS_PER_HOST (callers wait for a free one), applies a default timeout and
+# retries with exponential backoff. Non-idempotent POSTs are only retried when the connection failed.
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.environ.get('HTTP_MAX_CONNECTIONS_PER_HOST', 10))
+
+
+class OutboundSession(requests.Session):
+	"""requests.Session with pooled, retrying connections and a default timeout"""
+
+	def __init__(self, timeout, retries):
+		super().__init__()
+		self.timeout = timeout
+		adapter = HTTPAdapter(
+			pool_connections=4,
+			pool_maxsize=HTTP_MAX_CONNECTIONS_PER_HOST,
+			pool_block=True,
+			max_retries=retries
+		)
+		self.mount('https://', adapter)
+		self.mount('http://', adapter)
+
+	def request(self, method, url, **kwargs):
+		kwargs.setdefault('timeout', self.timeout)
+		return super().request(method, url, **kwargs)
+
+
+# Searches are idempotent: retry failed connections and 5xx with a short backoff. Callers wait on
+# these synchronously, so a 429 is passed straight back and Retry-After is never slept on.
+pixabay_http = OutboundSession(
+	timeout=(5, 15),
+	retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+	              allowed_methods=frozenset({'GET', 'HEAD'}), raise_on_status=False,
+	              respect_retry_after_header=False)
+)
+# Inference requests start a generation, so only connection failures are retried; a loading model
+# (503) is retried by the image job itself
+huggingface_http = OutboundSession(
+	timeout=(5, 60),
+	retries=Retry(total=2, connect=2, read=0, status=0, other=0, backoff_factor=0.5)
+)
+# Generated files from provider CDNs
+download_http = OutboundSession(
+	timeout=(10, 60),
+	retries=Retry(total=3, backoff_factor=1, status_forcelist=(500, 502, 503, 504),
+	              allowed_methods=frozenset({'GET'}), raise_on_status=False, respect_retry_after_header=False)
+)
+_replicate_clients = {}
+_replicate_clients_lock = threading.Lock()
+
+
+def get_replicate_client(api_key):
+	"""One Replicate client (and connection pool) per API token"""
+	with _replicate_clients_lock:
+		replicate_client = _replicate_clients.get(api_key)
+		if replicate_client is None:
+			replicate_client = _replicate_clients[api_key] = replicate.Client(api_token=api_key)
+	return replicate_client
 
 # Email configuration
 app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -407,7 +867,9 @@ def search_pixabay():
 			"image_type": "photo",
 			"per_page": 10
 		}
-		response = requests.get(PIXABAY_API_ENDPOINT, params=params)
+		response = pixabay_http.get(PIXABAY_API_ENDPOINT, params=params)
+		if response.status_code == 429:
+			return jsonify({"error": "Image search is rate limited, please try again shortly"}), 429
 		data = response.json()
 		return jsonify(data)
 	except Exception as e:
@@ -427,7 +889,7 @@ def ai_story():
 			"image_type": "photo",
 			"per_page": 6
 		}
-		response = requests.get(PIXABAY_API_ENDPOINT, params=params)
+		response = pixabay_http.get(PIXABAY_API_ENDPOINT, params=params)
 		if response.status_code == 200:
 			data = response.json()
 			pixabay_images = data.get('hits', [])
@@ -603,7 +1065,7 @@ def test_huggingface_api():
 
 	try:
 		# Make a HEAD request to check authentication
-		response = requests.head(api_url, headers=headers, timeout=10)
+		response = huggingface_http.head(api_url, headers=headers, timeout=10)
 
 		if response.status_code == 200:
 			return jsonify({
@@ -635,13 +1097,231 @@ def test_huggingface_api():
 		})
 
 
+# --- Generation jobs ---
+# Slow generation work (AI images, stories, animations) runs on bounded worker pools instead of request
+# threads. The request answers 202 with a job id right away and clients follow the job by polling its
+# status or through server-sent events. Jobs live in this process and are forgotten GENERATION_JOB_TTL
+# seconds after finishing.
+GENERATION_JOB_TTL = 60 * 60
+GENERATION_JOB_EVENTS_HEARTBEAT = 15
+_generation_jobs = {}
+_generation_jobs_changed = threading.Condition()
+
+
+def get_job_owner():
+	return current_user.id if current_user.is_authenticated else None
+
+
+def create_generation_job(owner_id, **fields):
+	"""Register a queued job and drop finished jobs past GENERATION_JOB_TTL"""
+	now = time.time()
+	job = {
+		'id': uuid.uuid4().hex,
+		'owner_id': owner_id,
+		'status': 'queued',
+		'message': 'Waiting for a free worker',
+		'version': 0,
+		'updated': now,
+		**fields
+	}
+	with _generation_jobs_changed:
+		for job_id in [job_id for job_id, old in _generation_jobs.items()
+		               if old['status'] in ('succeeded', 'failed') and now - old['updated'] > GENERATION_JOB_TTL]:
+			del _generation_jobs[job_id]
+		_generation_jobs[job['id']] = job
+	return job
+
+
+def update_generation_job(job_id, **changes):
+	"""Apply changes to a job and wake its event streams"""
+	with _generation_jobs_changed:
+		job = _generation_jobs[job_id]
+		job.update(changes)
+		job['version'] += 1
+		job['updated'] = time.time()
+		_generation_jobs_changed.notify_all()
+
+
+def get_generation_job(job_id, owner_id):
+	"""Snapshot of a job for its owner (jobs of anonymous users are reachable by id alone), or None"""
+	with _generation_jobs_changed:
+		job = _generation_jobs.get(job_id)
+		if job is None or (job['owner_id'] is not None and job['owner_id'] != owner_id):
+			return None
+		return dict(job)
+
+
+def generation_job_to_dict(job):
+	return {
+		key: value for key, value in job.items()
+		if key not in ('owner_id', 'version', 'updated') and value is not None
+	}
+
+
+def generation_job_status_response(job_id):
+	job = get_generation_job(job_id, get_job_owner())
+	if job is None:
+		return jsonify({'error': 'Job not found'}), 404
+	return jsonify(generation_job_to_dict(job))
+
+
+def generation_job_events_response(job_id):
+	"""Server-sent events: a 'status' event on every change, ending with 'done' once the job finished"""
+	if get_generation_job(job_id, get_job_owner()) is None:
+		return jsonify({'error': 'Job not found'}), 404
+
+	def events():
+		seen = -1
+		while True:
+			with _generation_jobs_changed:
+				_generation_jobs_changed.wait_for(
+					lambda: job_id not in _generation_jobs or _generation_jobs[job_id]['version'] != seen,
+					timeout=GENERATION_JOB_EVENTS_HEARTBEAT
+				)
+				job = _generation_jobs.get(job_id)
+				job = dict(job) if job else None
+			if job is None:
+				return
+			if job['version'] == seen:
+				# Keeps proxies from closing an idle stream
+				yield ": heartbeat\n\n"
+				continue
+			seen = job['version']
+			finished = job['status'] in ('succeeded', 'failed')
+			yield f"event: {'done' if finished else 'status'}\ndata: {json.dumps(generation_job_to_dict(job))}\n\n"
+			if finished:
+				return
+
+	response = app.response_class(events(), mimetype='text/event-stream')
+	response.headers['Cache-Control'] = 'no-cache'
+	response.headers['X-Accel-Buffering'] = 'no'
+	return response
+
+
+# --- AI image generation jobs ---
+IMAGE_JOB_WORKERS = int(os.environ.get('IMAGE_JOB_WORKERS', 4))
+# Retries while the model reports it is loading, waiting its estimated_time (capped) in between
+IMAGE_JOB_LOADING_RETRIES = int(os.environ.get('IMAGE_JOB_LOADING_RETRIES', 6))
+IMAGE_JOB_LOADING_MAX_WAIT = 30
+image_job_executor = ThreadPoolExecutor(max_workers=IMAGE_JOB_WORKERS, thread_name_prefix='image-job')
+
+
+def build_image_request(prompt, model, size, style):
+	"""API URL and payload for a generation request"""
+	# Set dimensions based on a size parameter
+	width = height = 512  # Default to small
+	if size == 'medium':
+		width = height = 768
+	elif size == 'large':
+		width = height = 1024
+
+	# Adjust prompt based on style
+	adjusted_prompt = prompt
+	if style == 'cartoon':
+		adjusted_prompt = f"mdjrny-v4 style {prompt}, cartoon, vibrant colors, high detail"
+	elif style == 'artistic':
+		adjusted_prompt = f"{prompt}, artistic style, detailed, vibrant, high quality"
+	elif style == 'realistic':
+		adjusted_prompt = f"{prompt}, realistic, detailed photograph, 4k, high resolution"
+
+	parameters = {
+		"width": width,
+		"height": height,
+		"num_inference_steps": 30,
+		"guidance_scale": 7.5
+	}
+	# SDXL takes no negative prompt, the standard SD models do
+	if not model.startswith('stabilityai/'):
+		parameters["negative_prompt"] = "blurry, bad quality, distorted, deformed, ugly, bad anatomy"
+
+	return f"https://api-inference.huggingface.co/models/{model}", {"inputs": adjusted_prompt, "parameters": parameters}
+
+
+def get_loading_wait(response):
+	"""Seconds to wait if the response says the model is still loading, otherwise None"""
+	error_message = response.text
+	estimated_time = None
+	try:
+		error_json = response.json()
+		error_message = str(error_json.get('error', error_message))
+		estimated_time = error_json.get('estimated_time')
+	except Exception:
+		pass
+	if 'loading' not in error_message.lower():
+		return None
+	try:
+		return min(max(float(estimated_time), 1), IMAGE_JOB_LOADING_MAX_WAIT)
+	except (TypeError, ValueError):
+		return 10
+
+
+def run_image_job(job_id, prompt, model, size, style, api_key):
+	"""Worker side of an image job: call the API, retrying while the model loads, and record the result"""
+	api_url, payload = build_image_request(prompt, model, size, style)
+	headers = {"Authorization": f"Bearer {api_key}"}
+
+	def finish_with_placeholder(error_note=None):
+		result = get_placeholder_result(prompt, style, error_note=error_note)
+		update_generation_job(job_id, status='succeeded', message='Placeholder created', retry_in=None, **result)
+
+	try:
+		attempt = 0
+		while True:
+			attempt += 1
+			update_generation_job(job_id, status='running', message='Generating image', attempt=attempt, retry_in=None)
+			try:
+				response = huggingface_http.post(api_url, headers=headers, json=payload)
+			except requests.exceptions.RequestException as e:
+				app.logger.warning(f"Image job {job_id}: request failed: {str(e)}")
+				return finish_with_placeholder()
+
+			if response.status_code == 200:
+				break
+
+			wait = get_loading_wait(response)
+			if wait is None:
+				app.logger.warning(f"Image job {job_id}: API error {response.status_code}")
+				return finish_with_placeholder()
+			if attempt > IMAGE_JOB_LOADING_RETRIES:
+				return finish_with_placeholder(error_note='Model is still loading, showing a placeholder')
+			update_generation_job(job_id, status='loading', message='Model is loading, retrying', retry_in=wait)
+			time.sleep(wait)
+
+		if 'image' in response.headers.get('Content-Type', ''):
+			# Save the generated image
+			unique_id = str(uuid.uuid4())
+			file_path = os.path.join(GENERATED_FOLDER, f"{unique_id}.jpg")
+			with open(file_path, 'wb') as f:
+				f.write(response.content)
+			update_generation_job(job_id, status='succeeded', message='Image generated',
+			                 image_url=f"/static/generated/{unique_id}.jpg", retry_in=None)
+			return
+
+		try:
+			json_response = response.json()
+		except ValueError:
+			return finish_with_placeholder()
+		if 'error' in json_response:
+			return finish_with_placeholder(error_note=f"API Error: {json_response.get('error')}")
+		# Handle case where API returns image URL instead of binary data
+		if 'url' in json_response:
+			update_generation_job(job_id, status='succeeded', message='Image generated', image_url=json_response['url'])
+			return
+		finish_with_placeholder()
+	except Exception as e:
+		app.logger.error(f"Image job {job_id} failed: {str(e)}")
+		update_generation_job(job_id, status='failed', message='Image generation failed', error=str(e), retry_in=None)
+
+
 @app.route('/generate-ai-image', methods=['POST'])
 def generate_ai_image():
-	"""Generate AI images using Hugging Face models based on text prompts"""
-	global style, prompt
+	"""
+    Queue an AI image generation and answer 202 with the job id right away.
+    Without a Hugging Face API key the placeholder is returned directly, as before.
+    """
 	try:
 		# Parse request data
-		data = request.json
+		data = request.json or {}
 		prompt = data.get('prompt', '')
 		model = data.get('model', 'stabilityai/stable-diffusion-xl-base-1.0')
 		size = data.get('size', 'medium')
@@ -653,213 +1333,96 @@ def generate_ai_image():
 		# Get an API key from the environment variable
 		api_key = os.environ.get('HUGGINGFACE_API_KEY', '')
 
-		# Debug information
-		print(f"Generating image with style: {style}, model: {model}")
-		print(f"Prompt: {prompt}")
-		print(f"API Key configured: {'Yes' if api_key else 'None'}")
-
 		# If no API key is provided, use placeholder images
 		if not api_key:
-			print("No Hugging Face API key found. Using placeholder images.")
 			return generate_placeholder_image(prompt, style)
 
-		# Set dimensions based on a size parameter
-		width = height = 512  # Default to small
-		if size == 'medium':
-			width = height = 768
-		elif size == 'large':
-			width = height = 1024
-
-		# Adjust prompt based on style
-		adjusted_prompt = prompt
-		if style == 'cartoon':
-			adjusted_prompt = f"mdjrny-v4 style {prompt}, cartoon, vibrant colors, high detail"
-		elif style == 'artistic':
-			adjusted_prompt = f"{prompt}, artistic style, detailed, vibrant, high quality"
-		elif style == 'realistic':
-			adjusted_prompt = f"{prompt}, realistic, detailed photograph, 4k, high resolution"
-
-		# API URL for the selected model
-		api_url = f"https://api-inference.huggingface.co/models/{model}"
-
-		# Configure headers with an API key
-		headers = {
-			"Authorization": f"Bearer {api_key}"
-		}
-
-		# Configure payload based on model type
-		if model.startswith('stabilityai/'):
-			# SDXL format
-			payload = {
-				"inputs": adjusted_prompt,
-				"parameters": {
-					"width": width,
-					"height": height,
-					"num_inference_steps": 30,
-					"guidance_scale": 7.5
-				}
-			}
-		else:
-			# Standard SD format for other models
-			payload = {
-				"inputs": adjusted_prompt,
-				"parameters": {
-					"width": width,
-					"height": height,
-					"num_inference_steps": 30,
-					"guidance_scale": 7.5,
-					"negative_prompt": "blurry, bad quality, distorted, deformed, ugly, bad anatomy"
-				}
-			}
-
-		print(f"Sending request to: {api_url}")
-		print(f"Payload: {payload}")
+		job = create_generation_job(get_job_owner(), attempt=0)
+		image_job_executor.submit(run_image_job, job['id'], prompt, model, size, style, api_key)
 
-		# Make API request with timeout
-		try:
-			response = requests.post(
-				api_url,
-				headers=headers,
-				json=payload,
-				timeout=60  # Timeout after 60 seconds
-			)
+		return jsonify({
+			'job_id': job['id'],
+			'status': job['status'],
+			'status_url': url_for('get_image_job_status', job_id=job['id']),
+			'events_url': url_for('stream_image_job_events', job_id=job['id'])
+		}), 202
+	except Exception as e:
+		app.logger.error(f"Exception in AI image generation: {str(e)}")
+		return jsonify({'error': 'Could not start image generation'}), 500
 
-			print(f"Response status: {response.status_code}")
-			print(f"Response content type: {response.headers.get('Content-Type', 'unknown')}")
 
-			# Check if the response is successful
-			if response.status_code == 200:
-				# If the response is an image
-				if 'image' in response.headers.get('Content-Type', ''):
-					# Save the generated image
-					unique_id = str(uuid.uuid4())
-					output_dir = GENERATED_FOLDER
-
-					file_path = os.path.join(output_dir, f"{unique_id}.jpg")
-					with open(file_path, 'wb') as f:
-						f.write(response.content)
-
-					# Return the URL to the saved image
-					image_url = f"/static/generated/{unique_id}.jpg"
-					print(f"Image successfully generated and saved to {file_path}")
-					return jsonify({"image_url": image_url})
-
-				# If the response is JSON
-				else:
-					try:
-						json_response = response.json()
-						print(f"JSON response: {json_response}")
-
-						# Check if the response contains an error
-						if 'error' in json_response:
-							error_msg = json_response.get('error')
-							print(f"API returned error: {error_msg}")
-							# Fall back to placeholder if there's an error
-							return generate_placeholder_image(prompt, style, error_note=f"API Error: {error_msg}")
-
-						# Handle case where API returns image URL instead of binary data
-						if 'url' in json_response:
-							print(f"API returned URL: {json_response['url']}")
-							return jsonify({"image_url": json_response['url']})
-
-						# If we don't understand the response, use placeholder
-						print("Unknown JSON response format")
-						return generate_placeholder_image(
-							prompt,
-							style
-						)
-					except Exception as json_err:
-						print(f"Error parsing JSON response: {str(json_err)}")
-						# Fall back to placeholder
-						return generate_placeholder_image(
-							prompt,
-							style
-						)
-			else:
-				# Handle non-200 responses
-				error_message = response.text
-				try:
-					error_json = response.json()
-					error_message = error_json.get('error', error_message)
-				except:
-					pass
-
-				print(f"API error {response.status_code}: {error_message}")
-
-				# If the model is loading, communicate this to the user
-				if "loading" in error_message.lower() or "currently loading" in error_message.lower():
-					return jsonify({
-						"error": "Model is still loading, please try again in a few moments",
-						"retry": True
-					})
+@app.route('/generate-ai-image/jobs/<job_id>', methods=['GET'])
+def get_image_job_status(job_id):
+	"""Current state of an image job; image_url is set once it has succeeded"""
+	return generation_job_status_response(job_id)
 
-				# Fall back to placeholder for any other errors
-				return generate_placeholder_image(
-					prompt,
-					style
-				)
 
-		except requests.exceptions.Timeout:
-			print("Request to Hugging Face API timed out")
-			return generate_placeholder_image(
-				prompt,
-				style
-			)
+@app.route('/generate-ai-image/jobs/<job_id>/events', methods=['GET'])
+def stream_image_job_events(job_id):
+	"""Server-sent events of an image job"""
+	return generation_job_events_response(job_id)
 
-		except requests.exceptions.RequestException as req_err:
-			print(f"Request exception: {str(req_err)}")
-			return generate_placeholder_image(
-				prompt,
-				style
-			)
 
-	except Exception as e:
-		print(f"Exception in AI image generation: {str(e)}")
-		print(traceback.format_exc())
-		# Fall back to placeholder for any errors
-		return generate_placeholder_image(
-			prompt if 'prompt' in locals() else "error",
-			style if 'style' in locals() else "realistic"
-		)
+# Placeholder images are stored under a key derived from everything drawn on them, so the same fallback
+# is rendered once and its URL handed out again. Bump PLACEHOLDER_RENDER_VERSION when the layout changes.
+PLACEHOLDER_RENDER_VERSION = 1
+PLACEHOLDER_BACKGROUND_MAX_ENTRIES = 16
+_placeholder_backgrounds = {}
+_placeholder_backgrounds_lock = threading.Lock()
+_fonts = {}
+_fonts_lock = threading.Lock()
 
 
-def generate_placeholder_image(title, subtitle, note="", width=800, height=600, error_note=None):
-	"""
-    Create a placeholder image with text
-    Used when we can't use the actual API
-    """
-	# Create a blank image with a gradient background
-	image = Image.new('RGB', (width, height), color=(245, 245, 245))
+def get_font(size, name="arial.ttf"):
+	"""Load a TrueType font once per process, falling back to PIL's default font"""
+	key = (name, size)
+	with _fonts_lock:
+		font = _fonts.get(key)
+	if font is None:
+		try:
+			font = ImageFont.truetype(name, size)
+		except IOError:
+			font = ImageFont.load_default()
+		with _fonts_lock:
+			_fonts[key] = font
+	return font
+
+
+def get_placeholder_background(width, height):
+	"""Gradient, frame border and corner circles of a placeholder, rendered once per size"""
+	key = (width, height)
+	with _placeholder_backgrounds_lock:
+		background = _placeholder_backgrounds.get(key)
+	if background is None:
+		# Vertical gradient, lighter at the top
+		ys = np.arange(height)[:, np.newaxis]
+		rows = np.clip(np.hstack((245 - ys * 0.2, 245 - ys * 0.1, np.full((height, 1), 245))), 0, 255)
+		gradient = np.broadcast_to(rows.astype(np.uint8)[:, np.newaxis, :], (height, width, 3))
+		background = Image.fromarray(np.ascontiguousarray(gradient))
+		draw = ImageDraw.Draw(background)
+
+		# Draw frame border
+		draw.rectangle([(20, 20), (width - 20, height - 20)], outline=(70, 130, 180), width=2)
+
+		# Draw circles in corners for visual interest
+		for pos in [(50, 50), (width - 50, 50), (50, height - 50), (width - 50, height - 50)]:
+			draw.ellipse((pos[0] - 20, pos[1] - 20, pos[0] + 20, pos[1] + 20), fill=(70, 130, 180, 128))
+
+		with _placeholder_backgrounds_lock:
+			if len(_placeholder_backgrounds) >= PLACEHOLDER_BACKGROUND_MAX_ENTRIES:
+				_placeholder_backgrounds.clear()
+			_placeholder_backgrounds[key] = background
+	return background
+
+
+def render_placeholder_image(title, subtitle, note, width, height):
+	"""Draw the placeholder text over the cached background"""
+	image = get_placeholder_background(width, height).copy()
 	draw = ImageDraw.Draw(image)
 
-	# Create a gradient background
-	for y in range(height):
-		color = (
-			int(245 - y * 0.2),
-			int(245 - y * 0.1),
-			int(245)
-		)
-		draw.line([(0, y), (width, y)], fill=color)
-
-	# Try to find system fonts that should be available on most systems
-	try:
-		# Try to load a standard font (should be available on most systems)
-		title_font = ImageFont.truetype("arial.ttf", 36)
-		subtitle_font = ImageFont.truetype("arial.ttf", 24)
-		note_font = ImageFont.truetype("arial.ttf", 18)
-	except IOError:
-		# Fallback to default font if custom font not available
-		title_font = ImageFont.load_default()
-		subtitle_font = ImageFont.load_default()
-		note_font = ImageFont.load_default()
-
-	# Add decorative elements
-	# Draw frame border
-	draw.rectangle([(20, 20), (width - 20, height - 20)], outline=(70, 130, 180), width=2)
-
-	# Draw circles in corners for visual interest
-	for pos in [(50, 50), (width - 50, 50), (50, height - 50), (width - 50, height - 50)]:
-		draw.ellipse((pos[0] - 20, pos[1] - 20, pos[0] + 20, pos[1] + 20), fill=(70, 130, 180, 128))
+	title_font = get_font(36)
+	subtitle_font = get_font(24)
+	note_font = get_font(18)
 
 	# Calculate text positions
 	title_width = draw.textlength(title, font=title_font)
@@ -886,21 +1449,35 @@ def generate_placeholder_image(title, subtitle, note="", width=800, height=600,
 		fill=(70, 130, 180, 200),
 		font=watermark_font
 	)
+	return image
 
-	# Save the image to a temporary file with a unique name
-	unique_id = str(uuid.uuid4())
+
+def get_placeholder_result(title, subtitle, note="", width=800, height=600, error_note=None):
+	"""
+    Create a placeholder image with text and return the response fields pointing to it
+    Used when we can't use the actual API
+    """
+	key = hashlib.sha256(
+		json.dumps([PLACEHOLDER_RENDER_VERSION, title, subtitle, note, width, height]).encode()
+	).hexdigest()[:32]
+	filename = f"placeholder-{key}.jpg"
 	output_dir = GENERATED_FOLDER
+	file_path = os.path.join(output_dir, filename)
 
-	file_path = os.path.join(output_dir, f"{unique_id}.jpg")
+	# Identical fallbacks reuse the file rendered the first time
+	if not os.path.exists(file_path):
+		image = render_placeholder_image(title, subtitle, note, width, height)
 
-	# Ensure the output directory exists
-	os.makedirs(output_dir, exist_ok=True)
+		# Ensure the output directory exists
+		os.makedirs(output_dir, exist_ok=True)
 
-	# Save the image
-	image.save(file_path, 'JPEG', quality=90)
+		# Write under a temporary name so concurrent requests never serve a partial file
+		temp_path = os.path.join(output_dir, f".tmp-{uuid.uuid4().hex}.jpg")
+		image.save(temp_path, 'JPEG', quality=90)
+		os.replace(temp_path, file_path)
 
-	# Return the URL to the saved image in a Flask-compatible response
-	image_url = f"/static/generated/{unique_id}.jpg"
+	# Return the URL to the saved image
+	image_url = f"/static/generated/{filename}"
 
 	response_data = {
 		"image_url": image_url,
@@ -911,141 +1488,258 @@ def generate_placeholder_image(title, subtitle, note="", width=800, height=600,
 	if note or error_note:
 		response_data["note"] = error_note if error_note else f"Using placeholder for: {note}"
 
-	return jsonify(response_data)
+	return response_data
+
+
+def generate_placeholder_image(title, subtitle, note="", width=800, height=600, error_note=None):
+	"""Placeholder image as a JSON response"""
+	return jsonify(get_placeholder_result(title, subtitle, note, width, height, error_note))
 
 
 @app.route('/ai-animation')
 def ai_animation():
-	return render_template('ai_animation.html')
+	return render_template('ai_animation.html', fake_animation_provider=ENABLE_FAKE_ANIMATION_PROVIDER)
 
 
 import logging
 
 
+# --- Animation jobs ---
+# /generate-animation queues two tasks for one job: the story (an OpenAI chat completion) and the
+# animation (provider call, then the download). They run concurrently on the animation pool, and the
+# job carries the story as soon as it is written while the animation is still rendering.
+ANIMATION_JOB_WORKERS = int(os.environ.get('ANIMATION_JOB_WORKERS', 4))
+animation_job_executor = ThreadPoolExecutor(max_workers=ANIMATION_JOB_WORKERS, thread_name_prefix='animation-job')
+# API key environment variables per provider; Replicate accepts both names for compatibility
+ANIMATION_PROVIDER_KEYS = {
+	'picsart': ('PICSART_API_KEY',),
+	'runway': ('RUNWAY_API_KEY',),
+	'did': ('DID_API_KEY',),
+	'replicate': ('REPLICATE_API_TOKEN', 'REPLICATE_API_KEY'),
+}
+# The 'fake' provider writes the story and an animated placeholder offline, after FAKE_ANIMATION_DELAY
+ENABLE_FAKE_ANIMATION_PROVIDER = os.environ.get('ENABLE_FAKE_ANIMATION_PROVIDER') == '1'
+FAKE_ANIMATION_DELAY = float(os.environ.get('FAKE_ANIMATION_DELAY', 2))
+DOWNLOAD_CHUNK = 1024 * 1024
+
+
+def get_animation_api_key(provider):
+	"""API key from the environment - users don't need to provide it"""
+	for name in ANIMATION_PROVIDER_KEYS.get(provider, ()):
+		if os.environ.get(name):
+			return os.environ[name]
+	return ''
+
+
+def get_animation_url(file_path):
+	"""URL of a file written below the working directory"""
+	rel_path = file_path.replace(os.getcwd(), '')
+	if rel_path.startswith('\\') or rel_path.startswith('/'):
+		rel_path = rel_path[1:]
+
+	# Replace backslashes with forward slashes for URLs
+	return "/" + rel_path.replace('\\', '/')
+
+
+def stream_to_file(chunks, file_path):
+	"""Write chunks to file_path through a temporary file, so readers never see a partial file"""
+	temp_path = f"{file_path}.part"
+	try:
+		with open(temp_path, 'wb') as target:
+			for chunk in chunks:
+				if chunk:
+					target.write(chunk)
+		os.replace(temp_path, file_path)
+	finally:
+		if os.path.exists(temp_path):
+			os.remove(temp_path)
+
+
+def download_to_file(url, file_path):
+	"""Stream a download to disk in DOWNLOAD_CHUNK pieces instead of holding it in memory"""
+	with download_http.get(url, stream=True) as response:
+		if response.status_code != 200:
+			raise Exception(f"Failed to download video: Status code {response.status_code}")
+		stream_to_file(response.iter_content(chunk_size=DOWNLOAD_CHUNK), file_path)
+
+
+def write_animation_story(prompt, provider, temperature):
+	"""Short story for the animation, or an apology if it cannot be written"""
+	if provider == 'fake':
+		time.sleep(FAKE_ANIMATION_DELAY / 2)
+		return f"(Offline story) Once upon a time, {prompt.strip()}. And that was only the beginning."
+
+	try:
+		chat_completion = client.chat.completions.create(
+			model="gpt-3.5-turbo",
+			messages=[
+				ChatCompletionSystemMessageParam(role="system",
+				                                 content="You are a creative storyteller that writes vivid, emotional, and engaging short stories."),
+				ChatCompletionUserMessageParam(role="user",
+				                               content=f"Write a vivid, creative, emotional, and detailed short story based on this input. Keep it under 300 words.\n\nInput: {prompt}\n\nStory:")
+			],
+			max_tokens=600,
+			temperature=temperature
+		)
+		return chat_completion.choices[0].message.content.strip()
+	except Exception as e:
+		logging.error(f"Story generation error: {str(e)}")
+		return "(Sorry, the AI story could not be generated at this time.)"
+
+
+def render_animation(prompt, provider, animation_id, output_folder):
+	"""Run the provider, falling back to a placeholder; returns the result fields of the job"""
+	if provider == 'fake':
+		return {'image_url': generate_with_fake(prompt, animation_id, output_folder), 'is_video': False}
+
+	api_key = get_animation_api_key(provider)
+
+	# For demo/testing - use placeholder generation if no API key is available
+	if not api_key:
+		logging.warning(f"No API key found for provider: {provider}")
+		animation_path = generate_placeholder_animation(prompt, provider, animation_id, output_folder)
+		return {'image_url': animation_path, 'is_video': False, 'note': 'Generated with placeholder animation'}
+
+	# With API key - try real service, fall back to placeholder
+	try:
+		if provider == 'picsart':
+			return {'image_url': generate_with_picsart(prompt, api_key, animation_id, output_folder), 'is_video': False}
+		elif provider == 'runway':
+			return {'image_url': generate_with_runway(prompt, api_key, animation_id, output_folder), 'is_video': False}
+		elif provider == 'did':
+			return {'image_url': generate_with_did(prompt, api_key, animation_id, output_folder), 'is_video': False}
+		elif provider == 'replicate':
+			return {'video_url': generate_with_replicate(prompt, api_key, animation_id, output_folder), 'is_video': True}
+		return {
+			'image_url': generate_placeholder_animation(prompt, provider, animation_id, output_folder),
+			'is_video': False
+		}
+	except Exception as e:
+		logging.error(f"Animation generation error: {str(e)}")
+		animation_path = generate_placeholder_animation(prompt, provider, animation_id, output_folder)
+		return {'image_url': animation_path, 'is_video': False, 'note': f'Used placeholder due to API error: {str(e)}'}
+
+
+def complete_animation_part(job_id, part, **changes):
+	"""Record the story or animation result; the job finishes with whichever part completes last"""
+	with _generation_jobs_changed:
+		job = _generation_jobs[job_id]
+		changes[f'{part}_status'] = 'done'
+		other = 'animation' if part == 'story' else 'story'
+		if job[f'{other}_status'] == 'done':
+			failed = 'error' in changes or job.get('error') is not None
+			changes['status'] = 'failed' if failed else 'succeeded'
+			changes['message'] = 'Animation generation failed' if failed else 'Animation ready'
+		elif part == 'story':
+			changes['message'] = 'Story ready, animation in progress'
+		else:
+			changes['message'] = 'Animation ready, story in progress'
+		update_generation_job(job_id, **changes)
+
+
+def run_story_task(job_id, prompt, provider, temperature):
+	# Any failure still completes the part, or the job would stay 'running' forever
+	try:
+		update_generation_job(job_id, status='running', story_status='running')
+		result = {'story': write_animation_story(prompt, provider, temperature)}
+	except Exception as e:
+		logging.error(f"Story for animation job {job_id} failed: {str(e)}")
+		result = {'error': str(e)}
+	complete_animation_part(job_id, 'story', **result)
+
+
+def run_animation_task(job_id, prompt, provider, animation_id, output_folder):
+	try:
+		update_generation_job(job_id, status='running', animation_status='running')
+		result = render_animation(prompt, provider, animation_id, output_folder)
+	except Exception as e:
+		# Even the placeholder could not be written
+		logging.error(f"Animation job {job_id} failed: {str(e)}")
+		result = {'error': str(e)}
+	complete_animation_part(job_id, 'animation', **result)
+
+
 # Animation Generation with Multiple Providers
 @app.route('/generate-animation', methods=['POST'])
 def generate_animation():
-	global provider, temperature
+	"""Queue the story and animation of a prompt and answer 202 with the job to follow"""
 	try:
-		# --- Pro User Detection (simple example, replace it with real logic) ---
-		pro_user = True  # Set everyone as Pro by default for a better experience
-
 		# Get prompt and provider from a request
-		if request.method == 'POST':
-			if request.content_type and 'multipart/form-data' in request.content_type:
-				prompt = request.form.get('prompt', '')
-				provider = request.form.get('provider', 'picsart')
-				temperature = float(request.form.get('temperature', 0.7))
-			else:
-				data = request.get_json()
-				prompt = data.get('prompt', '')
-				provider = data.get('provider', 'picsart')
-				temperature = float(data.get('temperature', 0.7))
+		if request.content_type and 'multipart/form-data' in request.content_type:
+			prompt = request.form.get('prompt', '')
+			provider = request.form.get('provider', 'picsart')
+			temperature = float(request.form.get('temperature', 0.7))
+		else:
+			data = request.get_json() or {}
+			prompt = data.get('prompt', '')
+			provider = data.get('provider', 'picsart')
+			temperature = float(data.get('temperature', 0.7))
 
 		if not prompt:
 			return jsonify({'error': 'No prompt provided'}), 400
 
-		# --- Story Generation ---
-		story = None
-		try:
-			from openai.types.chat import ChatCompletionSystemMessageParam, ChatCompletionUserMessageParam
-			clients = OpenAI()
-			chat_completion = clients.chat.completions.create(
-				model="gpt-3.5-turbo",
-				messages=[
-					ChatCompletionSystemMessageParam(role="system",
-					                                 content="You are a creative storyteller that writes vivid, emotional, and engaging short stories."),
-					ChatCompletionUserMessageParam(role="user",
-					                               content=f"Write a vivid, creative, emotional, and detailed short story based on this input. Keep it under 300 words.\n\nInput: {prompt}\n\nStory:")
-				],
-				max_tokens=600,
-				temperature=temperature
-			)
-			story = chat_completion.choices[0].message.content.strip()
-		except Exception as e:
-			story = "(Sorry, the AI story could not be generated at this time.)"
+		if provider == 'fake' and not ENABLE_FAKE_ANIMATION_PROVIDER:
+			return jsonify({'error': 'Unknown provider'}), 400
 
-		# --- Animation Generation ---
 		animation_id = f"{int(time.time())}_{random.randint(1000, 9999)}"
 		output_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'animations', animation_id)
 		os.makedirs(output_folder, exist_ok=True)
 
-		# Get an API key from the environment - users don't need to provide it
-		api_key = None
-		if provider == 'picsart':
-			api_key = os.environ.get('PICSART_API_KEY', '')
-		elif provider == 'runway':
-			api_key = os.environ.get('RUNWAY_API_KEY', '')
-		elif provider == 'did':
-			api_key = os.environ.get('DID_API_KEY', '')
-		elif provider == 'replicate':
-			# Try both environment variable names for compatibility
-			api_key = os.environ.get('REPLICATE_API_TOKEN', '') or os.environ.get('REPLICATE_API_KEY', '')
-			logging.info(f"Using Replicate with API key (first 4 chars): {api_key[:4] if api_key else 'None'}")
+		job = create_generation_job(
+			get_job_owner(),
+			animation_id=animation_id,
+			provider=provider,
+			story_status='queued',
+			animation_status='queued'
+		)
+		animation_job_executor.submit(run_story_task, job['id'], prompt, provider, temperature)
+		animation_job_executor.submit(run_animation_task, job['id'], prompt, provider, animation_id, output_folder)
 
-		# For demo/testing - use placeholder generation if no API key is available
-		if not api_key:
-			logging.warning(f"No API key found for provider: {provider}")
-			animation_path = generate_placeholder_animation(prompt, provider, animation_id, output_folder)
-			return jsonify({
-				'success': True,
-				'animation_id': animation_id,
-				'animation_path': animation_path,
-				'provider': provider,
-				'story': story,
-				'note': 'Generated with placeholder animation',
-				'is_video': False,
-				'image_url': animation_path
-			})
+		return jsonify({
+			'job_id': job['id'],
+			'animation_id': animation_id,
+			'status': job['status'],
+			'status_url': url_for('get_animation_job_status', job_id=job['id']),
+			'events_url': url_for('stream_animation_job_events', job_id=job['id'])
+		}), 202
+	except Exception as e:
+		logging.error(f"Animation generation error: {str(e)}")
+		return jsonify({'error': str(e)}), 500
 
-		# With API key - try real service, fall back to placeholder
-		try:
-			animation_path = None
-			is_video = False
-
-			if provider == 'picsart':
-				animation_path = generate_with_picsart(prompt, api_key, animation_id, output_folder)
-			elif provider == 'runway':
-				animation_path = generate_with_runway(prompt, api_key, animation_id, output_folder)
-			elif provider == 'did':
-				animation_path = generate_with_did(prompt, api_key, animation_id, output_folder)
-			elif provider == 'replicate':
-				animation_path = generate_with_replicate(prompt, api_key, animation_id, output_folder)
-				is_video = True  # Mark as video for Replicate responses
-			else:
-				animation_path = generate_placeholder_animation(prompt, provider, animation_id, output_folder)
 
-			response_data = {
-				'success': True,
-				'animation_id': animation_id,
-				'provider': provider,
-				'story': story
-			}
+@app.route('/generate-animation/jobs/<job_id>', methods=['GET'])
+def get_animation_job_status(job_id):
+	"""Current state of an animation job; story and the animation URL appear as each part completes"""
+	return generation_job_status_response(job_id)
 
-			if is_video:
-				response_data['video_url'] = animation_path
-				response_data['is_video'] = True
-			else:
-				response_data['image_url'] = animation_path
-				response_data['is_video'] = False
 
-			return jsonify(response_data)
-		except Exception as e:
-			logging.error(f"Animation generation error: {str(e)}")
-			animation_path = generate_placeholder_animation(prompt, provider, animation_id, output_folder)
-			return jsonify({
-				'success': True,
-				'animation_id': animation_id,
-				'animation_path': animation_path,
-				'image_url': animation_path,
-				'is_video': False,
-				'provider': provider,
-				'story': story,
-				'note': f'Used placeholder due to API error: {str(e)}'
-			})
-	except Exception as e:
-		logging.error(f"Animation generation error: {str(e)}")
-		return jsonify({'error': str(e)}), 500
+@app.route('/generate-animation/jobs/<job_id>/events', methods=['GET'])
+def stream_animation_job_events(job_id):
+	"""Server-sent events of an animation job"""
+	return generation_job_events_response(job_id)
+
+
+def generate_with_fake(prompts, animation_id, output_folder):
+	"""Offline provider: a few placeholder frames as an animated GIF, written like a download"""
+	logging.info(f"Generating animation with the fake provider: {prompts}")
+	time.sleep(FAKE_ANIMATION_DELAY)
+
+	frames = [
+		generate_animation_placeholder_image(
+			title="Offline animation",
+			subtitle=prompts,
+			note=f"Frame {index + 1} of 4",
+			providers='fake'
+		)
+		for index in range(4)
+	]
+	buffer = io.BytesIO()
+	frames[0].save(buffer, format='GIF', save_all=True, append_images=frames[1:], duration=250, loop=0)
+
+	animation_file = os.path.join(output_folder, f"{animation_id}.gif")
+	data = buffer.getvalue()
+	stream_to_file((data[i:i + DOWNLOAD_CHUNK] for i in range(0, len(data), DOWNLOAD_CHUNK)), animation_file)
+	return get_animation_url(animation_file)
 
 
 def generate_with_picsart(prompt, api_key, animation_id, output_folder):
@@ -1123,22 +1817,11 @@ def generate_with_replicate(prompts, api_key, animation_id, output_folder):
 	logging.info(f"Generating animation with Replicate: {prompts}")
 
 	try:
-		import replicate
-		import requests
-		from urllib.parse import urlparse
-		import os
-		import time
-
-		# Set the API token - Replicate library explicitly looks for REPLICATE_API_TOKEN
-		os.environ["REPLICATE_API_TOKEN"] = api_key
-		logging.info(f"Set Replicate API token - first 4 chars: {api_key[:4]}...")
-
-		# Select a text-to-video model on Replicate
-		# Log the start of the generation process
-		logging.info(f"Starting Replicate animation generation with prompt: {prompts}")
+		# Clients per token; setting REPLICATE_API_TOKEN would race between concurrent jobs
+		replicate_client = get_replicate_client(api_key)
 
 		# Using Stable Video Diffusion model which is good for text-to-video generation
-		output = replicate.run(
+		output = replicate_client.run(
 			"stability-ai/stable-video-diffusion:3f0457e4619daac51203dedb472816fd4af51f3149fa7a9e0b5ffcf1b8172438",
 			input={
 				"prompt": prompts,
@@ -1157,40 +1840,19 @@ def generate_with_replicate(prompts, api_key, animation_id, output_folder):
 		)
 
 		# The output from this model is a URL to the generated video
-		if output:
-			video_url = output
-			logging.info(f"Generated animation URL: {video_url}")
-
-			# Download the video file
-			logging.info(f"Downloading video from: {video_url}")
-			response = requests.get(video_url, stream=True)
-			if response.status_code == 200:
-				# Parse video filename from URL
-				parsed_url = urlparse(video_url)
-				video_filename = f"{animation_id}.mp4"
-				video_path = os.path.join(output_folder, video_filename)
-
-				# Save the video file
-				with open(video_path, 'wb') as f:
-					for chunk in response.iter_content(chunk_size=8192):
-						f.write(chunk)
-
-				# Get a relative path for the frontend
-				rel_path = video_path.replace(os.getcwd(), '')
-				if rel_path.startswith('\\') or rel_path.startswith('/'):
-					rel_path = rel_path[1:]
-
-				# Replace backslashes with forward slashes for URLs
-				rel_path = rel_path.replace('\\', '/')
-
-				logging.info(f"Generated animation saved: {rel_path}")
-				return "/" + rel_path
-			else:
-				logging.error(f"Failed to download video: Status code {response.status_code}")
-				raise Exception(f"Failed to download video: Status code {response.status_code}")
-		else:
+		if not output:
 			logging.error("Replicate API returned empty output")
 			raise Exception("Replicate API returned empty output")
+		video_url = str(output[0] if isinstance(output, list) else output)
+		logging.info(f"Generated animation URL: {video_url}")
+
+		# Stream the video file to disk
+		video_path = os.path.join(output_folder, f"{animation_id}.mp4")
+		download_to_file(video_url, video_path)
+
+		rel_path = get_animation_url(video_path)
+		logging.info(f"Generated animation saved: {rel_path}")
+		return rel_path
 	except Exception as e:
 		logging.error(f"Error in generate_with_replicate: {str(e)}")
 		raise
@@ -1215,92 +1877,74 @@ def generate_placeholder_animation(prompts, providers, animation_id, output_fold
 		frame.save(animation_file)
 
 		# Get a relative path for the frontend
-		rel_path = animation_file.replace(os.getcwd(), '')
-		if rel_path.startswith('\\') or rel_path.startswith('/'):
-			rel_path = rel_path[1:]
-
-		# Replace backslashes with forward slashes for URLs
-		rel_path = rel_path.replace('\\', '/')
+		rel_path = get_animation_url(animation_file)
 
 		logging.info(f"Generated placeholder animation: {rel_path}")
-		return "/" + rel_path
+		return rel_path
 	except Exception as e:
 		logging.error(f"Error in generate_placeholder_animation: {str(e)}")
 		raise
 
 
+# Placeholder frame palettes: channel = base + x / width * x_weight + y / height * y_weight, plus the colour
+# of the pulsing circle. Providers not listed use the None entry.
+ANIMATION_PLACEHOLDER_PALETTES = {
+	# Blue-purple
+	'picsart': ((25, 25, 40), (20, 0, 40), (0, 20, 40), (100, 100, 255)),
+	# Green-teal
+	'runway': ((10, 40, 50), (0, 40, 0), (30, 0, 20), (100, 255, 180)),
+	# Orange-red
+	'did': ((50, 20, 30), (40, 0, 20), (0, 30, 0), (255, 140, 100)),
+	# Purple-pink
+	'replicate': ((40, 10, 50), (0, 25, 0), (40, 0, 40), (200, 100, 255)),
+	None: ((30, 30, 40), (30, 0, 40), (0, 30, 0), (180, 180, 255)),
+}
+# Blurred backgrounds by (palette, width, height); callers draw on a copy
+ANIMATION_BACKGROUND_MAX_ENTRIES = 32
+_animation_backgrounds = {}
+_animation_backgrounds_lock = threading.Lock()
+
+
+def render_animation_gradient(palette, width, height):
+	"""The unblurred gradient of a palette as a (height, width, 3) uint8 array"""
+	base, x_weight, y_weight, _ = ANIMATION_PLACEHOLDER_PALETTES[palette]
+	xs = (np.arange(width) / width)[np.newaxis, :, np.newaxis] * np.array(x_weight)
+	ys = (np.arange(height) / height)[:, np.newaxis, np.newaxis] * np.array(y_weight)
+	# Truncated like int() would; every value is positive
+	return (np.array(base) + xs + ys).astype(np.uint8)
+
+
+def get_animation_background(palette, width, height):
+	"""Blurred gradient background, rendered once per (palette, size)"""
+	key = (palette, width, height)
+	with _animation_backgrounds_lock:
+		background = _animation_backgrounds.get(key)
+	if background is None:
+		background = Image.fromarray(render_animation_gradient(palette, width, height))
+		background = background.filter(ImageFilter.GaussianBlur(radius=10))
+		with _animation_backgrounds_lock:
+			if len(_animation_backgrounds) >= ANIMATION_BACKGROUND_MAX_ENTRIES:
+				_animation_backgrounds.clear()
+			_animation_backgrounds[key] = background
+	return background
+
+
 def generate_animation_placeholder_image(title, subtitle, note="", providers="picsart", width=800, height=600):
 	"""
     Generate a placeholder image with text
     """
 	try:
-		# Create an image with a gradient background
-		from PIL import Image, ImageDraw, ImageFont, ImageFilter
-		import numpy as np
-
-		# Create a gradient background based on the provider
-		gradient = np.zeros((height, width, 3), dtype=np.uint8)
-
-		# Different gradient colors based on the provider
-		if providers == 'picsart':
-			# Blue-purple gradient
-			for y in range(height):
-				for x in range(width):
-					r = int(25 + (x / width) * 20)
-					g = int(25 + (y / height) * 20)
-					b = int(40 + (x / width) * 40 + (y / height) * 40)
-					gradient[y, x] = [r, g, b]
-		elif providers == 'runway':
-			# Green-teal gradient
-			for y in range(height):
-				for x in range(width):
-					r = int(10 + (y / height) * 30)
-					g = int(40 + (x / width) * 40)
-					b = int(50 + (y / height) * 20)
-					gradient[y, x] = [r, g, b]
-		elif providers == 'did':
-			# Orange-red gradient
-			for y in range(height):
-				for x in range(width):
-					r = int(50 + (x / width) * 40)
-					g = int(20 + (y / height) * 30)
-					b = int(30 + (x / width) * 20)
-					gradient[y, x] = [r, g, b]
-		elif providers == 'replicate':
-			# Purple-pink gradient
-			for y in range(height):
-				for x in range(width):
-					r = int(40 + (y / height) * 40)
-					g = int(10 + (x / width) * 25)
-					b = int(50 + (y / height) * 40)
-					gradient[y, x] = [r, g, b]
-		else:
-			# Default gradient
-			for y in range(height):
-				for x in range(width):
-					r = int(30 + (x / width) * 30)
-					g = int(30 + (y / height) * 30)
-					b = int(40 + (x / width) * 40)
-					gradient[y, x] = [r, g, b]
-
-		# Convert to PIL Image
-		image = Image.fromarray(gradient)
-
-		# Apply blur
-		image = image.filter(ImageFilter.GaussianBlur(radius=10))
+		# Gradient background based on the provider
+		palette = providers if providers in ANIMATION_PLACEHOLDER_PALETTES else None
+		image = get_animation_background(palette, width, height).copy()
 
 		# Create a drawing context
 		draw = ImageDraw.Draw(image)
 
-		# Try to load fonts, use default if not available
-		try:
-			title_font = ImageFont.truetype("arial.ttf", 48)
-			subtitle_font = ImageFont.truetype("arial.ttf", 32)
-			note_font = ImageFont.truetype("arial.ttf", 20)
-		except IOError:
-			title_font = ImageFont.load_default()
-			subtitle_font = ImageFont.load_default()
-			note_font = ImageFont.load_default()
+		# Loaded once per process, PIL's default font if not available
+		title_font = get_font(48)
+		subtitle_font = get_font(32)
+		note_font = get_font(20)
 
 		# Draw title
 		title_color = (240, 240, 255)
@@ -1351,17 +1995,8 @@ def generate_animation_placeholder_image(title, subtitle, note="", providers="pi
 		circle_center = (width // 2, height // 2 + 100)
 		circle_radius = 50
 
-		# Different circle colors based on the provider
-		if providers == 'pics art':
-			circle_color_base = (100, 100, 255)  # Blue
-		elif providers == 'runway':
-			circle_color_base = (100, 255, 180)  # Green
-		elif providers == 'did':
-			circle_color_base = (255, 140, 100)  # Orange
-		elif providers == 'replicate':
-			circle_color_base = (200, 100, 255)  # Purple
-		else:
-			circle_color_base = (180, 180, 255)  # Default
+		# Circle colour of the provider
+		circle_color_base = ANIMATION_PLACEHOLDER_PALETTES[palette][3]
 
 		for i in range(5):
 			circle_color = (*circle_color_base, 50 - i * 10)
@@ -1433,84 +2068,82 @@ def get_collections():
 		path = request.args.get('path', '')
 		user_id = current_user.id
 
+		# Paging and sorting (limit, cursor, sort, order); recent defaults to newest first
+		try:
+			# The recent feed pages by activity time with its own cursor
+			listing_args = request.args
+			if path == 'recent':
+				listing_args = {key: value for key, value in request.args.items() if key != 'cursor'}
+			listing_params = parse_listing_params(listing_args, 'modified' if path == 'recent' else 'name')
+		except ValueError as e:
+			return jsonify({'error': str(e)}), 400
+		next_cursor = None
+
 		# Optional owner browsing (shared folder deep navigation)
 		owner_id_param = request.args.get('owner_id')
 		if owner_id_param and int(owner_id_param) != user_id and path not in ('shared', 'permitted'):
 			owner_id = int(owner_id_param)
 			# Check that requested path (or its parent) is shared with the user
-			shared_entries = SharedFile.query.filter_by(owner_id=owner_id, shared_with_id=user_id).all()
-			allowed = False
-			for s in shared_entries:
-				# Allow browsing inside shared folder hierarchy
-				# Allow if requested path matches a shared item OR is a parent folder of a shared item
-				if s.path == path or s.path.startswith(path.rstrip('/') + '/') or path.startswith(s.path.rstrip('/') + '/'):
-					allowed = True
-					break
-			if not allowed:
+			grants = get_share_grants(owner_id, user_id)
+			if not grants.allows(path):
 				return jsonify({'error': 'Access denied: item not shared with you'}), 403
 
 			# Switch context to owner directory
 			user_collections_dir = get_user_collections_dir(owner_id)
 			abs_path = os.path.join(user_collections_dir, path.lstrip('/'))
 
-			# If dir doesn't exist
-			if not os.path.exists(abs_path):
-				# The folder may be virtual (path segment of shared items). Build listing from shared entries.
+			# Folders merely leading to shared items, or no longer on disk, only show the shared branches
+			if not grants.covers(path) or not os.path.exists(abs_path):
+				# The folder may be virtual (path segment of shared items). Build listing from the grant trie.
 				virtual_items = []
-				child_names = set()
-				for entry in shared_entries:
-					if entry.path.startswith(path.rstrip('/') + '/'):
-						remaining = entry.path[len(path.rstrip('/') + '/'):]
-						first_seg = remaining.split('/', 1)[0]
-						# Skip if already added
-						if first_seg in child_names:
-							continue
-						child_names.add(first_seg)
-						child_abs = os.path.join(user_collections_dir, path.lstrip('/'), first_seg)
-						is_dir = '/' in remaining
-						item = {
-							'name': first_seg,
-							'path': f"{path.rstrip('/')}/{first_seg}".lstrip('/'),
-							'type': 'folder' if is_dir else 'file',
-							'isDir': is_dir,
-							'owner_id': owner_id
-						}
-						if os.path.exists(child_abs):
-							item['createdTime'] = datetime.fromtimestamp(os.path.getctime(child_abs)).isoformat()
-							item['modifiedTime'] = datetime.fromtimestamp(os.path.getmtime(child_abs)).isoformat()
-						virtual_items.append(item)
-				# If we found virtual items, return them instead of 404
-				if virtual_items:
-					virtual_items.sort(key=lambda x: (0 if x.get('isDir') else 1, x['name'].lower()))
-					return jsonify(virtual_items)
-				return jsonify({'error': 'Path does not exist'}), 404
-
-			items = []
-			for item_name in os.listdir(abs_path):
-				item_path = os.path.join(abs_path, item_name)
-				rel_path = os.path.join(path, item_name) if path else item_name
-
-				item = {
-					'name': item_name,
-					'path': rel_path,
-					'type': 'folder' if os.path.isdir(item_path) else 'file',
-					'isDir': os.path.isdir(item_path),
-					'owner_id': owner_id,
-					'createdTime': datetime.fromtimestamp(os.path.getctime(item_path)).isoformat(),
-					'modifiedTime': datetime.fromtimestamp(os.path.getmtime(item_path)).isoformat()
-				}
-				if os.path.isfile(item_path):
-					item['size'] = os.path.getsize(item_path)
-					if is_image_file(item_name):
-						item['isImage'] = True
-				items.append(item)
-
-			# Sort items folders first
-			items.sort(key=lambda x: (0 if x.get('isDir') else 1, x['name'].lower()))
-
-			return jsonify(items)
-
-
+				node = grants.node(path)
+				for first_seg, child in (node.children.items() if node else []):
+					child_abs = os.path.join(user_collections_dir, path.lstrip('/'), first_seg)
+					try:
+						child_stat = os.stat(child_abs)
+					except OSError:
+						child_stat = None
+					is_dir = stat.S_ISDIR(child_stat.st_mode) if child_stat else bool(child.children)
+					item = {
+						'name': first_seg,
+						'path': f"{path.rstrip('/')}/{first_seg}".lstrip('/'),
+						'type': 'folder' if is_dir else 'file',
+						'isDir': is_dir,
+						'owner_id': owner_id
+					}
+					if child_stat:
+						item['createdTime'] = datetime.fromtimestamp(child_stat.st_ctime).isoformat()
+						item['modifiedTime'] = datetime.fromtimestamp(child_stat.st_mtime).isoformat()
+						if not is_dir:
+							item['size'] = child_stat.st_size
+					virtual_items.append(add_signed_urls(item, owner_id))
+				# If we found virtual items, return them instead of 404
+				if not virtual_items:
+					return jsonify({'error': 'Path does not exist'}), 404
+				virtual_items.sort(key=lambda x: (0 if x.get('isDir') else 1, x['name'].lower()))
+				try:
+					items, next_cursor = paginate_items(virtual_items, listing_params)
+				except ValueError as e:
+					return jsonify({'error': str(e)}), 400
+			else:
+				# Served from the owner's metadata index, folders first
+				try:
+					items, next_cursor = list_folder(owner_id, path, abs_path, listing_params)
+				except ValueError as e:
+					return jsonify({'error': str(e)}), 400
+				for item in items:
+					item['owner_id'] = owner_id
+					add_signed_urls(item, owner_id)
+
+			return jsonify({
+				'collections': items,
+				'path': path,
+				'parent': os.path.dirname(path) if path else None,
+				'owner_id': owner_id,
+				'next_cursor': next_cursor
+			})
+
+
 		# Validate and sanitize path to prevent directory traversal
 		if not is_safe_path(path):
 			app.logger.warning(f"Invalid path attempt: User {user_id} tried to access unsafe path '{path}'")
@@ -1541,14 +2174,15 @@ def get_collections():
 		items = []
 
 		if path == 'recent':
-			# Get recent collections from database
-			recent_files = Collection.query.filter_by(
-				owner_id=user_id,
-				is_folder=False
-			).order_by(Collection.modified_at.desc()).limit(20).all()
-
-			for item in recent_files:
-				items.append(item.to_dict())
+			# Served from the activity log, 20 at a time unless a limit is given
+			try:
+				items, next_cursor = get_recent_feed(
+					user_id, listing_params['limit'] or 20, request.args.get('cursor'))
+			except ValueError as e:
+				return jsonify({'error': str(e)}), 400
+			if not request.args.get('limit') and not request.args.get('cursor'):
+				# The unpaged feed has always been just the latest 20
+				next_cursor = None
 
 		# Special case for "favorites" virtual folder
 		elif path == 'favorites':
@@ -1565,176 +2199,39 @@ def get_collections():
 		# Special case for "shared" virtual folder
 		elif path in ('shared', 'permitted'):
 			# Get files shared with this user
-			shared_files = SharedFile.query.filter_by(shared_with_id=user_id).all()
-
-			app.logger.info(f"Found {len(shared_files)} shared files for user {user_id}")
-
-			for shared in shared_files:
-				try:
-					# Get the owner's username
-					owner = User.query.get(shared.owner_id)
-					if not owner:
-						app.logger.warning(
-							f"Owner not found for shared file: {shared.path}, owner_id: {shared.owner_id}")
-						continue
-
-					# For files, check if they exist in the owner's directory
-					owner_path = os.path.join(get_user_collections_dir(shared.owner_id), shared.path.lstrip('/'))
-
-					if not os.path.exists(owner_path):
-						app.logger.warning(f"Shared file not found: {owner_path}")
-						continue
-
-					# Check if there's a collection entry
-					collection = Collection.query.filter_by(path=shared.path, owner_id=shared.owner_id).first()
-
-					if collection:
-						# Use the collection entry
-						item_dict = collection.to_dict()
-						item_dict['owner_id'] = shared.owner_id
-					else:
-						# Create a dictionary with file information
-						is_dir = os.path.isdir(owner_path)
-						filename = os.path.basename(shared.path)
-
-						item_dict = {
-							'name': filename,
-							'path': shared.path,
-							'owner_id': shared.owner_id,
-							'type': 'folder' if is_dir else 'file',
-							'isDir': is_dir,
-							'createdTime': datetime.fromtimestamp(os.path.getctime(owner_path)).isoformat(),
-                                'modifiedTime': datetime.fromtimestamp(os.path.getmtime(owner_path)).isoformat()
-						}
-
-						# Add size for files
-						if not is_dir:
-							item_dict['size'] = os.path.getsize(owner_path)
-
-							# Mark as image if it's an image file
-							if is_image_file(filename):
-								item_dict['isImage'] = True
-
-					# Add owner information
-					item_dict['shared_by'] = owner.username
-					item_dict['owner_id'] = shared.owner_id
-					items.append(item_dict)
-
-				except Exception as e:
-					app.logger.error(f"Error processing shared file {shared.path}: {str(e)}")
+			items = get_shared_items(user_id)
+			app.logger.info(f"Found {len(items)} shared items for user {user_id}")
 
 		# Special case for "trash" virtual folder
 		elif path == 'trash':
-			# Get files in trash
-			trash_items = UserTrash.query.filter_by(user_id=user_id).all()
-			for trash in trash_items:
-				try:
-					# Get the file info
-					file_info = get_file_info(trash.file_path, user_id)
-					items.append(file_info)
-				except Exception as e:
-					app.logger.error(f"Error processing trash file {trash.file_path}: {str(e)}")
-
-		elif False:  # removed duplicate permitted block
-		# ---
-			# Get files shared with the user
-			shared_files = SharedFile.query.filter_by(shared_with_id=user_id).all()
-
-			app.logger.info(f"Found {len(shared_files)} shared files for user {user_id}")
-
-			for shared in shared_files:
-				try:
-					# Get the owner's username
-					owner = User.query.get(shared.owner_id)
-					if not owner:
-						app.logger.warning(
-							f"Owner not found for shared file: {shared.path}, owner_id: {shared.owner_id}")
-						continue
-
-					# For files, check if they exist in the owner's directory
-					owner_path = os.path.join(get_user_collections_dir(shared.owner_id), shared.path.lstrip('/'))
-
-					if not os.path.exists(owner_path):
-						app.logger.warning(f"Shared file not found: {owner_path}")
-						continue
-
-					# Check if there's a collection entry
-					collection = Collection.query.filter_by(path=shared.path, owner_id=shared.owner_id).first()
-
-					if collection:
-						# Use the collection entry
-						item_dict = collection.to_dict()
-						item_dict['owner_id'] = shared.owner_id
-					else:
-						# Create a dictionary with file information
-						is_dir = os.path.isdir(owner_path)
-						filename = os.path.basename(shared.path)
-
-						item_dict = {
-							'name': filename,
-							'path': shared.path,
-							'owner_id': shared.owner_id,
-							'type': 'folder' if is_dir else 'file',
-							'isDir': is_dir,
-							'createdTime': datetime.fromtimestamp(os.path.getctime(owner_path)).isoformat(),
-                                'modifiedTime': datetime.fromtimestamp(os.path.getmtime(owner_path)).isoformat()
-						}
-
-						# Add size for files
-						if not is_dir:
-							item_dict['size'] = os.path.getsize(owner_path)
-
-							# Mark as image if it's an image file
-							if is_image_file(filename):
-								item_dict['isImage'] = True
-
-					# Add owner information
-					item_dict['shared_by'] = owner.username
-					item_dict['owner_id'] = shared.owner_id
-					items.append(item_dict)
-
-				except Exception as e:
-					app.logger.error(f"Error processing shared file {shared.path}: {str(e)}")
+			# Get items in the user's trash area
+			items = get_trash_items(user_id)
 
 		# Normal directory listing
 		else:
 			try:
-				for item_name in os.listdir(abs_path):
-					item_path = os.path.join(abs_path, item_name)
-					rel_path = os.path.join(path, item_name) if path else item_name
-
-					# Create item object
-					item = {
-						'name': item_name,
-						'path': rel_path,
-						'type': 'folder' if os.path.isdir(item_path) else 'file',
-						'isDir': os.path.isdir(item_path),
-						'createdTime': datetime.fromtimestamp(os.path.getctime(item_path)).isoformat(),
-                        'modifiedTime': datetime.fromtimestamp(os.path.getmtime(item_path)).isoformat()
-					}
-
-					# Add size for files
-					if os.path.isfile(item_path):
-						item['size'] = os.path.getsize(item_path)
-
-						# Mark as image if it's an image file
-						if is_image_file(item_name):
-							item['isImage'] = True
-
-					items.append(item)
-
-				# Sort items (folders first, then alphabetically)
-				items.sort(key=lambda x: (0 if x.get('isDir', x.get('type') == 'folder') else 1, x['name'].lower()))
+				# Served from the metadata index; the disk is only scanned when the folder changed
+				items, next_cursor = list_folder(user_id, path, abs_path, listing_params)
+			except ValueError as e:
+				return jsonify({'error': str(e)}), 400
 			except PermissionError:
 				return jsonify({'error': 'Permission denied'}), 403
 			except Exception as e:
 				app.logger.error(f"Error listing collections: {str(e)}")
 				return jsonify({'error': 'Failed to list items'}), 500
 
+		# Virtual folders other than recent are resolved in full, then paged with the same cursor contract
+		if path in ('favorites', 'shared', 'permitted', 'trash'):
+			try:
+				items, next_cursor = paginate_items(items, listing_params)
+			except ValueError as e:
+				return jsonify({'error': str(e)}), 400
+
 		return jsonify({
 			'collections': items,
 			'path': path,
-			'parent': os.path.dirname(path) if path else None
+			'parent': os.path.dirname(path) if path else None,
+			'next_cursor': next_cursor
 		})
 	except Exception as e:
 		app.logger.error(f"Unexpected error in get_collections: {str(e)}")
@@ -1788,17 +2285,22 @@ def create_folder():
 
 		# Create folder
 		try:
+			parent_mtime = get_dir_mtime(parent_path)
 			os.makedirs(new_folder_path, exist_ok=True)
 
 			# Add to database
 			folder_rel_path = os.path.join(path, name) if path else name
+			folder_stat = os.stat(new_folder_path)
 			new_folder = Collection(
 				path=folder_rel_path,
 				name=name,
 				is_folder=True,
+				created_at=datetime.fromtimestamp(folder_stat.st_ctime),
+				modified_at=datetime.fromtimestamp(folder_stat.st_mtime),
 				owner_id=user_id
 			)
 			db.session.add(new_folder)
+			mark_folder_synced(user_id, path.strip('/'), parent_path, parent_mtime)
 			db.session.commit()
 
 			return jsonify({
@@ -1815,6 +2317,338 @@ def create_folder():
 		return jsonify({'error': 'An unexpected error occurred'}), 500
 
 
+# --- Content-addressed blob store ---
+
+BLOB_COPY_CHUNK = 1024 * 1024
+
+
+def get_blob_path(digest):
+	return os.path.join(BLOBS_ROOT, digest[:2], digest)
+
+
+def hash_file(file_path):
+	"""SHA-256 hex digest of a file, read in chunks"""
+	digest = hashlib.sha256()
+	with open(file_path, 'rb') as source:
+		while True:
+			chunk = source.read(BLOB_COPY_CHUNK)
+			if not chunk:
+				break
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def link_blob(source_path, digest, file_path):
+	"""
+    Place the content of source_path at file_path through the blob store and return digest.
+    Known content becomes a hard link to the existing blob and source_path is dropped; new content
+    becomes the blob. source_path may be file_path itself to deduplicate a file already in place.
+    Returns None (and just moves the file) when hard links are not possible.
+    """
+	blob_path = get_blob_path(digest)
+	try:
+		os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+		try:
+			os.link(source_path, blob_path)
+		except FileExistsError:
+			if not os.path.samefile(blob_path, source_path):
+				# Link under a temporary name first so file_path is swapped atomically
+				temp_link = os.path.join(BLOBS_ROOT, f".tmp-{uuid.uuid4().hex}")
+				os.link(blob_path, temp_link)
+				os.replace(temp_link, file_path)
+				if source_path != file_path:
+					os.remove(source_path)
+				return digest
+	except OSError as e:
+		# EXDEV, EMLINK (link limit reached) or a filesystem without hard links
+		app.logger.warning(f"Storing {file_path} without deduplication: {str(e)}")
+		if source_path != file_path:
+			shutil.move(source_path, file_path)
+		return None
+
+	if source_path != file_path:
+		os.replace(source_path, file_path)
+	return digest
+
+
+def save_upload_stream(stream, file_path):
+	"""
+    Write an uploaded stream to file_path, hashing it as it is written, and deduplicate it.
+    Returns the content hash, or None when the file was stored without deduplication.
+    """
+	temp_path = os.path.join(BLOBS_ROOT, f".tmp-{uuid.uuid4().hex}")
+	digest = hashlib.sha256()
+	try:
+		with open(temp_path, 'wb') as target:
+			while True:
+				chunk = stream.read(BLOB_COPY_CHUNK)
+				if not chunk:
+					break
+				digest.update(chunk)
+				target.write(chunk)
+
+		if not DEDUP_UPLOADS:
+			shutil.move(temp_path, file_path)
+			return None
+		return link_blob(temp_path, digest.hexdigest(), file_path)
+	finally:
+		if os.path.exists(temp_path):
+			os.remove(temp_path)
+
+
+def release_blob(digest):
+	"""
+    Drop a blob (and its renditions) once no collection file links to it any more.
+    Call after the collection file is gone; blobs missed here are removed by collect_blob_garbage.
+    """
+	if not digest:
+		return
+	blob_path = get_blob_path(digest)
+	try:
+		blob_stat = os.stat(blob_path)
+		if blob_stat.st_nlink == 1:
+			remove_thumbnails(blob_path, blob_stat)
+			os.remove(blob_path)
+	except FileNotFoundError:
+		pass
+	except OSError as e:
+		app.logger.error(f"Error releasing blob {digest}: {str(e)}")
+
+
+def collect_blob_garbage():
+	"""Delete blobs no collection file links to and stale temporary files; returns (files removed, bytes freed)"""
+	# Blobs touched during the grace period may be in the middle of being linked
+	cutoff = time.time() - BLOB_GC_GRACE
+	removed = freed = 0
+	for blob_path, blob_stat in iter_collection_files(BLOBS_ROOT):
+		if blob_stat.st_ctime > cutoff:
+			continue
+		if '.tmp-' not in os.path.basename(blob_path) and blob_stat.st_nlink > 1:
+			continue
+		try:
+			remove_thumbnails(blob_path, blob_stat)
+			os.remove(blob_path)
+			removed += 1
+			freed += blob_stat.st_size
+		except OSError:
+			pass
+
+	app.logger.info(f"Blob GC removed {removed} files, freed {freed} bytes")
+	return removed, freed
+
+
+def get_dedup_report():
+	"""Bytes the collections would take without deduplication versus the bytes stored"""
+	blobs = references = stored = saved = 0
+	for blob_path, blob_stat in iter_collection_files(BLOBS_ROOT):
+		if '.tmp-' in os.path.basename(blob_path):
+			continue
+		links = blob_stat.st_nlink - 1
+		blobs += 1
+		references += links
+		stored += blob_stat.st_size
+		# Every reference beyond the first is a copy that was never written
+		saved += blob_stat.st_size * max(links - 1, 0)
+
+	return {
+		'blobs': blobs,
+		'references': references,
+		'storedBytes': stored,
+		'logicalBytes': stored + saved,
+		'savedBytes': saved
+	}
+
+
+@app.cli.command('dedup-report')
+def dedup_report_command():
+	"""Show how much disk space deduplication saves."""
+	report = get_dedup_report()
+	ratio = report['savedBytes'] / report['logicalBytes'] * 100 if report['logicalBytes'] else 0
+	print(f"{report['references']} files backed by {report['blobs']} blobs")
+	print(f"Stored {report['storedBytes']} of {report['logicalBytes']} bytes, saved {report['savedBytes']} bytes ({ratio:.1f}%)")
+
+
+@app.cli.command('gc-blobs')
+def gc_blobs_command():
+	"""Remove blobs that no collection file references."""
+	removed, freed = collect_blob_garbage()
+	print(f"Removed {removed} unreferenced blobs ({freed} bytes)")
+
+
+@app.cli.command('dedup-collections')
+def dedup_collections_command():
+	"""Move files uploaded before deduplication into the blob store."""
+	interned = 0
+	rows = Collection.query.filter(Collection.is_folder == False, Collection.content_hash.is_(None)).all()
+	for row in rows:
+		file_path = os.path.join(get_user_collections_dir(row.owner_id), row.path)
+		try:
+			if not os.path.isfile(file_path) or os.path.islink(file_path):
+				continue
+			row.content_hash = link_blob(file_path, hash_file(file_path), file_path)
+			if row.content_hash:
+				# A duplicate now shares the blob's inode, and with it the blob's size and mtime
+				file_stat = os.stat(file_path)
+				row.size = file_stat.st_size
+				row.modified_at = datetime.fromtimestamp(file_stat.st_mtime)
+				interned += 1
+		except OSError as e:
+			print(f"Skipping {file_path}: {str(e)}")
+		if interned % 500 == 0:
+			db.session.commit()
+	db.session.commit()
+	print(f"Deduplicated {interned} of {len(rows)} files")
+
+
+# --- Storage accounting ---
+
+def adjust_storage_used(user_id, delta):
+	"""Add delta bytes to the user's counter as an in-database increment; the caller commits"""
+	if delta:
+		User.query.filter_by(id=user_id).update(
+			{User.storage_used: User.storage_used + delta}, synchronize_session=False
+		)
+
+
+def get_tree_size(path):
+	"""Bytes of the file at path, or of every file below it; 0 if nothing is there"""
+	try:
+		top_stat = os.lstat(path)
+	except OSError:
+		return 0
+	if not stat.S_ISDIR(top_stat.st_mode):
+		return top_stat.st_size
+	return sum(file_stat.st_size for _, file_stat in iter_collection_files(path))
+
+
+def scan_storage_usage(user_id):
+	"""Bytes under the user's collections and trash directories, one os.scandir pass per directory"""
+	return get_tree_size(os.path.join(COLLECTIONS_ROOT, str(user_id))) + get_tree_size(get_user_trash_dir(user_id))
+
+
+def get_storage_usage(user_id):
+	"""The user's counter with the quota and remaining space (None when unlimited)"""
+	used, checked_at = db.session.query(User.storage_used, User.storage_checked_at).filter_by(id=user_id).one()
+	used = max(used or 0, 0)
+	return {
+		'used': used,
+		'quota': STORAGE_QUOTA or None,
+		'available': max(STORAGE_QUOTA - used, 0) if STORAGE_QUOTA else None,
+		'checkedAt': checked_at.isoformat() if checked_at else None
+	}
+
+
+def check_storage_quota(user_id, incoming):
+	"""Error message if incoming more bytes would take the user over STORAGE_QUOTA, otherwise None"""
+	if not STORAGE_QUOTA:
+		return None
+	used = db.session.query(User.storage_used).filter_by(id=user_id).scalar() or 0
+	if used + incoming > STORAGE_QUOTA:
+		return f"Storage quota exceeded: {used} of {STORAGE_QUOTA} bytes used"
+	return None
+
+
+def reconcile_storage_usage(user_ids=None):
+	"""
+    Recompute the counters from disk, scanning STORAGE_SCAN_WORKERS users in parallel.
+    A counter is only overwritten if it did not change while its user was scanned; users with
+    uploads or deletions in flight are picked up by the next pass. Returns {user_id: drift}.
+    """
+	query = db.session.query(User.id, User.storage_used)
+	if user_ids is not None:
+		query = query.filter(User.id.in_(user_ids))
+	counters = dict(query.all())
+	db.session.commit()
+
+	with ThreadPoolExecutor(max_workers=STORAGE_SCAN_WORKERS) as pool:
+		scanned = dict(zip(counters, pool.map(scan_storage_usage, counters)))
+
+	drift = {}
+	skipped = 0
+	checked_at = datetime.utcnow()
+	for user_id, used in scanned.items():
+		updated = User.query.filter_by(id=user_id, storage_used=counters[user_id]).update(
+			{User.storage_used: used, User.storage_checked_at: checked_at}, synchronize_session=False
+		)
+		if not updated:
+			skipped += 1
+		elif used != counters[user_id]:
+			drift[user_id] = used - (counters[user_id] or 0)
+	db.session.commit()
+
+	app.logger.info(f"Storage reconciliation checked {len(scanned) - skipped} users, corrected {len(drift)}, "
+	                f"skipped {skipped} with concurrent changes")
+	return drift
+
+
+@app.cli.command('reconcile-storage')
+def reconcile_storage_command():
+	"""Recompute every user's storage usage from disk."""
+	drift = reconcile_storage_usage()
+	for user_id, delta in sorted(drift.items()):
+		print(f"User {user_id}: corrected by {delta:+d} bytes")
+	print(f"Corrected {len(drift)} storage counters")
+
+
+def record_uploaded_file(user_id, path, filename, file_path, mime_type, existing_rows, content_hash=None,
+                         replaced_size=0):
+	"""
+    Create the thumbnail and insert or update the Collection row for a file that is now on disk.
+    existing_rows maps names to the rows of the target folder; replaced_size is the size of the file
+    the upload overwrote. The caller commits. Returns the entry reported back to the uploader.
+    """
+	# Get file size and timestamps in one stat call
+	file_stat = os.stat(file_path)
+	file_size = file_stat.st_size
+	file_mtime = datetime.fromtimestamp(file_stat.st_mtime)
+	adjust_storage_used(user_id, file_size - replaced_size)
+
+	# Detect file type
+	is_image = is_image_file(filename)
+	is_video = is_video_file(filename)
+
+	# Queue a thumbnail only for images; it is rendered in the background
+	if is_image:
+		queue_thumbnail(file_path)
+
+	# Add to database
+	file_rel_path = os.path.join(path, filename) if path else filename
+	existing = existing_rows.get(filename)
+	if existing:
+		# The replaced file no longer holds its blob
+		if existing.content_hash and existing.content_hash != content_hash:
+			release_blob(existing.content_hash)
+		existing.is_folder = False
+		existing.size = file_size
+		existing.mime_type = mime_type
+		existing.content_hash = content_hash
+		existing.modified_at = file_mtime
+	else:
+		new_file = Collection(
+			path=file_rel_path,
+			name=filename,
+			is_folder=False,
+			size=file_size,
+			mime_type=mime_type,
+			content_hash=content_hash,
+			created_at=datetime.fromtimestamp(file_stat.st_ctime),
+			modified_at=file_mtime,
+			owner_id=user_id
+		)
+		db.session.add(new_file)
+		existing_rows[filename] = new_file
+	log_activity(user_id, 'upload', user_id, file_rel_path)
+
+	return {
+		'name': filename,
+		'path': file_rel_path,
+		'size': file_size,
+		'isImage': is_image,
+		'isVideo': is_video,
+		'thumbnailStatus': get_thumbnail_status(file_path) if is_image else None
+	}
+
+
 @app.route('/api/collections/upload', methods=['POST'])
 @login_required
 def upload_to_collection():
@@ -1843,6 +2677,10 @@ def upload_to_collection():
 		if len(files) == 0:
 			return jsonify({'error': 'No files provided'}), 400
 
+		quota_error = check_storage_quota(user_id, request.content_length or 0)
+		if quota_error:
+			return jsonify({'error': quota_error}), 413
+
 		# Create user's collections directory if it doesn't exist
 		user_collections_dir = get_user_collections_dir(user_id)
 
@@ -1853,6 +2691,12 @@ def upload_to_collection():
 		if not os.path.exists(upload_path):
 			os.makedirs(upload_path, exist_ok=True)
 
+		# Existing rows of the target folder, so re-uploads update them instead of adding duplicates
+		upload_mtime = get_dir_mtime(upload_path)
+		existing_rows = {
+			row.name: row for row in Collection.query.filter_by(owner_id=user_id, parent_path=path.strip('/')).all()
+		}
+
 		# Upload files
 		uploaded_files = []
 		failed_files = []
@@ -1870,41 +2714,16 @@ def upload_to_collection():
 					continue
 
 				try:
-					# Save file
+					# Save file, hashing it on the way into the blob store
 					file_path = os.path.join(upload_path, filename)
-					file.save(file_path)
-
-					# Get file size
-					file_size = os.path.getsize(file_path)
-
-					# Detect file type
-					is_image = is_image_file(filename)
-					is_video = is_video_file(filename)
-
-					# Create thumbnail only for images
-					if is_image:
-						create_thumbnail(file_path)
-
-					# Add to database
-					file_rel_path = os.path.join(path, filename) if path else filename
-					new_file = Collection(
-						path=file_rel_path,
-						name=filename,
-						is_folder=False,
-						size=file_size,
-						mime_type=file.content_type if hasattr(file, 'content_type') else None,
-						owner_id=user_id
-					)
-					db.session.add(new_file)
-
-					# Add to uploaded files
-					uploaded_files.append({
-						'name': filename,
-						'path': file_rel_path,
-						'size': file_size,
-						'isImage': is_image,
-						'isVideo': is_video
-					})
+					replaced_size = get_tree_size(file_path)
+					content_hash = save_upload_stream(file.stream, file_path)
+
+					# Add to database and uploaded files
+					mime_type = file.content_type if hasattr(file, 'content_type') else None
+					uploaded_files.append(record_uploaded_file(
+						user_id, path, filename, file_path, mime_type, existing_rows, content_hash, replaced_size
+					))
 				except Exception as e:
 					app.logger.error(f"Error uploading file {filename}: {str(e)}")
 					failed_files.append({
@@ -1913,6 +2732,7 @@ def upload_to_collection():
 					})
 
 		# Commit all database changes
+		mark_folder_synced(user_id, path.strip('/'), upload_path, upload_mtime)
 		db.session.commit()
 
 		result = {
@@ -1930,6 +2750,241 @@ def upload_to_collection():
 		return jsonify({'error': 'An unexpected error occurred'}), 500
 
 
+# --- Resumable uploads ---
+# POST /api/collections/uploads starts a session, PUT /api/collections/uploads/<id>?offset=N appends the
+# raw request body at offset N, GET reports the acknowledged offset for resuming, and
+# POST /api/collections/uploads/<id>/finalize moves the completed file into the collection.
+
+def get_upload_part_path(upload_id):
+	return os.path.join(UPLOAD_SESSIONS_ROOT, f"{upload_id}.part")
+
+
+def purge_stale_upload_sessions():
+	"""Remove sessions (and their partial files) that saw no chunk for UPLOAD_SESSION_TTL"""
+	cutoff = datetime.utcnow() - UPLOAD_SESSION_TTL
+	stale = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+	for upload in stale:
+		try:
+			os.remove(get_upload_part_path(upload.id))
+		except FileNotFoundError:
+			pass
+		db.session.delete(upload)
+	if stale:
+		db.session.commit()
+
+
+def get_user_upload(upload_id):
+	return UploadSession.query.filter_by(id=upload_id, owner_id=current_user.id).first()
+
+
+@app.route('/api/collections/uploads', methods=['POST'])
+@login_required
+def start_upload():
+	"""Start a resumable upload of one file into a collection folder"""
+	try:
+		if not request.is_json:
+			return jsonify({'error': 'Invalid request format, JSON required'}), 400
+
+		data = request.json
+		path = data.get('path', '')
+		filename = secure_filename(data.get('filename', ''))
+		user_id = current_user.id
+
+		try:
+			total_size = int(data.get('size'))
+		except (TypeError, ValueError):
+			return jsonify({'error': 'File size is required'}), 400
+
+		if total_size < 0 or total_size > UPLOAD_MAX_FILE_SIZE:
+			return jsonify({'error': 'File size is out of range'}), 400
+
+		if not filename or not is_valid_filename(filename):
+			return jsonify({'error': 'Invalid filename'}), 400
+
+		if not is_safe_path(path):
+			app.logger.warning(f"Invalid path attempt: User {user_id} tried to access unsafe path '{path}'")
+			return jsonify({'error': 'Invalid path'}), 400
+
+		if not verify_collection_ownership(path, user_id):
+			app.logger.warning(
+				f"Access denied: User {user_id} attempted to access path '{path}' outside their directory")
+			return jsonify({'error': 'Access denied: path is outside of user directory'}), 403
+
+		quota_error = check_storage_quota(user_id, total_size)
+		if quota_error:
+			return jsonify({'error': quota_error}), 413
+
+		purge_stale_upload_sessions()
+
+		upload = UploadSession(
+			id=uuid.uuid4().hex,
+			owner_id=user_id,
+			path=path,
+			filename=filename,
+			mime_type=data.get('mime_type') or mimetypes.guess_type(filename)[0],
+			total_size=total_size,
+			received=0
+		)
+		open(get_upload_part_path(upload.id), 'wb').close()
+		db.session.add(upload)
+		db.session.commit()
+
+		return jsonify(upload.to_dict()), 201
+	except Exception as e:
+		db.session.rollback()
+		app.logger.error(f"Unexpected error in start_upload: {str(e)}")
+		return jsonify({'error': 'An unexpected error occurred'}), 500
+
+
+@app.route('/api/collections/uploads/<upload_id>', methods=['GET'])
+@login_required
+def get_upload_status(upload_id):
+	"""Report the last acknowledged offset so an interrupted upload can resume"""
+	upload = get_user_upload(upload_id)
+	if not upload:
+		return jsonify({'error': 'Upload not found'}), 404
+	return jsonify(upload.to_dict())
+
+
+@app.route('/api/collections/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def append_upload_chunk(upload_id):
+	"""
+    Append the raw request body at ?offset= (or the Upload-Offset header).
+    The body is streamed to disk in blocks and fsynced before the new offset is acknowledged.
+    """
+	try:
+		upload = get_user_upload(upload_id)
+		if not upload:
+			return jsonify({'error': 'Upload not found'}), 404
+
+		try:
+			offset = int(request.args.get('offset', request.headers.get('Upload-Offset', '')))
+		except ValueError:
+			return jsonify({'error': 'Chunk offset is required'}), 400
+
+		# Chunks must arrive in order; tell the client where to resume
+		if offset != upload.received:
+			return jsonify({'error': 'Offset mismatch', 'offset': upload.received}), 409
+
+		remaining = upload.total_size - offset
+		if request.content_length is not None and request.content_length > remaining:
+			return jsonify({'error': 'Chunk exceeds declared file size', 'offset': upload.received}), 400
+
+		written = 0
+		with open(get_upload_part_path(upload.id), 'r+b') as part:
+			# One writer per upload from the write through the offset update: a losing chunk must not
+			# truncate bytes another request has already had acknowledged
+			try:
+				fcntl.flock(part.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+			except BlockingIOError:
+				return jsonify({'error': 'Another chunk is being written', 'offset': upload.received}), 409
+			received = db.session.query(UploadSession.received).filter_by(id=upload.id).scalar()
+			if received is None:
+				return jsonify({'error': 'Upload not found'}), 404
+			if offset != received:
+				return jsonify({'error': 'Offset mismatch', 'offset': received}), 409
+
+			part.seek(offset)
+			while True:
+				block = request.stream.read(1024 * 1024)
+				if not block:
+					break
+				written += len(block)
+				if written > remaining:
+					# Nothing past the acknowledged offset counts; the next chunk overwrites it
+					return jsonify({'error': 'Chunk exceeds declared file size', 'offset': upload.received}), 400
+				part.write(block)
+			# Cut off leftovers of an earlier chunk that was never acknowledged
+			part.truncate(offset + written)
+			part.flush()
+			os.fsync(part.fileno())
+
+			# Only the request that still sees the old offset may advance it; committed before the lock goes
+			updated = UploadSession.query.filter_by(id=upload.id, received=offset).update({
+				'received': offset + written,
+				'updated_at': datetime.utcnow()
+			})
+			db.session.commit()
+		if not updated:
+			db.session.refresh(upload)
+			return jsonify({'error': 'Concurrent chunk for the same offset', 'offset': upload.received}), 409
+
+		return jsonify({'upload_id': upload.id, 'offset': offset + written, 'size': upload.total_size})
+	except Exception as e:
+		db.session.rollback()
+		app.logger.error(f"Unexpected error in append_upload_chunk: {str(e)}")
+		return jsonify({'error': 'An unexpected error occurred'}), 500
+
+
+@app.route('/api/collections/uploads/<upload_id>/finalize', methods=['POST'])
+@login_required
+def finalize_upload(upload_id):
+	"""Move a completely received file into the collection and record it"""
+	try:
+		upload = get_user_upload(upload_id)
+		if not upload:
+			return jsonify({'error': 'Upload not found'}), 404
+
+		if upload.received != upload.total_size:
+			return jsonify({'error': 'Upload is incomplete', 'offset': upload.received}), 409
+
+		user_id = current_user.id
+		path = upload.path
+		upload_path = os.path.join(get_user_collections_dir(user_id), path)
+		os.makedirs(upload_path, exist_ok=True)
+
+		upload_mtime = get_dir_mtime(upload_path)
+		existing_rows = {
+			row.name: row for row in Collection.query.filter_by(owner_id=user_id, parent_path=path.strip('/')).all()
+		}
+
+		file_path = os.path.join(upload_path, upload.filename)
+		part_path = get_upload_part_path(upload.id)
+		replaced_size = get_tree_size(file_path)
+		# Checked again now: other uploads may have used up the space since this one started. The
+		# received bytes are kept, so the upload can be finalized once space is freed, or aborted.
+		quota_error = check_storage_quota(user_id, upload.total_size - replaced_size)
+		if quota_error:
+			return jsonify({'error': quota_error}), 413
+		if DEDUP_UPLOADS:
+			# Chunks arrive in separate requests, so the assembled file is hashed here
+			content_hash = link_blob(part_path, hash_file(part_path), file_path)
+		else:
+			os.replace(part_path, file_path)
+			content_hash = None
+
+		uploaded = record_uploaded_file(
+			user_id, path, upload.filename, file_path, upload.mime_type, existing_rows, content_hash, replaced_size
+		)
+		db.session.delete(upload)
+		mark_folder_synced(user_id, path.strip('/'), upload_path, upload_mtime)
+		db.session.commit()
+
+		return jsonify({'success': True, 'uploaded': [uploaded], 'failed': []})
+	except Exception as e:
+		db.session.rollback()
+		app.logger.error(f"Unexpected error in finalize_upload: {str(e)}")
+		return jsonify({'error': 'An unexpected error occurred'}), 500
+
+
+@app.route('/api/collections/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def abort_upload(upload_id):
+	"""Abandon an upload and discard the received bytes"""
+	upload = get_user_upload(upload_id)
+	if not upload:
+		return jsonify({'error': 'Upload not found'}), 404
+
+	try:
+		os.remove(get_upload_part_path(upload.id))
+	except FileNotFoundError:
+		pass
+	db.session.delete(upload)
+	db.session.commit()
+	return jsonify({'success': True})
+
+
 @app.route('/api/collections/file/<path:path>', methods=['GET'])
 @login_required
 def get_collection_file(path):
@@ -1976,13 +3031,20 @@ def get_collection_file(path):
 		return jsonify({'error': 'Access denied: path is outside of user directory'}), 403
 
 	# Check if file exists
-	if not os.path.exists(file_path) or not os.path.isfile(file_path):
+	try:
+		file_stat = os.stat(file_path)
+	except OSError:
+		return jsonify({'error': 'File not found'}), 404
+	if not stat.S_ISREG(file_stat.st_mode):
 		return jsonify({'error': 'File not found'}), 404
 
 	# Set the correct mime type for the file
 	mime_type, _ = mimetypes.guess_type(file_path)
 
-	return send_file(file_path, mimetype=mime_type)
+	log_file_open(user_id, owner_id, path)
+
+	version = get_file_version(file_stat.st_size, datetime.fromtimestamp(file_stat.st_mtime))
+	return send_collection_file(file_path, version, mimetype=mime_type, file_stat=file_stat)
 
 
 @app.route('/api/collections/thumbnail/<path:path>', methods=['GET'])
@@ -2031,22 +3093,233 @@ def get_collection_thumbnail(path):
 		return jsonify({'error': 'Access denied: path is outside of user directory'}), 403
 
 	# Check if file exists
-	if not os.path.exists(file_path) or not os.path.isfile(file_path):
+	try:
+		file_stat = os.stat(file_path)
+	except OSError:
+		return jsonify({'error': 'File not found'}), 404
+	if not stat.S_ISREG(file_stat.st_mode):
 		return jsonify({'error': 'File not found'}), 404
 
 	# Check if file is an image
 	if not is_image_file(file_path):
 		return jsonify({'error': 'Not an image file'}), 400
 
-	# Get thumbnail path
-	thumbnail_path = get_thumbnail_path(file_path)
+	return send_collection_thumbnail(file_path, file_stat)
+
+
+def resolve_signed_collection_file(owner_id, path):
+	"""
+    Check the signature of a signed URL and stat the file it points to.
+    Returns (file_path, file_stat, None) or (None, None, error response). No database access.
+    """
+	error = check_collection_url_signature(owner_id, path)
+	if error:
+		return None, None, (jsonify({'error': error}), 403)
+
+	owner_dir = os.path.join(COLLECTIONS_ROOT, str(owner_id))
+	file_path = os.path.normpath(os.path.join(owner_dir, path.lstrip('/')))
+	if not file_path.startswith(owner_dir + os.sep):
+		return None, None, (jsonify({'error': 'Invalid path'}), 400)
+
+	try:
+		file_stat = os.stat(file_path)
+	except OSError:
+		return None, None, (jsonify({'error': 'File not found'}), 404)
+	if not stat.S_ISREG(file_stat.st_mode):
+		return None, None, (jsonify({'error': 'File not found'}), 404)
+	return file_path, file_stat, None
+
+
+# Signed URLs from shared listings. The signature is the authorization: no session, no database.
+@app.route('/api/collections/signed/file/<int:owner_id>/<path:path>', methods=['GET'])
+def get_signed_collection_file(owner_id, path):
+	file_path, file_stat, error = resolve_signed_collection_file(owner_id, path)
+	if error:
+		return error
+
+	mime_type, _ = mimetypes.guess_type(file_path)
+	version = get_file_version(file_stat.st_size, datetime.fromtimestamp(file_stat.st_mtime))
+	return send_collection_file(file_path, version, mimetype=mime_type, file_stat=file_stat)
+
+
+@app.route('/api/collections/signed/thumbnail/<int:owner_id>/<path:path>', methods=['GET'])
+def get_signed_collection_thumbnail(owner_id, path):
+	file_path, file_stat, error = resolve_signed_collection_file(owner_id, path)
+	if error:
+		return error
+
+	if not is_image_file(file_path):
+		return jsonify({'error': 'Not an image file'}), 400
+	return send_collection_thumbnail(file_path, file_stat)
+
+
+class ZipStreamSink(io.RawIOBase):
+	"""
+    Write-only, unseekable target for zipfile. zipfile then writes data descriptors after each
+    entry instead of seeking back, and whatever it wrote so far is handed out with drain().
+    """
+
+	def __init__(self):
+		super().__init__()
+		self._chunks = []
+
+	def writable(self):
+		return True
+
+	def write(self, data):
+		self._chunks.append(bytes(data))
+		return len(data)
+
+	def drain(self):
+		data = b''.join(self._chunks)
+		self._chunks.clear()
+		return data
 
-	# Create thumbnail if it doesn't exist
-	if not os.path.exists(thumbnail_path):
-		create_thumbnail(file_path)
 
-	# Return thumbnail
-	return send_file(thumbnail_path)
+def iter_zip_entries(abs_path, arcname):
+	"""Yield (path, arcname, stat) for a file or for a folder and everything below it; symlinks are skipped"""
+	try:
+		top_stat = os.lstat(abs_path)
+	except OSError:
+		return
+	if stat.S_ISREG(top_stat.st_mode):
+		yield abs_path, arcname, top_stat
+		return
+	if not stat.S_ISDIR(top_stat.st_mode):
+		return
+
+	pending = [(abs_path, arcname, top_stat)]
+	while pending:
+		directory, dir_arcname, dir_stat = pending.pop()
+		yield directory, dir_arcname + '/', dir_stat
+		try:
+			with os.scandir(directory) as entries:
+				children = sorted(entries, key=lambda entry: entry.name)
+		except OSError:
+			continue
+		subdirectories = []
+		for entry in children:
+			try:
+				if entry.is_dir(follow_symlinks=False):
+					subdirectories.append((entry.path, f"{dir_arcname}/{entry.name}", entry.stat(follow_symlinks=False)))
+				elif entry.is_file(follow_symlinks=False):
+					yield entry.path, f"{dir_arcname}/{entry.name}", entry.stat(follow_symlinks=False)
+			except OSError:
+				continue
+		pending.extend(reversed(subdirectories))
+
+
+def stream_zip(entries):
+	"""
+    Generate a ZIP archive of (path, arcname, stat) entries chunk by chunk, in constant memory.
+    Sizes are known up front, so zipfile switches to ZIP64 on its own for large files and archives.
+    """
+	sink = ZipStreamSink()
+	with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+		for abs_path, arcname, entry_stat in entries:
+			info = zipfile.ZipInfo(arcname, time.localtime(max(entry_stat.st_mtime, 315532800))[:6])
+			info.external_attr = (entry_stat.st_mode & 0xFFFF) << 16
+
+			if arcname.endswith('/'):
+				info.external_attr |= 0x10  # MS-DOS directory flag
+				archive.writestr(info, b'')
+				continue
+
+			extension = os.path.splitext(arcname)[1].lower()
+			info.compress_type = zipfile.ZIP_STORED if extension in ZIP_STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+			info.file_size = entry_stat.st_size
+			try:
+				source = open(abs_path, 'rb')
+			except OSError as e:
+				app.logger.warning(f"Skipping {abs_path} in ZIP download: {str(e)}")
+				continue
+			with source, archive.open(info, 'w') as target:
+				while True:
+					chunk = source.read(ZIP_STREAM_CHUNK)
+					if not chunk:
+						break
+					target.write(chunk)
+					data = sink.drain()
+					if data:
+						yield data
+			data = sink.drain()
+			if data:
+				yield data
+	# Central directory
+	yield sink.drain()
+
+
+@app.route('/api/collections/download', methods=['GET', 'POST'])
+@login_required
+def download_collection_zip():
+	"""
+    Stream a ZIP of folders and/or files: GET ?path=..&path=.. or POST {"paths": [...]}.
+    With owner_id, the paths are items (or lie inside folders) shared with the current user.
+    """
+	user_id = current_user.id
+
+	if request.method == 'POST':
+		data = request.get_json(silent=True) or {}
+		paths = data.get('paths') or []
+		owner_id_param = data.get('owner_id')
+	else:
+		paths = request.args.getlist('path')
+		owner_id_param = request.args.get('owner_id')
+
+	paths = [path.strip('/') for path in paths if isinstance(path, str) and path.strip('/')]
+	if not paths:
+		return jsonify({'error': 'No paths provided'}), 400
+	try:
+		owner_id = int(owner_id_param) if owner_id_param else user_id
+	except (TypeError, ValueError):
+		return jsonify({'error': 'Invalid owner_id'}), 400
+
+	owner_dir = get_user_collections_dir(owner_id)
+	grants = get_share_grants(owner_id, user_id) if owner_id != user_id else None
+
+	selected = []
+	for path in dict.fromkeys(paths):
+		if not is_safe_path(path):
+			app.logger.warning(f"Invalid path attempt: User {user_id} tried to download unsafe path '{path}'")
+			return jsonify({'error': 'Invalid path'}), 400
+		if grants is not None:
+			if not grants.covers(path):
+				app.logger.warning(
+					f"Access denied: User {user_id} attempted to download '{path}' of user {owner_id} not shared with them")
+				return jsonify({'error': 'Access denied: item not shared with you'}), 403
+		elif not verify_collection_ownership(path, user_id):
+			app.logger.warning(
+				f"Access denied: User {user_id} attempted to download path '{path}' outside their directory")
+			return jsonify({'error': 'Access denied: path is outside of user directory'}), 403
+
+		abs_path = os.path.normpath(os.path.join(owner_dir, path))
+		if not abs_path.startswith(owner_dir + os.sep):
+			return jsonify({'error': 'Access denied: path is outside of user directory'}), 403
+		if not os.path.exists(abs_path):
+			return jsonify({'error': f'Path does not exist: {path}'}), 404
+		selected.append(path)
+
+	# A selected item inside another selected folder is already part of the archive
+	selected = [path for path in selected if not any(path.startswith(other + '/') for other in selected)]
+
+	# Entries are named relative to the folder the selection was made in
+	base = posixpath.commonpath([posixpath.dirname(path) for path in selected])
+	if len(selected) == 1:
+		archive_name = posixpath.basename(selected[0])
+	else:
+		archive_name = posixpath.basename(base) or 'collection'
+
+	def entries():
+		for path in selected:
+			arcname = posixpath.relpath(path, base) if base else path
+			yield from iter_zip_entries(os.path.join(owner_dir, path), arcname)
+
+	response = app.response_class(stream_zip(entries()), mimetype='application/zip')
+	response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(archive_name + '.zip')}"
+	response.headers['Cache-Control'] = 'no-store'
+	# Let a fronting nginx pass chunks through as they are produced
+	response.headers['X-Accel-Buffering'] = 'no'
+	return response
 
 
 @app.route('/api/collections/analyze', methods=['POST'])
@@ -2144,82 +3417,740 @@ def analyze_image(file_path):
 		}
 
 
-# Utility functions for collections
-def is_safe_path(path):
-	"""Check if a path is safe (no directory traversal)"""
-	if not path:
-		return True
+# Utility functions for collections
+def is_safe_path(path):
+	"""Check if a path is safe (no directory traversal)"""
+	if not path:
+		return True
+
+	# Normalize path
+	norm_path = os.path.normpath(path)
+
+	# Check for directory traversal attempts
+	if norm_path.startswith('..') or '/../' in norm_path or '/..' in norm_path:
+		return False
+
+	return True
+
+
+def is_valid_filename(filename):
+	"""Check if a filename is valid"""
+	# Check for empty filename
+	if not filename or filename.strip() == '':
+		return False
+
+	# Check for invalid characters
+	invalid_chars = ['/', '\\', ':', '*', '?', '"', '<', '>', '|']
+	if any(char in filename for char in invalid_chars):
+		return False
+
+	# Check if filename is too long
+	if len(filename) > 255:
+		return False
+
+	return True
+
+
+def is_image_file(filename):
+	"""Check if a file is an image based on extension"""
+	image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
+	_, ext = os.path.splitext(filename)
+	return ext.lower() in image_extensions
+
+
+def is_video_file(filename):
+    """Check if a file is a video based on extension"""
+    video_extensions = ['.mp4', '.mov', '.avi', '.mkv', '.webm']
+    _, ext = os.path.splitext(filename)
+    return ext.lower() in video_extensions
+
+
+def get_file_fingerprint(file_stat):
+	"""
+    Identity of a file's content (inode, size and mtime), used for thumbnail keys and ETags.
+    It survives renames and moves, and changes as soon as the file is rewritten.
+    """
+	return hashlib.md5(f"{file_stat.st_ino}:{file_stat.st_size}:{file_stat.st_mtime_ns}".encode()).hexdigest()
+
+
+def get_thumbnail_path(file_path, size=None, file_stat=None):
+	"""Get the path to a rendition of a file (the smallest, gallery-sized one by default)"""
+	key = get_file_fingerprint(file_stat or os.stat(file_path))
+	# Sharded by the first two hex digits to keep directories small
+	return os.path.join(THUMBNAILS_ROOT, key[:2], f"{key}_{size or THUMBNAIL_SIZES[0]}{THUMBNAIL_EXTENSION}")
+
+
+def remove_thumbnails(file_path, file_stat=None):
+	"""
+    Delete the renditions of a file that is about to be removed. Files hard-linked elsewhere
+    keep their renditions, since the other links still reference them.
+    """
+	try:
+		file_stat = file_stat or os.stat(file_path)
+	except OSError:
+		return
+	if file_stat.st_nlink > 1:
+		return
+	for size in THUMBNAIL_SIZES:
+		try:
+			os.remove(get_thumbnail_path(file_path, size, file_stat))
+		except FileNotFoundError:
+			pass
+
+
+def get_file_version(size, modified):
+	"""
+    Short version tag for ?v= on file and thumbnail URLs, from the size and mtime a listing reports.
+    URLs carrying the current version are cached by browsers as immutable.
+    """
+	return hashlib.md5(f"{size}:{modified.isoformat()}".encode()).hexdigest()[:16]
+
+
+def get_accel_redirect_uri(file_path):
+	"""Internal proxy URI of a file under one of the ACCEL_REDIRECT_LOCATIONS roots, or None"""
+	real_path = os.path.realpath(file_path)
+	for root, location in ACCEL_REDIRECT_LOCATIONS:
+		root = os.path.realpath(root)
+		if real_path.startswith(root + os.sep):
+			rel_path = os.path.relpath(real_path, root).replace(os.sep, '/')
+			return location.rstrip('/') + '/' + quote(rel_path)
+	return None
+
+
+def send_collection_file(file_path, version, mimetype=None, file_stat=None):
+	"""
+    send_file with a strong ETag from the file fingerprint, 304 and Range/206 handling.
+    Responses requested with the current ?v= are cached privately for a year as immutable,
+    everything else must be revalidated.
+    """
+	file_stat = file_stat or os.stat(file_path)
+	immutable = request.args.get('v') == version
+
+	internal_uri = get_accel_redirect_uri(file_path) if FILE_DELIVERY == 'x-accel' else None
+	if internal_uri:
+		# Authorization is done; the proxy streams the bytes and handles Range and conditional requests
+		response = app.response_class(mimetype=mimetype or 'application/octet-stream')
+		response.headers['X-Accel-Redirect'] = internal_uri
+		if immutable:
+			response.cache_control.max_age = IMMUTABLE_MAX_AGE
+	else:
+		response = send_file(
+			file_path,
+			mimetype=mimetype,
+			conditional=True,
+			etag=get_file_fingerprint(file_stat),
+			last_modified=file_stat.st_mtime,
+			max_age=IMMUTABLE_MAX_AGE if immutable else None
+		)
+
+	# Collection files sit behind a login, so shared caches must not keep them
+	response.cache_control.public = False
+	response.cache_control.private = True
+	if immutable:
+		response.cache_control.immutable = True
+	else:
+		response.cache_control.no_cache = True
+	return response
+
+
+def _collection_url_signature(owner_id, path, expires):
+	message = f"{owner_id}\n{path}\n{expires}".encode()
+	return hmac.new(SIGNED_URL_KEY, message, hashlib.sha256).hexdigest()[:32]
+
+
+def sign_collection_url(owner_id, path, version=None, thumbnail=False):
+	"""
+    Direct URL to a file of owner_id (or its thumbnail) that needs no session until it expires.
+    Only the owner, path and expiry are signed, so ?v= and ?size= can be changed freely.
+    """
+	path = path.strip('/')
+	expires = (int(time.time()) + SIGNED_URL_TTL) // SIGNED_URL_WINDOW * SIGNED_URL_WINDOW + SIGNED_URL_WINDOW
+	params = {'exp': expires, 'sig': _collection_url_signature(owner_id, path, expires)}
+	if version:
+		params['v'] = version
+	endpoint = 'get_signed_collection_thumbnail' if thumbnail else 'get_signed_collection_file'
+	return url_for(endpoint, owner_id=owner_id, path=path, **params)
+
+
+def check_collection_url_signature(owner_id, path):
+	"""Validate ?exp= and ?sig= of a signed URL. Returns an error message, or None if the URL is valid."""
+	try:
+		expires = int(request.args.get('exp', ''))
+	except ValueError:
+		return 'Invalid signature'
+	expected = _collection_url_signature(owner_id, path.strip('/'), expires)
+	if not hmac.compare_digest(expected, request.args.get('sig', '')):
+		return 'Invalid signature'
+	if expires < time.time():
+		return 'Link expired'
+	return None
+
+
+def add_signed_urls(item, owner_id):
+	"""Attach signed direct URLs to a file entry of a listing shown to someone other than its owner"""
+	if item.get('isDir') or item.get('type') == 'folder':
+		return item
+	item['signedUrl'] = sign_collection_url(owner_id, item['path'], item.get('version'))
+	if item.get('isImage'):
+		item['signedPreview'] = sign_collection_url(owner_id, item['path'], item.get('version'), thumbnail=True)
+	return item
+
+
+def send_collection_thumbnail(file_path, file_stat):
+	"""
+    Serve the rendition of an image picked by ?size=. A missing one is queued without waiting: small
+    originals browsers can show are sent uncached in its place, anything else gets 202 to retry.
+    """
+	# Get the path of the requested rendition (?size= in px, the gallery thumbnail by default)
+	thumbnail_path = get_thumbnail_path(file_path, pick_thumbnail_size(request.args.get('size', type=int)), file_stat)
+
+	# Queue the thumbnail if it doesn't exist, sharing the job with an upload that already queued it
+	if not os.path.exists(thumbnail_path):
+		status = get_thumbnail_status(file_path)
+		if status == 'failed':
+			return jsonify({'error': 'Failed to create thumbnail'}), 500
+		if status != 'ready' or not os.path.exists(thumbnail_path):
+			mimetype = mimetypes.guess_type(file_path)[0]
+			if mimetype in THUMBNAIL_STANDIN_MIMETYPES and file_stat.st_size <= THUMBNAIL_STANDIN_MAX_SIZE:
+				response = send_file(file_path, mimetype=mimetype, etag=False, max_age=0)
+				response.cache_control.private = True
+				response.cache_control.no_store = True
+			else:
+				response = jsonify({'status': 'pending'})
+				response.status_code = 202
+				response.headers['Retry-After'] = '1'
+			response.headers['X-Thumbnail-Status'] = 'pending'
+			return response
+
+	# Return thumbnail; it is addressed by the original's fingerprint, so the original's version applies
+	version = get_file_version(file_stat.st_size, datetime.fromtimestamp(file_stat.st_mtime))
+	return send_collection_file(thumbnail_path, version, mimetype=THUMBNAIL_MIMETYPE)
+
+
+def pick_thumbnail_size(requested):
+	"""Smallest configured rendition at least as large as requested, else the largest one"""
+	if not requested:
+		return THUMBNAIL_SIZES[0]
+	for size in THUMBNAIL_SIZES:
+		if size >= requested:
+			return size
+	return THUMBNAIL_SIZES[-1]
+
+
+def create_thumbnail(file_path):
+	"""
+    Render every rendition in THUMBNAIL_SIZES for an image file in THUMBNAIL_FORMAT.
+    The image is decoded once and scaled down from the largest rendition to the smallest.
+    Returns the path of the smallest rendition.
+    """
+	temp_paths = []
+
+	try:
+		# Fingerprint the file once so every rendition lands under the same key
+		file_stat = os.stat(file_path)
+		thumbnail_path = get_thumbnail_path(file_path, file_stat=file_stat)
+		os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+
+		with Image.open(file_path) as original:
+			# JPEG can decode straight at a reduced scale
+			original.draft('RGB', (THUMBNAIL_SIZES[-1], THUMBNAIL_SIZES[-1]))
+			img = ImageOps.exif_transpose(original)
+
+		if img.mode not in ('RGB', 'RGBA') or (img.mode == 'RGBA' and THUMBNAIL_FORMAT == 'JPEG'):
+			has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+			img = img.convert('RGBA' if has_alpha and THUMBNAIL_FORMAT != 'JPEG' else 'RGB')
+
+		renditions = []
+		for size in reversed(THUMBNAIL_SIZES):
+			# Preserve aspect ratio; never upscales
+			img = img.copy()
+			img.thumbnail((size, size), Image.LANCZOS)
+
+			# Save to a temporary name first so readers never see a half-written rendition
+			rendition_path = get_thumbnail_path(file_path, size, file_stat)
+			root, ext = os.path.splitext(rendition_path)
+			temp_path = f"{root}.tmp-{uuid.uuid4().hex}{ext}"
+			temp_paths.append(temp_path)
+			img.save(temp_path, THUMBNAIL_FORMAT, **THUMBNAIL_SAVE_OPTIONS.get(THUMBNAIL_FORMAT, {}))
+			renditions.append((temp_path, rendition_path))
+
+		for temp_path, rendition_path in renditions:
+			os.replace(temp_path, rendition_path)
+
+		return thumbnail_path
+	except Exception as e:
+		app.logger.error(f"Error creating thumbnail for {file_path}: {str(e)}")
+		for temp_path in temp_paths:
+			if os.path.exists(temp_path):
+				os.remove(temp_path)
+		# Return original file path if thumbnail creation fails
+		return file_path
+
+
+# --- Background thumbnail generation ---
+# Uploads only queue thumbnails. A bounded thread pool renders them (Pillow releases the GIL while
+# decoding and resizing), and a file already queued or rendering is never queued twice.
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', min(4, os.cpu_count() or 1)))
+# While a rendition is being rendered, small originals browsers can show stand in for it
+THUMBNAIL_STANDIN_MIMETYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp')
+THUMBNAIL_STANDIN_MAX_SIZE = int(os.environ.get('THUMBNAIL_STANDIN_MAX_SIZE', 5 * 1024 * 1024))
+# Failed renders are remembered for a while (per file content) so listings do not retry them on every view
+THUMBNAIL_FAILURE_TTL = 60 * 60
+THUMBNAIL_FAILURE_MAX_ENTRIES = 10000
+thumbnail_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnail')
+_thumbnail_jobs = {}
+# file_path -> (fingerprint of the file that failed, monotonic time of the failure)
+_thumbnail_failures = {}
+_thumbnail_jobs_lock = threading.Lock()
+
+
+def _run_thumbnail_job(file_path):
+	try:
+		if create_thumbnail(file_path) == file_path:
+			try:
+				fingerprint = get_file_fingerprint(os.stat(file_path))
+			except OSError:
+				fingerprint = None
+			now = time.monotonic()
+			with _thumbnail_jobs_lock:
+				if len(_thumbnail_failures) >= THUMBNAIL_FAILURE_MAX_ENTRIES:
+					for stale_path in [path for path, (_, failed_at) in _thumbnail_failures.items()
+					                   if now - failed_at >= THUMBNAIL_FAILURE_TTL]:
+						del _thumbnail_failures[stale_path]
+					if len(_thumbnail_failures) >= THUMBNAIL_FAILURE_MAX_ENTRIES:
+						_thumbnail_failures.clear()
+				_thumbnail_failures[file_path] = (fingerprint, now)
+	finally:
+		with _thumbnail_jobs_lock:
+			_thumbnail_jobs.pop(file_path, None)
+
+
+def queue_thumbnail(file_path):
+	"""Schedule a thumbnail for file_path; returns the Future of the (possibly already pending) job"""
+	with _thumbnail_jobs_lock:
+		job = _thumbnail_jobs.get(file_path)
+		if job is None:
+			_thumbnail_failures.pop(file_path, None)
+			job = thumbnail_executor.submit(_run_thumbnail_job, file_path)
+			_thumbnail_jobs[file_path] = job
+	return job
+
+
+def get_thumbnail_status(file_path):
+	"""
+    'pending' while queued or rendering, 'failed' after a recent error on the same content, 'ready'
+    once the rendition is on disk. A missing rendition (e.g. never rendered by this process) is queued.
+    """
+	with _thumbnail_jobs_lock:
+		if file_path in _thumbnail_jobs:
+			return 'pending'
+		failure = _thumbnail_failures.get(file_path)
+
+	try:
+		file_stat = os.stat(file_path)
+	except OSError:
+		return 'failed'
+	if failure and failure[0] == get_file_fingerprint(file_stat) \
+			and time.monotonic() - failure[1] < THUMBNAIL_FAILURE_TTL:
+		return 'failed'
+	if os.path.exists(get_thumbnail_path(file_path, file_stat=file_stat)):
+		return 'ready'
+	queue_thumbnail(file_path)
+	return 'pending'
+
+
+# --- Thumbnail garbage collection ---
+# Renditions are keyed by file identity, so those of deleted or rewritten files are orphaned.
+# A mark-and-sweep pass removes every rendition no live collection file maps to.
+THUMBNAIL_GC_INTERVAL = int(os.environ.get('THUMBNAIL_GC_INTERVAL', 6 * 60 * 60))
+THUMBNAIL_GC_GRACE = 60 * 60
+BLOB_GC_INTERVAL = int(os.environ.get('BLOB_GC_INTERVAL', 6 * 60 * 60))
+BLOB_GC_GRACE = 60 * 60
+
+
+def iter_collection_files(root):
+	"""Yield (path, stat) for every file under root, one os.scandir pass per directory"""
+	pending = [root]
+	while pending:
+		directory = pending.pop()
+		try:
+			with os.scandir(directory) as entries:
+				for entry in entries:
+					try:
+						if entry.is_dir(follow_symlinks=False):
+							pending.append(entry.path)
+						elif entry.is_file():
+							yield entry.path, entry.stat()
+					except OSError:
+						continue
+		except OSError:
+			continue
+
+
+def collect_thumbnail_garbage():
+	"""Delete renditions no collection image maps to; returns (files removed, bytes freed)"""
+	live_keys = set()
+	for file_path, file_stat in iter_collection_files(COLLECTIONS_ROOT):
+		if is_image_file(file_path):
+			live_keys.add(get_file_fingerprint(file_stat))
+
+	# Renditions created after this point belong to files the scan may have missed
+	cutoff = time.time() - THUMBNAIL_GC_GRACE
+	removed = freed = 0
+	for thumb_path, thumb_stat in iter_collection_files(THUMBNAILS_ROOT):
+		name = os.path.basename(thumb_path)
+		if thumb_stat.st_mtime > cutoff:
+			continue
+		# Temporary files are only left behind by interrupted renders
+		if '.tmp-' not in name and name.split('_', 1)[0] in live_keys:
+			continue
+		try:
+			os.remove(thumb_path)
+			removed += 1
+			freed += thumb_stat.st_size
+		except OSError:
+			pass
+
+	app.logger.info(f"Thumbnail GC removed {removed} files, freed {freed} bytes")
+	return removed, freed
+
+
+@app.cli.command('gc-thumbnails')
+def gc_thumbnails_command():
+	"""Remove orphaned thumbnail renditions."""
+	removed, freed = collect_thumbnail_garbage()
+	print(f"Removed {removed} orphaned thumbnails ({freed} bytes)")
+
+
+def start_maintenance_job(name, interval, job):
+	"""Run job inside the app context every interval seconds on a daemon thread"""
+	def loop():
+		while True:
+			time.sleep(interval)
+			try:
+				with app.app_context():
+					job()
+			except Exception as e:
+				app.logger.error(f"Maintenance job {name} failed: {str(e)}")
+
+	Thread(target=loop, name=name, daemon=True).start()
+
+
+# --- Folder listing index ---
+# Folder contents are served from the Collection table. The disk is only read (one os.scandir pass)
+# when the directory mtime differs from the one recorded in FolderIndex.
+
+def path_below(column, path):
+	"""
+    SQL condition: column lies below path. Compares the prefix with substr rather than LIKE, which
+    SQLite matches case-insensitively ('Foo/%' would also match 'foo/...').
+    """
+	return db.func.substr(column, 1, len(path) + 1) == path + '/'
+
+
+def join_rel_path(rel_dir, name):
+	"""Join a collection-relative directory and an entry name"""
+	return f"{rel_dir}/{name}" if rel_dir else name
+
+
+def get_dir_mtime(abs_dir):
+	"""Return the directory mtime in nanoseconds, or None if it cannot be read"""
+	try:
+		return os.stat(abs_dir).st_mtime_ns
+	except OSError:
+		return None
+
+
+def reconcile_folder_index(owner_id, rel_dir, abs_dir):
+	"""
+    Bring the Collection rows of the direct children of rel_dir in line with the disk.
+    Costs one indexed lookup when the folder is unchanged, one os.scandir pass otherwise.
+    """
+	dir_mtime = get_dir_mtime(abs_dir)
+	if dir_mtime is None:
+		return
+
+	index = FolderIndex.query.filter_by(owner_id=owner_id, path=rel_dir).first()
+	if index and index.dir_mtime == dir_mtime:
+		return
+
+	existing = {}
+	for row in Collection.query.filter_by(owner_id=owner_id, parent_path=rel_dir).all():
+		if row.name in existing:
+			# Older uploads could insert the same file twice
+			db.session.delete(row)
+		else:
+			existing[row.name] = row
+
+	with os.scandir(abs_dir) as entries:
+		for entry in entries:
+			try:
+				is_dir = entry.is_dir()
+				entry_stat = entry.stat()
+			except OSError:
+				continue
+
+			values = {
+				'is_folder': is_dir,
+				'size': None if is_dir else entry_stat.st_size,
+				'modified_at': datetime.fromtimestamp(entry_stat.st_mtime)
+			}
+			row = existing.pop(entry.name, None)
+			if row is None:
+				db.session.add(Collection(
+					path=join_rel_path(rel_dir, entry.name),
+					name=entry.name,
+					owner_id=owner_id,
+					mime_type=None if is_dir else mimetypes.guess_type(entry.name)[0],
+					created_at=datetime.fromtimestamp(entry_stat.st_ctime),
+					**values
+				))
+			elif any(getattr(row, key) != value for key, value in values.items()):
+				for key, value in values.items():
+					setattr(row, key, value)
+
+	# Whatever is left was removed from disk behind our back
+	for row in existing.values():
+		if row.is_folder:
+			Collection.query.filter(
+				Collection.owner_id == owner_id,
+				path_below(Collection.path, row.path)
+			).delete(synchronize_session=False)
+			FolderIndex.query.filter(
+				FolderIndex.owner_id == owner_id,
+				path_or_below(FolderIndex.path, row.path)
+			).delete(synchronize_session=False)
+		db.session.delete(row)
+
+	if not index:
+		index = FolderIndex(owner_id=owner_id, path=rel_dir)
+		db.session.add(index)
+	index.dir_mtime = dir_mtime
+	index.scanned_at = datetime.utcnow()
+
+	try:
+		db.session.commit()
+	except IntegrityError:
+		# A concurrent request reconciled the same folder first
+		db.session.rollback()
+
+
+def mark_folder_synced(owner_id, rel_dir, abs_dir, expected_mtime):
+	"""
+    Record the new mtime of a folder we just changed ourselves, so the next listing skips the scan.
+    Only done when the index was current before the change; the caller commits.
+    """
+	if expected_mtime is None:
+		return
+	index = FolderIndex.query.filter_by(owner_id=owner_id, path=rel_dir).first()
+	if index and index.dir_mtime == expected_mtime:
+		index.dir_mtime = get_dir_mtime(abs_dir)
+
+
+# --- Listing pagination ---
+# Listings accept ?limit=&cursor=&sort=name|modified|size|type&order=asc|desc. Folders always come first;
+# the cursor is an opaque token holding the sort key of the last item returned.
+
+LISTING_SORTS = ('name', 'modified', 'size', 'type')
+LISTING_DEFAULT_ORDER = {'name': 'asc', 'modified': 'desc', 'size': 'desc', 'type': 'asc'}
+LISTING_MAX_LIMIT = 1000
+
+
+def parse_listing_params(args, default_sort='name'):
+	"""
+    Read sort/order/cursor/limit from request args.
+    Raises ValueError with a user-facing message for bad values.
+    """
+	sort = args.get('sort') or default_sort
+	if sort not in LISTING_SORTS:
+		raise ValueError(f"Invalid sort, expected one of: {', '.join(LISTING_SORTS)}")
+
+	order = args.get('order') or LISTING_DEFAULT_ORDER[sort]
+	if order not in ('asc', 'desc'):
+		raise ValueError("Invalid order, expected 'asc' or 'desc'")
+
+	limit = args.get('limit')
+	if limit is not None:
+		try:
+			limit = int(limit)
+		except ValueError:
+			raise ValueError('Invalid limit')
+		if limit < 1 or limit > LISTING_MAX_LIMIT:
+			raise ValueError(f'Limit must be between 1 and {LISTING_MAX_LIMIT}')
+
+	cursor = args.get('cursor') or None
+	if cursor is not None:
+		cursor = decode_listing_cursor(cursor, sort, order)
+
+	return {
+		'sort': sort,
+		'order': order,
+		'limit': limit,
+		'cursor': cursor,
+		'explicit': any(args.get(key) for key in ('sort', 'order', 'limit', 'cursor'))
+	}
 
-	# Normalize path
-	norm_path = os.path.normpath(path)
 
-	# Check for directory traversal attempts
-	if norm_path.startswith('..') or '/../' in norm_path or '/..' in norm_path:
-		return False
+def encode_listing_cursor(sort, order, key):
+	"""Pack the sort key of the last returned item into an opaque cursor"""
+	values = [{'$dt': value.isoformat()} if isinstance(value, datetime) else value for value in key]
+	payload = json.dumps({'s': sort, 'o': order, 'k': values}, separators=(',', ':'))
+	return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
 
-	return True
 
+def decode_listing_cursor(cursor, sort, order):
+	"""Unpack a cursor produced by encode_listing_cursor for the same sort and order"""
+	try:
+		padded = cursor + '=' * (-len(cursor) % 4)
+		payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+		if payload['s'] != sort or payload['o'] != order:
+			raise ValueError
+		return tuple(
+			datetime.fromisoformat(value['$dt']) if isinstance(value, dict) else value
+			for value in payload['k']
+		)
+	except Exception:
+		raise ValueError('Invalid cursor')
+
+
+def collection_sort_keys(sort):
+	"""SQL sort expressions for Collection listings; the first is the folders-first rank"""
+	folder_rank = db.case((Collection.is_folder == True, 0), else_=1)
+	if sort == 'modified':
+		keys = [Collection.modified_at]
+	elif sort == 'size':
+		keys = [db.func.coalesce(Collection.size, -1)]
+	elif sort == 'type':
+		keys = [db.func.coalesce(Collection.mime_type, ''), db.func.lower(Collection.name)]
+	else:
+		keys = [db.func.lower(Collection.name)]
+	return [folder_rank] + keys + [Collection.path]
 
-def is_valid_filename(filename):
-	"""Check if a filename is valid"""
-	# Check for empty filename
-	if not filename or filename.strip() == '':
-		return False
 
-	# Check for invalid characters
-	invalid_chars = ['/', '\\', ':', '*', '?', '"', '<', '>', '|']
-	if any(char in filename for char in invalid_chars):
-		return False
+def paginate_collection_query(query, params):
+	"""
+    Sort and page a Collection query with keyset pagination.
+    Returns (rows, next_cursor); only limit + 1 rows are ever loaded.
+    """
+	keys = collection_sort_keys(params['sort'])
+	descending = params['order'] == 'desc'
+
+	if params['cursor'] is not None:
+		cursor = params['cursor']
+		if len(cursor) != len(keys):
+			raise ValueError('Invalid cursor')
+		clauses = []
+		for i, key in enumerate(keys):
+			# The folder rank always ascends so folders stay on top in both directions
+			after = key < cursor[i] if descending and i > 0 else key > cursor[i]
+			clauses.append(db.and_(*[keys[j] == cursor[j] for j in range(i)], after))
+		query = query.filter(db.or_(*clauses))
+
+	query = query.order_by(*[
+		key.desc() if descending and i > 0 else key.asc() for i, key in enumerate(keys)
+	]).add_columns(*keys)
+
+	limit = params['limit']
+	if limit:
+		results = query.limit(limit + 1).all()
+	else:
+		results = query.all()
 
-	# Check if filename is too long
-	if len(filename) > 255:
-		return False
+	next_cursor = None
+	if limit and len(results) > limit:
+		results = results[:limit]
+		next_cursor = encode_listing_cursor(params['sort'], params['order'], tuple(results[-1][1:]))
 
-	return True
+	return [result[0] for result in results], next_cursor
 
 
-def is_image_file(filename):
-	"""Check if a file is an image based on extension"""
-	image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
-	_, ext = os.path.splitext(filename)
-	return ext.lower() in image_extensions
+def item_sort_key(item, sort):
+	"""Python counterpart of collection_sort_keys for listings built from dicts"""
+	is_dir = item.get('isDir', item.get('type') == 'folder')
+	if sort == 'modified':
+		keys = [item.get('modifiedTime') or '']
+	elif sort == 'size':
+		keys = [item.get('size') if item.get('size') is not None else -1]
+	elif sort == 'type':
+		keys = [mimetypes.guess_type(item['name'])[0] or '', item['name'].lower()]
+	else:
+		keys = [item['name'].lower()]
+	return tuple([0 if is_dir else 1] + keys + [item.get('path', '')])
 
 
-def is_video_file(filename):
-    """Check if a file is a video based on extension"""
-    video_extensions = ['.mp4', '.mov', '.avi', '.mkv', '.webm']
-    _, ext = os.path.splitext(filename)
-    return ext.lower() in video_extensions
+def paginate_items(items, params):
+	"""
+    Sort and page an already resolved listing (favorites, trash, shared) with the same
+    cursor contract as paginate_collection_query. Without paging params, items pass through.
+    """
+	items = [item for item in items if item]
+	if not params['explicit']:
+		return items, None
 
+	sort = params['sort']
+	descending = params['order'] == 'desc'
+	keyed = [(item_sort_key(item, sort), item) for item in items]
+	keyed.sort(key=lambda pair: pair[0][1:], reverse=descending)
+	keyed.sort(key=lambda pair: pair[0][0])
 
-def get_thumbnail_path(file_path):
-	"""Get the path to the thumbnail for a file"""
-	thumbnails_dir = THUMBNAILS_ROOT
-	file_hash = hashlib.md5(file_path.encode()).hexdigest()
-	_, ext = os.path.splitext(file_path)
-	return os.path.join(thumbnails_dir, f"{file_hash}{ext}")
+	if params['cursor'] is not None:
+		cursor = tuple(params['cursor'])
 
+		def after(key):
+			if key[0] != cursor[0]:
+				return key[0] > cursor[0]
+			return key[1:] < cursor[1:] if descending else key[1:] > cursor[1:]
+
+		try:
+			keyed = [pair for pair in keyed if after(pair[0])]
+		except TypeError:
+			raise ValueError('Invalid cursor')
+
+	limit = params['limit']
+	next_cursor = None
+	if limit and len(keyed) > limit:
+		keyed = keyed[:limit]
+		next_cursor = encode_listing_cursor(sort, params['order'], keyed[-1][0])
+
+	return [item for _, item in keyed], next_cursor
+
+
+def listing_item(row, abs_dir=None):
+	"""Serialize a Collection row in the shape of a directory listing entry"""
+	item = {
+		'name': row.name,
+		'path': row.path,
+		'type': 'folder' if row.is_folder else 'file',
+		'isDir': bool(row.is_folder),
+		'createdTime': row.created_at.isoformat(),
+		'modifiedTime': row.modified_at.isoformat()
+	}
 
-def create_thumbnail(file_path, size=(240, 180)):
-	"""Create a thumbnail for an image file"""
-	# Get thumbnail path
-	thumbnail_path = get_thumbnail_path(file_path)
+	if not row.is_folder:
+		item['size'] = row.size
+		# Append as ?v= to file and thumbnail URLs for long-lived caching
+		item['version'] = get_file_version(row.size, row.modified_at)
+		if is_image_file(row.name):
+			item['isImage'] = True
+			if abs_dir is not None:
+				item['thumbnailStatus'] = get_thumbnail_status(os.path.join(abs_dir, row.name))
 
-	try:
-		# Open image
-		img = Image.open(file_path)
+	return item
 
-		# Preserve aspect ratio
-		img.thumbnail(size, Image.LANCZOS)
 
-		# Save thumbnail
-		img.save(thumbnail_path, optimize=True, quality=85)
+def list_folder(owner_id, rel_dir, abs_dir, params=None):
+	"""
+    List a folder from the metadata index, folders first, then by params['sort'] (name by default).
+    Returns (items, next_cursor).
+    """
+	rel_dir = rel_dir.strip('/')
+	reconcile_folder_index(owner_id, rel_dir, abs_dir)
 
-		return thumbnail_path
-	except Exception as e:
-		app.logger.error(f"Error creating thumbnail for {file_path}: {str(e)}")
-		# Return original file path if thumbnail creation fails
-		return file_path
+	if params is None:
+		params = {'sort': 'name', 'order': 'asc', 'limit': None, 'cursor': None, 'explicit': False}
+	query = Collection.query.filter_by(owner_id=owner_id, parent_path=rel_dir)
+	rows, next_cursor = paginate_collection_query(query, params)
+	return [listing_item(row, abs_dir) for row in rows], next_cursor
 
 
 # --- Person Page Route ---
@@ -2357,7 +4288,7 @@ def logout():
 @login_required
 def profile():
 	"""Display user profile"""
-	return render_template('profile.html', user=current_user)
+	return render_template('profile.html', user=current_user, storage=get_storage_usage(current_user.id))
 
 
 @app.route('/profile/edit', methods=['GET', 'POST'])
@@ -2599,6 +4530,13 @@ def google_authorized():
 		return redirect(url_for('login'))
 
 
+@app.route('/api/users/storage', methods=['GET'])
+@login_required
+def get_user_storage():
+	"""Storage used by the current user, in bytes, read from the maintained counter"""
+	return jsonify(get_storage_usage(current_user.id))
+
+
 # API endpoint for user search
 @app.route('/api/users/search', methods=['GET'])
 def api_search_users():
@@ -2631,82 +4569,640 @@ def api_search_users():
 	})
 
 
-@app.route('/api/collections/rename', methods=['POST'])
-@login_required
-def rename_collection_item():
-	"""Rename a file or folder in the user's collections"""
+# --- Collection item operations ---
+# Shared by the single-item endpoints and /api/collections/bulk. Each apply_* function validates first
+# and raises CollectionOperationError before touching anything, then changes the disk through a
+# FileJournal and stages database changes. The caller commits the session and then the journal.
+
+class CollectionOperationError(Exception):
+	"""Expected failure of one operation, reported to the client with status"""
+
+	def __init__(self, message, status=400):
+		super().__init__(message)
+		self.status = status
+
+
+class FileJournal:
+	"""
+    Filesystem side of a database transaction. Renames are recorded so they can be undone if the
+    transaction fails, and deletions are only staged (moved aside) until commit().
+    """
+
+	def __init__(self):
+		self.renames = []
+		self.staged = []
+		self.after_commit = []
+
+	def rename(self, source, target):
+		os.rename(source, target)
+		self.renames.append((source, target))
+
+	def remove(self, path):
+		os.makedirs(DELETE_STAGING_ROOT, exist_ok=True)
+		staged_path = os.path.join(DELETE_STAGING_ROOT, uuid.uuid4().hex)
+		self.rename(path, staged_path)
+		self.staged.append(staged_path)
+
+	def commit(self):
+		"""Drop staged deletions and run the after-commit hooks; call once the database has committed"""
+		for staged_path in self.staged:
+			try:
+				delete_tree(staged_path)
+			except OSError as e:
+				app.logger.error(f"Error removing staged item {staged_path}: {str(e)}")
+		for hook in self.after_commit:
+			hook()
+		self.renames, self.staged, self.after_commit = [], [], []
+
+	def rollback(self):
+		"""Undo every rename in reverse order"""
+		for source, target in reversed(self.renames):
+			try:
+				os.rename(target, source)
+			except OSError as e:
+				app.logger.error(f"Could not undo move of {source} to {target}: {str(e)}")
+		self.renames, self.staged, self.after_commit = [], [], []
+
+
+def delete_tree(path, linked_inodes=None):
+	"""
+    Delete a file or folder and the renditions of its images. Returns the bytes freed; files that
+    are still linked elsewhere (e.g. into the blob store) free nothing until their last link goes.
+    Their (st_dev, st_ino) are added to linked_inodes when given.
+    """
+	freed = 0
 	try:
-		data = request.json
-		old_path = data.get('old_path')
-		new_name = data.get('new_name')
-		user_id = current_user.id
+		top_stat = os.lstat(path)
+	except FileNotFoundError:
+		return 0
+
+	files = iter_collection_files(path) if stat.S_ISDIR(top_stat.st_mode) else [(path, top_stat)]
+	for file_path, file_stat in files:
+		remove_thumbnails(file_path, file_stat)
+		if file_stat.st_nlink == 1:
+			freed += file_stat.st_size
+		elif linked_inodes is not None:
+			linked_inodes.add((file_stat.st_dev, file_stat.st_ino))
+
+	if stat.S_ISDIR(top_stat.st_mode):
+		shutil.rmtree(path)
+	else:
+		os.remove(path)
+	return freed
 
-		# Validate parameters
-		if not old_path or not new_name:
-			return jsonify({'error': 'Missing path or new name'}), 400
 
-		if not is_safe_path(old_path):
-			return jsonify({'error': 'Invalid path'}), 400
+def prefetch_collection_ownership(paths, user_id):
+	"""
+    Fill the per-request ownership cache of verify_collection_ownership for many paths at once:
+    one query for every path and ancestor, instead of one per path.
+    """
+	cache = g.setdefault('collection_ownership', {})
+	paths = [path.strip('/') for path in dict.fromkeys(paths) if (path.strip('/'), user_id) not in cache]
+	candidates = set()
+	for path in paths:
+		parts = path.split('/') if path else []
+		candidates.update('/'.join(parts[:i]) for i in range(len(parts) + 1))
+
+	owned = {}
+	candidates = list(candidates)
+	for i in range(0, len(candidates), 500):
+		owned.update(db.session.query(Collection.path, Collection.is_folder).filter(
+			Collection.owner_id == user_id,
+			Collection.path.in_(candidates[i:i + 500])
+		).all())
+
+	for path in paths:
+		parts = path.split('/') if path else []
+		ancestors = ['/'.join(parts[:i]) for i in range(len(parts))]
+		if path in owned or any(owned.get(ancestor) for ancestor in ancestors):
+			cache[(path, user_id)] = True
+		else:
+			# Same fallback as verify_collection_ownership for paths not in the database yet
+			cache[(path, user_id)] = verify_directory_ownership(path, user_id)
+
+
+def check_owned_path(path, user_id):
+	"""Validate a user-relative path and return it normalized, or raise CollectionOperationError"""
+	if not isinstance(path, str) or not path.strip('/'):
+		raise CollectionOperationError('Missing path')
+	path = path.strip('/')
+	if not is_safe_path(path):
+		raise CollectionOperationError('Invalid path')
+	if not verify_collection_ownership(path, user_id):
+		raise CollectionOperationError('Access denied', 403)
+	return path
+
+
+def apply_rename(user_id, old_path, new_path, journal):
+	"""Rename or move a file or folder; rows of a folder's contents and its listing index follow"""
+	old_path = check_owned_path(old_path, user_id)
+	new_path = check_owned_path(new_path, user_id)
+	if new_path == old_path or new_path.startswith(old_path + '/'):
+		raise CollectionOperationError('Cannot move an item into itself')
 
-		# Verify ownership
-		if not verify_collection_ownership(old_path, user_id):
-			return jsonify({'error': 'Access denied'}), 403
+	user_dir = get_user_collections_dir(user_id)
+	old_full_path = os.path.join(user_dir, old_path)
+	new_full_path = os.path.join(user_dir, new_path)
+
+	# Verify old path exists
+	if not os.path.exists(old_full_path):
+		raise CollectionOperationError('Item not found', 404)
+
+	if not os.path.isdir(os.path.dirname(new_full_path)):
+		raise CollectionOperationError('Destination folder not found', 404)
+
+	# Check if new path already exists (on case-insensitive filesystems a case-only rename finds the item itself)
+	if os.path.lexists(new_full_path) and not os.path.samefile(old_full_path, new_full_path):
+		raise CollectionOperationError('An item with this name already exists', 409)
+
+	old_parent = posixpath.dirname(old_path)
+	new_parent = posixpath.dirname(new_path)
+	old_parent_full_path = os.path.dirname(old_full_path)
+	new_parent_full_path = os.path.dirname(new_full_path)
+	old_parent_mtime = get_dir_mtime(old_parent_full_path)
+	new_parent_mtime = get_dir_mtime(new_parent_full_path)
+
+	journal.rename(old_full_path, new_full_path)
+	rewrite_path_prefix(user_id, old_path, new_path)
+	log_activity(user_id, 'edit', user_id, new_path)
+	journal.after_commit.append(lambda: invalidate_share_grants(user_id))
+
+	mark_folder_synced(user_id, old_parent, old_parent_full_path, old_parent_mtime)
+	if new_parent != old_parent:
+		mark_folder_synced(user_id, new_parent, new_parent_full_path, new_parent_mtime)
+	return new_path
+
+
+def path_or_below(column, path):
+	"""SQL condition: column is path or lies below it"""
+	return db.or_(column == path, path_below(column, path))
+
+
+def rewrite_path_prefix(user_id, old_path, new_path):
+	"""
+    Re-point every row at or below old_path to new_path after a rename or move, with one UPDATE per
+    table that rewrites the prefix in SQL: listing rows, listing index, shares, favorites and the
+    original location of trashed items, and feed entries. The caller commits.
+    """
+	# Pending ORM changes must reach the database before the set-based statements run
+	db.session.flush()
+	cut = len(old_path) + 1
+
+	def moved(column):
+		return db.literal(new_path) + db.func.substr(column, cut)
+
+	# Rows left at the target by earlier out-of-band changes would collide; the target does not exist on disk
+	Collection.query.filter(Collection.owner_id == user_id, path_or_below(Collection.path, new_path)) \
+		.delete(synchronize_session=False)
+	FolderIndex.query.filter(FolderIndex.owner_id == user_id, path_or_below(FolderIndex.path, new_path)) \
+		.delete(synchronize_session=False)
+	SharedFile.query.filter(SharedFile.owner_id == user_id, path_or_below(SharedFile.path, new_path)) \
+		.delete(synchronize_session=False)
+	UserFavorites.query.filter(UserFavorites.user_id == user_id, path_or_below(UserFavorites.file_path, new_path)) \
+		.delete(synchronize_session=False)
+
+	# The item itself, then everything below it (whose parent_path is the item or lies below it).
+	# modified_at is set to itself so its onupdate does not fire: a move does not change the content.
+	Collection.query.filter_by(owner_id=user_id, path=old_path).update({
+		Collection.path: new_path,
+		Collection.name: posixpath.basename(new_path),
+		Collection.parent_path: posixpath.dirname(new_path),
+		Collection.modified_at: Collection.modified_at
+	}, synchronize_session=False)
+	Collection.query.filter(
+		Collection.owner_id == user_id,
+		path_below(Collection.path, old_path)
+	).update({
+		Collection.path: moved(Collection.path),
+		Collection.parent_path: moved(Collection.parent_path),
+		Collection.modified_at: Collection.modified_at
+	}, synchronize_session=False)
+
+	FolderIndex.query.filter(FolderIndex.owner_id == user_id, path_or_below(FolderIndex.path, old_path)) \
+		.update({FolderIndex.path: moved(FolderIndex.path)}, synchronize_session=False)
+	SharedFile.query.filter(SharedFile.owner_id == user_id, path_or_below(SharedFile.path, old_path)) \
+		.update({SharedFile.path: moved(SharedFile.path)}, synchronize_session=False)
+	UserFavorites.query.filter(UserFavorites.user_id == user_id, path_or_below(UserFavorites.file_path, old_path)) \
+		.update({UserFavorites.file_path: moved(UserFavorites.file_path)}, synchronize_session=False)
+	UserTrash.query.filter(UserTrash.user_id == user_id, path_or_below(UserTrash.original_path, old_path)) \
+		.update({UserTrash.original_path: moved(UserTrash.original_path)}, synchronize_session=False)
+	# Feed entries of every user about these items
+	Activity.query.filter(Activity.owner_id == user_id, path_or_below(Activity.path, old_path)) \
+		.update({Activity.path: moved(Activity.path)}, synchronize_session=False)
+
+	# Objects loaded earlier in this transaction may carry the old paths
+	db.session.expire_all()
+
+
+def remove_collection_rows(user_id, path, forget_references=False):
+	"""
+    Delete the rows of path and everything below it with one DELETE per table; returns the content
+    hashes the removed files held. With forget_references, shares and favorites go as well.
+    The caller commits.
+    """
+	db.session.flush()
+	content_hashes = [content_hash for content_hash, in db.session.query(Collection.content_hash).filter(
+		Collection.owner_id == user_id,
+		path_or_below(Collection.path, path),
+		Collection.content_hash.isnot(None)
+	).distinct()]
+
+	Collection.query.filter(Collection.owner_id == user_id, path_or_below(Collection.path, path)) \
+		.delete(synchronize_session=False)
+	FolderIndex.query.filter(FolderIndex.owner_id == user_id, path_or_below(FolderIndex.path, path)) \
+		.delete(synchronize_session=False)
+	if forget_references:
+		SharedFile.query.filter(SharedFile.owner_id == user_id, path_or_below(SharedFile.path, path)) \
+			.delete(synchronize_session=False)
+		UserFavorites.query.filter(UserFavorites.user_id == user_id, path_or_below(UserFavorites.file_path, path)) \
+			.delete(synchronize_session=False)
+
+	db.session.expire_all()
+	return content_hashes
+
+
+def apply_delete(user_id, path, journal):
+	"""Delete a file or folder; the disk is only cleared once the transaction commits"""
+	path = check_owned_path(path, user_id)
+	full_path = os.path.join(get_user_collections_dir(user_id), path)
+
+	# Verify path exists
+	if not os.path.lexists(full_path):
+		raise CollectionOperationError('Item not found', 404)
+
+	parent_full_path = os.path.dirname(full_path)
+	parent_mtime = get_dir_mtime(parent_full_path)
+
+	adjust_storage_used(user_id, -get_tree_size(full_path))
+	journal.remove(full_path)
+	content_hashes = remove_collection_rows(user_id, path, forget_references=True)
+	mark_folder_synced(user_id, posixpath.dirname(path), parent_full_path, parent_mtime)
+
+	# Blobs can only be released once the staged files are gone
+	journal.after_commit.extend(
+		lambda content_hash=content_hash: release_blob(content_hash) for content_hash in content_hashes
+	)
+	journal.after_commit.append(lambda: invalidate_share_grants(user_id))
+	return path
 
-		# Get user's collections directory
-		user_dir = get_user_collections_dir(user_id)
 
-		# Construct full paths
-		old_full_path = os.path.join(user_dir, old_path)
+def get_user_trash_dir(user_id):
+	return os.path.join(TRASH_ROOT, str(user_id))
+
+
+def get_trash_item_path(trash):
+	"""Where a UserTrash entry is stored; file_path is its storage key"""
+	return os.path.join(get_user_trash_dir(trash.user_id), trash.file_path)
+
+
+def find_free_path(user_dir, rel_path):
+	"""rel_path if nothing is there, otherwise the first free 'name (n).ext' next to it"""
+	if not os.path.lexists(os.path.join(user_dir, rel_path)):
+		return rel_path
+	parent, name = posixpath.split(rel_path)
+	stem, ext = posixpath.splitext(name)
+	counter = 1
+	while True:
+		candidate = join_rel_path(parent, f"{stem} ({counter}){ext}")
+		if not os.path.lexists(os.path.join(user_dir, candidate)):
+			return candidate
+		counter += 1
+
+
+def detach_references(trash, created_before=None):
+	"""
+    Move the shares and favorites at or below trash.original_path onto the trash entry, with paths
+    relative to the item. created_before limits it to rows made before then. The caller commits.
+    """
+	db.session.flush()
+	path = trash.original_path
+
+	def relative(item_path):
+		return item_path[len(path) + 1:]
+
+	shares = SharedFile.query.filter(SharedFile.owner_id == trash.user_id, path_or_below(SharedFile.path, path))
+	favorites = UserFavorites.query.filter(
+		UserFavorites.user_id == trash.user_id, path_or_below(UserFavorites.file_path, path)
+	)
+	if created_before is not None:
+		shares = shares.filter(SharedFile.created_at <= created_before)
+		favorites = favorites.filter(UserFavorites.created_at <= created_before)
+
+	trash.shares = json.dumps([
+		[relative(share.path), share.shared_with_id, bool(share.is_folder)] for share in shares
+	])
+	trash.favorites = json.dumps([relative(favorite.file_path) for favorite in favorites])
+	shares.delete(synchronize_session=False)
+	favorites.delete(synchronize_session=False)
+
+
+def attach_references(trash, restore_path):
+	"""Re-create the shares and favorites detached from a trash entry below restore_path. The caller commits."""
+	user_id = trash.user_id
+	# Rows left at the target by earlier out-of-band changes would collide; the target does not exist on disk
+	SharedFile.query.filter(SharedFile.owner_id == user_id, path_or_below(SharedFile.path, restore_path)) \
+		.delete(synchronize_session=False)
+	UserFavorites.query.filter(UserFavorites.user_id == user_id, path_or_below(UserFavorites.file_path, restore_path)) \
+		.delete(synchronize_session=False)
+
+	def target(rel_path):
+		return f"{restore_path}/{rel_path}" if rel_path else restore_path
+
+	shares = json.loads(trash.shares) if trash.shares else []
+	grantee_ids = {grantee_id for _, grantee_id, _ in shares}
+	existing = {row_id for row_id, in db.session.query(User.id).filter(User.id.in_(grantee_ids))} if grantee_ids else set()
+	for rel_path, grantee_id, is_folder in shares:
+		# Grantees removed in the meantime are dropped
+		if grantee_id in existing:
+			db.session.add(SharedFile(path=target(rel_path), is_folder=is_folder,
+			                          owner_id=user_id, shared_with_id=grantee_id))
+	for rel_path in json.loads(trash.favorites) if trash.favorites else []:
+		db.session.add(UserFavorites(user_id=user_id, file_path=target(rel_path)))
+
+
+def detach_collection_rows(trash):
+	"""Record the Collection rows at or below trash.original_path on the trash entry, relative to the item"""
+	db.session.flush()
+	path = trash.original_path
+	rows = Collection.query.filter(Collection.owner_id == trash.user_id, path_or_below(Collection.path, path))
+	trash.contents = json.dumps([
+		[
+			row.path[len(path) + 1:], bool(row.is_folder), row.size, row.mime_type, row.content_hash,
+			row.created_at.isoformat() if row.created_at else None,
+			row.modified_at.isoformat() if row.modified_at else None
+		] for row in rows
+	])
+
+
+def attach_collection_rows(trash, restore_path):
+	"""
+    Re-create the Collection rows recorded on a trash entry below restore_path, so the restored files
+    keep their content hashes. Entries trashed before rows were recorded are picked up by the next
+    listing of the parent instead, without hashes. The caller commits.
+    """
+	user_id = trash.user_id
+	# Rows left at the target by earlier out-of-band changes would collide; the target does not exist on disk
+	Collection.query.filter(Collection.owner_id == user_id, path_or_below(Collection.path, restore_path)) \
+		.delete(synchronize_session=False)
+	FolderIndex.query.filter(FolderIndex.owner_id == user_id, path_or_below(FolderIndex.path, restore_path)) \
+		.delete(synchronize_session=False)
+
+	for rel_path, is_folder, size, mime_type, content_hash, created_at, modified_at in json.loads(trash.contents):
+		path = f"{restore_path}/{rel_path}" if rel_path else restore_path
+		db.session.add(Collection(
+			path=path,
+			name=posixpath.basename(path),
+			is_folder=is_folder,
+			size=size,
+			mime_type=mime_type,
+			content_hash=content_hash,
+			created_at=datetime.fromisoformat(created_at) if created_at else None,
+			modified_at=datetime.fromisoformat(modified_at) if modified_at else None,
+			owner_id=user_id
+		))
+
+
+def apply_trash(user_id, path, journal):
+	"""Move a file or folder into the user's trash area under a unique key; returns the UserTrash id"""
+	path = check_owned_path(path, user_id)
+
+	full_path = os.path.join(get_user_collections_dir(user_id), path)
+	if not os.path.lexists(full_path):
+		raise CollectionOperationError('Item not found', 404)
+
+	trash_dir = get_user_trash_dir(user_id)
+	os.makedirs(trash_dir, exist_ok=True)
+	parent_full_path = os.path.dirname(full_path)
+	parent_mtime = get_dir_mtime(parent_full_path)
+
+	# Still counted in storage_used; the purge gives it back
+	trash = UserTrash(user_id=user_id, file_path=uuid.uuid4().hex, original_path=path, size=get_tree_size(full_path))
+	journal.rename(full_path, get_trash_item_path(trash))
+	db.session.add(trash)
+	# Shares and favorites go with the item, so nothing created at the same path later inherits them
+	detach_references(trash)
+	detach_collection_rows(trash)
+	remove_collection_rows(user_id, path)
+	journal.after_commit.append(lambda: invalidate_share_grants(user_id))
+	mark_folder_synced(user_id, posixpath.dirname(path), parent_full_path, parent_mtime)
+	db.session.flush()
+	return trash.id
+
+
+def apply_restore(user_id, trash_id, journal):
+	"""
+    Move a trashed item back to its original path, or next to it as 'name (n)' if that is taken.
+    Missing parent folders are recreated. Returns the path it was restored to.
+    """
+	trash = UserTrash.query.filter_by(id=trash_id, user_id=user_id).first()
+	if not trash:
+		raise CollectionOperationError('Trash item not found', 404)
+
+	stored_path = get_trash_item_path(trash)
+	if not os.path.lexists(stored_path):
+		raise CollectionOperationError('Trashed item is missing', 404)
 
-		# Get the parent directory path
-		parent_path = os.path.dirname(old_path)
+	user_dir = get_user_collections_dir(user_id)
+	original_path = check_owned_path(trash.original_path, user_id)
+	restore_path = find_free_path(user_dir, original_path)
+	restore_full_path = os.path.join(user_dir, restore_path)
+	os.makedirs(os.path.dirname(restore_full_path), exist_ok=True)
+	parent_full_path = os.path.dirname(restore_full_path)
+	parent_mtime = get_dir_mtime(parent_full_path)
+
+	journal.rename(stored_path, restore_full_path)
+	attach_references(trash, restore_path)
+	if trash.contents:
+		attach_collection_rows(trash, restore_path)
+		mark_folder_synced(user_id, posixpath.dirname(restore_path), parent_full_path, parent_mtime)
+	# Otherwise the parent's mtime changed, so its next listing picks the item up again
+	db.session.delete(trash)
+	journal.after_commit.append(lambda: invalidate_share_grants(user_id))
+	return restore_path
+
+
+def get_trash_items(user_id):
+	"""Trash listing entries, newest first; path is where the item will be restored to"""
+	items = []
+	for trash in UserTrash.query.filter_by(user_id=user_id).order_by(UserTrash.deleted_at.desc()):
+		try:
+			trash_stat = os.lstat(get_trash_item_path(trash))
+		except OSError:
+			continue
+		is_dir = stat.S_ISDIR(trash_stat.st_mode)
+		item = {
+			'id': trash.id,
+			'name': posixpath.basename(trash.original_path),
+			'path': trash.original_path,
+			'type': 'folder' if is_dir else 'file',
+			'isDir': is_dir,
+			'inTrash': True,
+			'createdTime': datetime.fromtimestamp(trash_stat.st_ctime).isoformat(),
+			'modifiedTime': datetime.fromtimestamp(trash_stat.st_mtime).isoformat(),
+			'deletedTime': trash.deleted_at.isoformat(),
+			'purgeTime': (trash.deleted_at + TRASH_RETENTION).isoformat()
+		}
+		if not is_dir:
+			item['size'] = trash_stat.st_size
+		items.append(item)
+	return items
+
+
+def release_blobs_by_inode(inodes):
+	"""Remove blobs among inodes that lost their last collection link, in one pass over the store; returns bytes freed"""
+	freed = 0
+	if not inodes:
+		return freed
+	for blob_path, blob_stat in iter_collection_files(BLOBS_ROOT):
+		if (blob_stat.st_dev, blob_stat.st_ino) in inodes and blob_stat.st_nlink == 1:
+			try:
+				remove_thumbnails(blob_path, blob_stat)
+				os.remove(blob_path)
+				freed += blob_stat.st_size
+			except OSError as e:
+				app.logger.error(f"Error releasing blob {blob_path}: {str(e)}")
+	return freed
 
-		# Construct new path
-		new_path = os.path.join(parent_path, new_name) if parent_path else new_name
-		new_full_path = os.path.join(user_dir, new_path)
 
-		# Verify old path exists
-		if not os.path.exists(old_full_path):
-			return jsonify({'error': 'Item not found'}), 404
+def purge_trash_items(items, linked_inodes=None):
+	"""
+    Permanently delete trash entries: their stored files first, then their rows in one DELETE (taking
+    the shares and favorites detached onto them along), then the blobs they were the last links to. The owners' storage_used drops in the same commit.
+    Returns (ids purged, bytes freed); entries whose files could not be removed are kept.
+    A caller purging many batches passes its own linked_inodes and releases them once at the end.
+    """
+	purged = []
+	freed = 0
+	release_now = linked_inodes is None
+	if release_now:
+		linked_inodes = set()
+	released = {}
+	for trash in items:
+		try:
+			stored_path = get_trash_item_path(trash)
+			# Entries trashed before sizes were recorded are measured now
+			size = trash.size if trash.size is not None else get_tree_size(stored_path)
+			freed += delete_tree(stored_path, linked_inodes)
+			purged.append(trash.id)
+			released[trash.user_id] = released.get(trash.user_id, 0) + size
+		except OSError as e:
+			app.logger.error(f"Could not purge trash item {trash.id}: {str(e)}")
+	if purged:
+		UserTrash.query.filter(UserTrash.id.in_(purged)).delete(synchronize_session=False)
+		for user_id, size in released.items():
+			adjust_storage_used(user_id, -size)
+		db.session.commit()
+	if release_now:
+		freed += release_blobs_by_inode(linked_inodes)
+	return purged, freed
 
-		# Check if new path already exists
-		if os.path.exists(new_full_path):
-			return jsonify({'error': 'An item with this name already exists'}), 409
 
-		# Perform the rename
+def purge_expired_trash(retention=None, user_id=None):
+	"""
+    Purge trash entries older than retention (TRASH_RETENTION by default), TRASH_PURGE_BATCH at a time.
+    Returns (items purged, bytes freed).
+    """
+	cutoff = datetime.utcnow() - (TRASH_RETENTION if retention is None else retention)
+	purged = freed = 0
+	failed = []
+	# Blobs are released in one walk of the store after the last batch, not one walk per batch
+	linked_inodes = set()
+	while True:
+		query = UserTrash.query.filter(UserTrash.deleted_at <= cutoff)
+		if user_id is not None:
+			query = query.filter(UserTrash.user_id == user_id)
+		if failed:
+			query = query.filter(UserTrash.id.notin_(failed))
+		batch = query.order_by(UserTrash.id).limit(TRASH_PURGE_BATCH).all()
+		if not batch:
+			break
+		batch_ids = [trash.id for trash in batch]
+		purged_ids, batch_freed = purge_trash_items(batch, linked_inodes)
+		failed.extend(trash_id for trash_id in batch_ids if trash_id not in purged_ids)
+		purged += len(purged_ids)
+		freed += batch_freed
+	freed += release_blobs_by_inode(linked_inodes)
+
+	if user_id is None:
+		# Deletions staged by requests that died before committing
+		cutoff_time = time.time() - BLOB_GC_GRACE
 		try:
-			os.rename(old_full_path, new_full_path)
+			staged = list(os.scandir(DELETE_STAGING_ROOT))
+		except FileNotFoundError:
+			staged = []
+		for entry in staged:
+			try:
+				if entry.stat(follow_symlinks=False).st_ctime < cutoff_time:
+					freed += delete_tree(entry.path)
+			except OSError as e:
+				app.logger.error(f"Could not remove staged item {entry.path}: {str(e)}")
 
-			# Update database records
-			collection = Collection.query.filter_by(path=old_path, owner_id=user_id).first()
-			if collection:
-				collection.path = new_path
-				collection.name = new_name
+	app.logger.info(f"Trash purge removed {purged} items, freed {freed} bytes")
+	return purged, freed
 
-				# If it's a folder, update paths of items inside
-				if collection.is_folder:
-					# Find all items that start with the old path
-					items = Collection.query.filter(
-						Collection.owner_id == user_id,
-						Collection.path.like(f"{old_path}/%")
-					).all()
 
-					for item in items:
-						# Replace old path prefix with new path
-						item.path = item.path.replace(old_path, new_path, 1)
+@app.cli.command('purge-trash')
+def purge_trash_command():
+	"""Permanently delete trash items past the retention period."""
+	purged, freed = purge_expired_trash()
+	print(f"Purged {purged} trash items ({freed} bytes freed)")
 
-				db.session.commit()
 
-			return jsonify({
-				'success': True,
-				'old_path': old_path,
-				'new_path': new_path
-			})
+def apply_favorite(user_id, path, value=None):
+	"""Set (value True/False) or toggle the favorite flag of one of the user's own paths; returns the new state"""
+	path = check_owned_path(path, user_id)
+	favorite = UserFavorites.query.filter_by(user_id=user_id, file_path=path).first()
+	if value is None:
+		value = favorite is None
+
+	if favorite and not value:
+		db.session.delete(favorite)
+	elif not favorite and value:
+		db.session.add(UserFavorites(user_id=user_id, file_path=path))
+	return value
+
+
+@app.route('/api/collections/rename', methods=['POST'])
+@login_required
+def rename_collection_item():
+	"""Rename a file or folder in the user's collections"""
+	try:
+		data = request.json
+		old_path = data.get('old_path')
+		new_name = data.get('new_name')
+		user_id = current_user.id
+
+		# Validate parameters
+		if not old_path or not new_name:
+			return jsonify({'error': 'Missing path or new name'}), 400
+
+		if not is_valid_filename(new_name) or new_name in ('.', '..'):
+			return jsonify({'error': 'Invalid name'}), 400
 
+		# Construct new path next to the old one
+		parent_path = os.path.dirname(old_path.strip('/'))
+		new_path = join_rel_path(parent_path, new_name)
+
+		journal = FileJournal()
+		try:
+			new_path = apply_rename(user_id, old_path, new_path, journal)
+			db.session.commit()
+		except CollectionOperationError as e:
+			db.session.rollback()
+			journal.rollback()
+			return jsonify({'error': str(e)}), e.status
 		except Exception as e:
 			db.session.rollback()
+			journal.rollback()
 			app.logger.error(f"Error renaming item: {str(e)}")
 			return jsonify({'error': f'Failed to rename item: {str(e)}'}), 500
+		journal.commit()
+
+		return jsonify({
+			'success': True,
+			'old_path': old_path,
+			'new_path': new_path
+		})
 
 	except Exception as e:
 		app.logger.error(f"Error in rename operation: {str(e)}")
@@ -2726,62 +5222,120 @@ def delete_collection_item():
 		if not path:
 			return jsonify({'error': 'Missing path'}), 400
 
-		if not is_safe_path(path):
-			return jsonify({'error': 'Invalid path'}), 400
-
-		# Verify ownership
-		if not verify_collection_ownership(path, user_id):
-			return jsonify({'error': 'Access denied'}), 403
-
-		# Get user's collections directory
-		user_dir = get_user_collections_dir(user_id)
-
-		# Construct full path
-		full_path = os.path.join(user_dir, path)
-
-		# Verify path exists
-		if not os.path.exists(full_path):
-			return jsonify({'error': 'Item not found'}), 404
-
-		# Delete the file or directory
+		journal = FileJournal()
 		try:
-			if os.path.isdir(full_path):
-				shutil.rmtree(full_path)
-			else:
-				os.remove(full_path)
-
-			# Delete database records
-			collection = Collection.query.filter_by(path=path, owner_id=user_id).first()
-			if collection:
-				db.session.delete(collection)
-
-				# If it's a folder, delete all items inside
-				if collection.is_folder:
-					items = Collection.query.filter(
-						Collection.owner_id == user_id,
-						Collection.path.like(f"{path}/%")
-					).all()
-
-					for item in items:
-						db.session.delete(item)
-
-				db.session.commit()
-
-			return jsonify({
-				'success': True,
-				'path': path
-			})
-
+			apply_delete(user_id, path, journal)
+			db.session.commit()
+		except CollectionOperationError as e:
+			db.session.rollback()
+			journal.rollback()
+			return jsonify({'error': str(e)}), e.status
 		except Exception as e:
 			db.session.rollback()
+			journal.rollback()
 			app.logger.error(f"Error deleting item: {str(e)}")
 			return jsonify({'error': f'Failed to delete item: {str(e)}'}), 500
+		journal.commit()
+
+		return jsonify({
+			'success': True,
+			'path': path
+		})
 
 	except Exception as e:
 		app.logger.error(f"Error in delete operation: {str(e)}")
 		return jsonify({'error': 'Internal server error'}), 500
 
 
+@app.route('/api/collections/bulk', methods=['POST'])
+@login_required
+def bulk_collection_operations():
+	"""
+    Apply many operations in one transaction:
+    {"operations": [{"op": "rename", "path": .., "new_name": ..}, {"op": "move", "path": .., "destination": ..},
+    {"op": "delete"|"trash", "path": ..}, {"op": "restore", "id": <trash id>},
+    {"op": "favorite", "path": .., "value": true|false|null}],
+    "atomic": false}
+    Operations run in order. A failing operation is reported in its result and skipped; with "atomic"
+    any failure discards the whole batch. Results come back in request order.
+    """
+	data = request.get_json(silent=True) or {}
+	operations = data.get('operations')
+	atomic = bool(data.get('atomic'))
+	user_id = current_user.id
+
+	if not isinstance(operations, list) or not operations:
+		return jsonify({'error': 'No operations provided'}), 400
+	if len(operations) > BULK_MAX_OPERATIONS:
+		return jsonify({'error': f'At most {BULK_MAX_OPERATIONS} operations per request'}), 400
+
+	# Validate ownership of every source and destination in one pass
+	paths = []
+	for operation in operations:
+		if isinstance(operation, dict):
+			paths.extend(value for value in (operation.get('path'), operation.get('destination'))
+			             if isinstance(value, str))
+	prefetch_collection_ownership(paths, user_id)
+
+	journal = FileJournal()
+	results = []
+	try:
+		for index, operation in enumerate(operations):
+			operation = operation if isinstance(operation, dict) else {}
+			kind = operation.get('op')
+			path = operation.get('path')
+			result = {'index': index, 'op': kind, 'path': path}
+			try:
+				if kind == 'rename':
+					new_name = operation.get('new_name')
+					if not isinstance(new_name, str) or not is_valid_filename(new_name) or new_name in ('.', '..'):
+						raise CollectionOperationError('Invalid name')
+					result['new_path'] = apply_rename(
+						user_id, path, join_rel_path(posixpath.dirname(str(path).strip('/')), new_name), journal)
+				elif kind == 'move':
+					destination = operation.get('destination')
+					if not isinstance(destination, str) or not is_safe_path(destination.strip('/')):
+						raise CollectionOperationError('Invalid destination')
+					if destination.strip('/') and not verify_collection_ownership(destination.strip('/'), user_id):
+						raise CollectionOperationError('Access denied', 403)
+					result['new_path'] = apply_rename(
+						user_id, path, join_rel_path(destination.strip('/'), posixpath.basename(str(path).strip('/'))),
+						journal)
+				elif kind == 'delete':
+					apply_delete(user_id, path, journal)
+				elif kind == 'trash':
+					result['trash_id'] = apply_trash(user_id, path, journal)
+				elif kind == 'restore':
+					result['new_path'] = apply_restore(user_id, operation.get('id'), journal)
+				elif kind == 'favorite':
+					value = operation.get('value')
+					if value is not None and not isinstance(value, bool):
+						raise CollectionOperationError('Invalid value')
+					result['is_favorite'] = apply_favorite(user_id, path, value)
+				else:
+					raise CollectionOperationError('Unknown operation')
+				result['success'] = True
+			except CollectionOperationError as e:
+				result.update({'success': False, 'error': str(e), 'status': e.status})
+			results.append(result)
+
+		failed = sum(1 for result in results if not result['success'])
+		if atomic and failed:
+			db.session.rollback()
+			journal.rollback()
+			return jsonify({'success': False, 'committed': False, 'results': results}), 409
+
+		db.session.commit()
+	except Exception as e:
+		db.session.rollback()
+		journal.rollback()
+		app.logger.error(f"Error in bulk operation: {str(e)}")
+		return jsonify({'error': f'Bulk operation failed, nothing was changed: {str(e)}'}), 500
+	journal.commit()
+
+	return jsonify({'success': failed == 0, 'committed': True, 'results': results})
+
+
 @app.route('/api/collections/share', methods=['POST'])
 @login_required
 def share_collection_item():
@@ -2856,9 +5410,16 @@ def share_collection_item():
 			db.session.add(share)
 			shared_with.append(username)
 
+		# Shows up in the grantee's recent feed
+		log_activity(user.id, 'share', current_user.id, path, actor_id=current_user.id)
+
+	if shared_with:
+		log_activity(current_user.id, 'share', current_user.id, path)
+
 	# Commit changes to database
 	try:
 		db.session.commit()
+		invalidate_share_grants(current_user.id)
 		return jsonify({
 			'success': True,
 			'message': f'Shared with {len(shared_with)} users',
@@ -2882,16 +5443,10 @@ def toggle_favorite():
 	if not file_path:
 		return jsonify({'success': False, 'error': 'No path provided'})
 
-	favorite = UserFavorites.query.filter_by(user_id=current_user.id, file_path=file_path).first()
-
-	if favorite:
-		db.session.delete(favorite)
-		is_favorite = False
-	else:
-		favorite = UserFavorites(user_id=current_user.id, file_path=file_path)
-		db.session.add(favorite)
-		is_favorite = True
-
+	try:
+		is_favorite = apply_favorite(current_user.id, file_path)
+	except CollectionOperationError as e:
+		return jsonify({'success': False, 'error': str(e)}), e.status
 	db.session.commit()
 	return jsonify({'success': True, 'is_favorite': is_favorite})
 
@@ -2905,44 +5460,86 @@ def move_to_trash():
 	if not file_path:
 		return jsonify({'success': False, 'error': 'No path provided'})
 
-	# Move file to trash
-	trash_item = UserTrash(
-		user_id=current_user.id,
-		file_path=os.path.join('trash', os.path.basename(file_path)),
-		original_path=file_path
-	)
-	db.session.add(trash_item)
-	db.session.commit()
+	journal = FileJournal()
+	try:
+		trash_id = apply_trash(current_user.id, file_path, journal)
+		db.session.commit()
+	except CollectionOperationError as e:
+		db.session.rollback()
+		journal.rollback()
+		return jsonify({'success': False, 'error': str(e)}), e.status
+	except Exception as e:
+		db.session.rollback()
+		journal.rollback()
+		app.logger.error(f"Error moving {file_path} to trash: {str(e)}")
+		return jsonify({'success': False, 'error': 'Failed to move item to trash'}), 500
+	journal.commit()
 
-	# Move the actual file
-	trash_dir = os.path.join(COLLECTIONS_ROOT, 'trash')
-	os.makedirs(trash_dir, exist_ok=True)
-	shutil.move(
-		os.path.join(COLLECTIONS_ROOT, file_path),
-		os.path.join(trash_dir, os.path.basename(file_path))
-	)
+	return jsonify({'success': True, 'id': trash_id})
 
-	return jsonify({'success': True})
+
+@app.route('/api/collections/trash/restore', methods=['POST'])
+@login_required
+def restore_from_trash():
+	data = request.get_json(silent=True) or {}
+	trash_id = data.get('id')
+
+	if not isinstance(trash_id, int):
+		return jsonify({'success': False, 'error': 'No trash item provided'}), 400
+
+	journal = FileJournal()
+	try:
+		path = apply_restore(current_user.id, trash_id, journal)
+		db.session.commit()
+	except CollectionOperationError as e:
+		db.session.rollback()
+		journal.rollback()
+		return jsonify({'success': False, 'error': str(e)}), e.status
+	except Exception as e:
+		db.session.rollback()
+		journal.rollback()
+		app.logger.error(f"Error restoring trash item {trash_id}: {str(e)}")
+		return jsonify({'success': False, 'error': 'Failed to restore item'}), 500
+	journal.commit()
+
+	return jsonify({'success': True, 'path': path})
+
+
+@app.route('/api/collections/trash/<int:trash_id>', methods=['DELETE'])
+@login_required
+def delete_from_trash(trash_id):
+	"""Permanently delete one trash item"""
+	trash = UserTrash.query.filter_by(id=trash_id, user_id=current_user.id).first()
+	if not trash:
+		return jsonify({'success': False, 'error': 'Trash item not found'}), 404
+
+	purged, freed = purge_trash_items([trash])
+	if not purged:
+		return jsonify({'success': False, 'error': 'Failed to delete item'}), 500
+	return jsonify({'success': True, 'freed': freed})
+
+
+@app.route('/api/collections/trash/empty', methods=['POST'])
+@login_required
+def empty_trash():
+	"""Permanently delete everything in the user's trash"""
+	purged, freed = purge_expired_trash(retention=timedelta(0), user_id=current_user.id)
+	return jsonify({'success': True, 'purged': purged, 'freed': freed})
 
 
 @app.route('/api/collections/list/<category>')
 @login_required
 def list_collections_by_category(category):
 	if category == 'recent':
-		# Get recently modified files
-		items = get_collection_items(
-			current_user.collections_path,
-			sort_by='modified',
-			limit=50
-		)
+		# Latest activity: uploads, opens, edits and shares with this user
+		items, _ = get_recent_feed(current_user.id, 50)
 	elif category == 'favorites':
 		# Get favorited files
 		favorites = UserFavorites.query.filter_by(user_id=current_user.id).all()
 		items = [get_file_info(f.file_path, current_user.id) for f in favorites]
 	elif category == 'trash':
-		# Get files in trash
-		trash_items = UserTrash.query.filter_by(user_id=current_user.id).all()
-		items = [get_file_info(f.file_path, current_user.id) for f in trash_items]
+		# Get items in the user's trash area
+		items = get_trash_items(current_user.id)
 	elif category == 'permitted':
 		# Get files shared with the user
 		items = get_shared_items(current_user.id)
@@ -3029,65 +5626,71 @@ def get_shared_items(user_id):
 	"""
 	Get files shared with the user
 
-	Returns a list of dictionaries, each containing information about a shared file
+	Returns a list of dictionaries, each containing information about a shared file.
+	Shares, owners and matching collection rows come from one joined query and every
+	shared path costs a single stat call.
 	"""
 	try:
-		# Get files shared with the user
-		shared_files = SharedFile.query.filter_by(shared_with_id=user_id).all()
+		rows = db.session.query(SharedFile, User.username, Collection).join(
+			User, User.id == SharedFile.owner_id
+		).outerjoin(
+			Collection, db.and_(Collection.owner_id == SharedFile.owner_id, Collection.path == SharedFile.path)
+		).filter(
+			SharedFile.shared_with_id == user_id
+		).order_by(SharedFile.id).all()
 
 		items = []
-		for shared in shared_files:
+		seen_shares = set()
+		owner_dirs = {}
+		for shared, owner_name, collection in rows:
+			# Duplicate collection rows for one path would repeat the share
+			if shared.id in seen_shares:
+				continue
+			seen_shares.add(shared.id)
+
 			try:
-				# Get the owner's username
-				owner = User.query.get(shared.owner_id)
-				if not owner:
-					app.logger.warning(
-						f"Owner not found for shared file: {shared.path}, owner_id: {shared.owner_id}")
-					continue
+				if shared.owner_id not in owner_dirs:
+					owner_dirs[shared.owner_id] = get_user_collections_dir(shared.owner_id)
+				owner_path = os.path.join(owner_dirs[shared.owner_id], shared.path.lstrip('/'))
 
 				# For files, check if they exist in the owner's directory
-				owner_path = os.path.join(get_user_collections_dir(shared.owner_id), shared.path.lstrip('/'))
-
-				if not os.path.exists(owner_path):
+				try:
+					file_stat = os.stat(owner_path)
+				except OSError:
 					app.logger.warning(f"Shared file not found: {owner_path}")
 					continue
 
-				# Check if there's a collection entry
-				collection = Collection.query.filter_by(path=shared.path, owner_id=shared.owner_id).first()
-
 				if collection:
 					# Use the collection entry
 					item_dict = collection.to_dict()
-					item_dict['owner_id'] = shared.owner_id
-					item_dict['owner_id'] = shared.owner_id
 				else:
 					# Create a dictionary with file information
-					is_dir = os.path.isdir(owner_path)
+					is_dir = stat.S_ISDIR(file_stat.st_mode)
 					filename = os.path.basename(shared.path)
 
 					item_dict = {
 						'name': filename,
 						'path': shared.path,
-							'owner_id': shared.owner_id,
-						'owner_id': shared.owner_id,
 						'type': 'folder' if is_dir else 'file',
 						'isDir': is_dir,
-						'createdTime': datetime.fromtimestamp(os.path.getctime(owner_path)).isoformat(),
-                                'modifiedTime': datetime.fromtimestamp(os.path.getmtime(owner_path)).isoformat()
+						'createdTime': datetime.fromtimestamp(file_stat.st_ctime).isoformat(),
+						'modifiedTime': datetime.fromtimestamp(file_stat.st_mtime).isoformat()
 					}
 
 					# Add size for files
 					if not is_dir:
-						item_dict['size'] = os.path.getsize(owner_path)
+						item_dict['size'] = file_stat.st_size
+						item_dict['version'] = get_file_version(
+							file_stat.st_size, datetime.fromtimestamp(file_stat.st_mtime))
 
 						# Mark as image if it's an image file
 						if is_image_file(filename):
 							item_dict['isImage'] = True
 
 				# Add owner information
-				item_dict['shared_by'] = owner.username
+				item_dict['shared_by'] = owner_name
 				item_dict['owner_id'] = shared.owner_id
-				items.append(item_dict)
+				items.append(add_signed_urls(item_dict, shared.owner_id))
 
 			except Exception as e:
 				app.logger.error(f"Error processing shared file {shared.path}: {str(e)}")
@@ -3152,6 +5755,13 @@ def get_collection_file_query():
 
 
 if __name__ == '__main__':
+	# Periodic maintenance
+	start_maintenance_job('thumbnail-gc', THUMBNAIL_GC_INTERVAL, collect_thumbnail_garbage)
+	start_maintenance_job('blob-gc', BLOB_GC_INTERVAL, collect_blob_garbage)
+	start_maintenance_job('trash-purge', TRASH_PURGE_INTERVAL, purge_expired_trash)
+	start_maintenance_job('activity-trim', ACTIVITY_TRIM_INTERVAL, trim_activity_log)
+	start_maintenance_job('storage-reconcile', STORAGE_RECONCILE_INTERVAL, reconcile_storage_usage)
+
 	# Get port from environment variable or default to 5000
 	port = int(os.environ.get('PORT', 5000))
 	# Run in production mode, bind to all interfaces
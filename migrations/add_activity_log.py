@@ -0,0 +1,44 @@
+import os
+import sys
+
+# Add the parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+# Import Flask app and database objects
+from main import app, db, Activity, Collection, SharedFile
+from sqlalchemy import literal, select
+
+
+def migrate():
+    """Create the activity table and seed the recent feed from existing uploads and shares."""
+    with app.app_context():
+        db.create_all()
+
+        if Activity.query.first() is not None:
+            print("Activity log already populated, skipping backfill")
+            return
+
+        # One 'upload' entry per existing file, dated by its modification time
+        uploads = db.session.execute(Activity.__table__.insert().from_select(
+            ['user_id', 'actor_id', 'owner_id', 'path', 'action', 'created_at'],
+            select(Collection.owner_id, Collection.owner_id, Collection.owner_id, Collection.path,
+                   literal('upload'), db.func.coalesce(Collection.modified_at, Collection.created_at, db.func.current_timestamp()))
+            .where(Collection.is_folder == False)
+        ))
+        print(f"Backfilled {uploads.rowcount} upload entries")
+
+        # One 'share' entry in every grantee's feed
+        shares = db.session.execute(Activity.__table__.insert().from_select(
+            ['user_id', 'actor_id', 'owner_id', 'path', 'action', 'created_at'],
+            select(SharedFile.shared_with_id, SharedFile.owner_id, SharedFile.owner_id, SharedFile.path,
+                   literal('share'), db.func.coalesce(SharedFile.created_at, db.func.current_timestamp()))
+        ))
+        print(f"Backfilled {shares.rowcount} share entries")
+
+        db.session.commit()
+        print("Migration completed successfully!")
+
+if __name__ == "__main__":
+    print(f"Running database migration...")
+    migrate()
@@ -0,0 +1,27 @@
+import os
+import sys
+
+# Add the parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+# Import Flask app and database objects
+from main import app, db
+from sqlalchemy import inspect, text
+
+def migrate():
+    """Add Collection.content_hash for the content-addressed blob store."""
+    with app.app_context():
+        columns = [column['name'] for column in inspect(db.engine).get_columns('collection')]
+        if 'content_hash' not in columns:
+            db.session.execute(text("ALTER TABLE collection ADD COLUMN content_hash VARCHAR(64)"))
+            db.session.commit()
+            print("Added collection.content_hash")
+
+        # Existing files stay where they are until moved into the store
+        print("Run 'flask --app main dedup-collections' to deduplicate files uploaded before this migration")
+        print("Migration completed successfully!")
+
+if __name__ == "__main__":
+    print(f"Running database migration...")
+    migrate()
@@ -0,0 +1,40 @@
+import os
+import sys
+
+# Add the parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+# Import Flask app and database objects
+from main import app, db, Collection
+from sqlalchemy import inspect, text
+
+def migrate():
+    """Add Collection.parent_path and the folder_index table used by the listing index."""
+    with app.app_context():
+        # Creates folder_index (and any other missing table)
+        db.create_all()
+
+        columns = [column['name'] for column in inspect(db.engine).get_columns('collection')]
+        if 'parent_path' not in columns:
+            db.session.execute(text("ALTER TABLE collection ADD COLUMN parent_path VARCHAR(255)"))
+            db.session.commit()
+            print("Added collection.parent_path")
+
+        # Backfill parent_path for rows created before the column existed
+        backfilled = 0
+        for row in Collection.query.filter(Collection.parent_path.is_(None)).yield_per(1000):
+            row.path = row.path  # the path validator derives parent_path
+            backfilled += 1
+        db.session.commit()
+        print(f"Backfilled parent_path for {backfilled} rows")
+
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_collection_owner_parent ON collection (owner_id, parent_path)"
+        ))
+        db.session.commit()
+        print("Migration completed successfully!")
+
+if __name__ == "__main__":
+    print(f"Running database migration...")
+    migrate()
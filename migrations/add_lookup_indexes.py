@@ -0,0 +1,75 @@
+import os
+import sys
+
+# Add the parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+# Import Flask app and database objects
+from main import app, db
+from sqlalchemy import text
+
+# (name, table, columns, unique) - kept in sync with the __table_args__ of the models in main.py
+INDEXES = [
+    ('uq_collection_owner_path', 'collection', ('owner_id', 'path'), True),
+    ('ix_collection_owner_parent', 'collection', ('owner_id', 'parent_path'), False),
+    ('uq_shared_file_owner_grantee_path', 'shared_file', ('owner_id', 'shared_with_id', 'path'), True),
+    ('ix_shared_file_grantee_path', 'shared_file', ('shared_with_id', 'path'), False),
+    ('uq_user_favorites_user_path', 'user_favorites', ('user_id', 'file_path'), True),
+    ('ix_user_trash_user', 'user_trash', ('user_id',), False),
+    ('uq_user_reset_token', 'user', ('reset_token',), True),
+]
+
+# Tables whose rows must be deduplicated before a unique index can be built
+DEDUPLICATE = [
+    ('collection', ('owner_id', 'path')),
+    ('shared_file', ('owner_id', 'shared_with_id', 'path')),
+    ('user_favorites', ('user_id', 'file_path')),
+]
+
+
+def _quote(name):
+    return db.engine.dialect.identifier_preparer.quote(name)
+
+
+def remove_duplicates():
+    """Keep the oldest row of every duplicate group so unique indexes can be created."""
+    for table, columns in DEDUPLICATE:
+        group_by = ', '.join(_quote(column) for column in columns)
+        result = db.session.execute(text(
+            f"DELETE FROM {_quote(table)} WHERE id NOT IN "
+            f"(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM {_quote(table)} GROUP BY {group_by}) AS keep)"
+        ))
+        if result.rowcount:
+            print(f"Removed {result.rowcount} duplicate rows from {table}")
+    db.session.commit()
+
+
+def create_indexes():
+    for name, table, columns, unique in INDEXES:
+        db.session.execute(text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {_quote(name)} "
+            f"ON {_quote(table)} ({', '.join(_quote(column) for column in columns)})"
+        ))
+        print(f"Index {name} on {table} verified")
+    db.session.commit()
+
+
+def drop_indexes():
+    """Used by benchmarks/index_query_plans.py to measure the unindexed baseline."""
+    for name, _, _, _ in INDEXES:
+        db.session.execute(text(f"DROP INDEX IF EXISTS {_quote(name)}"))
+    db.session.commit()
+
+
+def migrate():
+    """Add composite indexes and unique constraints for the hot lookup columns."""
+    with app.app_context():
+        db.create_all()
+        remove_duplicates()
+        create_indexes()
+        print("Migration completed successfully!")
+
+if __name__ == "__main__":
+    print(f"Running database migration...")
+    migrate()
@@ -0,0 +1,36 @@
+import os
+import sys
+
+# Add the parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+# Import Flask app and database objects
+from main import app, db, reconcile_storage_usage
+from sqlalchemy import inspect, text
+
+COLUMNS = [
+    ('user', 'storage_used', 'BIGINT NOT NULL DEFAULT 0'),
+    ('user', 'storage_checked_at', 'TIMESTAMP'),
+    ('user_trash', 'size', 'BIGINT'),
+]
+
+
+def migrate():
+    """Add the per-user storage counters and fill them from disk."""
+    with app.app_context():
+        inspector = inspect(db.engine)
+        for table, column, definition in COLUMNS:
+            if column not in [existing['name'] for existing in inspector.get_columns(table)]:
+                quoted_table = db.engine.dialect.identifier_preparer.quote(table)
+                db.session.execute(text(f"ALTER TABLE {quoted_table} ADD COLUMN {column} {definition}"))
+                db.session.commit()
+                print(f"Added {table}.{column}")
+
+        drift = reconcile_storage_usage()
+        print(f"Computed storage usage from disk, {len(drift)} counters changed")
+        print("Migration completed successfully!")
+
+if __name__ == "__main__":
+    print(f"Running database migration...")
+    migrate()
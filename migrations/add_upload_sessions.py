@@ -0,0 +1,28 @@
+import os
+import sys
+
+# Add the parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+# Import Flask app and database objects
+from main import app, db
+from sqlalchemy import text
+
+def migrate():
+    """Create the upload_session table and widen collection.size for multi-GB files."""
+    with app.app_context():
+        db.create_all()
+        print("Database tables created or verified")
+
+        # SQLite integers are already 64-bit; PostgreSQL needs the column widened
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text("ALTER TABLE collection ALTER COLUMN size TYPE BIGINT"))
+            db.session.commit()
+            print("Widened collection.size to BIGINT")
+
+        print("Migration completed successfully!")
+
+if __name__ == "__main__":
+    print(f"Running database migration...")
+    migrate()
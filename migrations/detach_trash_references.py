@@ -0,0 +1,42 @@
+import os
+import sys
+
+# Add the parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+# Import Flask app and database objects
+from main import app, db, UserTrash, detach_references
+from sqlalchemy import inspect, text
+
+COLUMNS = [
+    ('user_trash', 'shares', 'TEXT'),
+    ('user_trash', 'favorites', 'TEXT'),
+    ('user_trash', 'contents', 'TEXT'),
+]
+
+
+def migrate():
+    """Move the shares and favorites of trashed items off their original paths onto the trash entries."""
+    with app.app_context():
+        inspector = inspect(db.engine)
+        for table, column, definition in COLUMNS:
+            if column not in [existing['name'] for existing in inspector.get_columns(table)]:
+                db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+                db.session.commit()
+                print(f"Added {table}.{column}")
+
+        # Oldest first: a row belongs to the earliest item trashed after it was created, anything newer
+        # than the last trash of a path was made for what lives there now and stays
+        detached = 0
+        for trash in UserTrash.query.filter(UserTrash.shares.is_(None)).order_by(UserTrash.deleted_at).all():
+            detach_references(trash, created_before=trash.deleted_at)
+            detached += 1
+        db.session.commit()
+        # Collection rows of items already in the trash are gone; restoring them falls back to a rescan
+        print(f"Detached shares and favorites of {detached} trash items")
+        print("Migration completed successfully!")
+
+if __name__ == "__main__":
+    print(f"Running database migration...")
+    migrate()
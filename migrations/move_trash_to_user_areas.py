@@ -0,0 +1,49 @@
+import os
+import sys
+import uuid
+
+# Add the parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+# Import Flask app and database objects
+from main import app, db, UserTrash, COLLECTIONS_ROOT, get_user_collections_dir, get_user_trash_dir
+
+def migrate():
+    """Move trash entries stored as 'trash/<name>' into the per-user trash areas under unique keys."""
+    with app.app_context():
+        moved = missing = 0
+        for trash in UserTrash.query.filter(UserTrash.file_path.like('%/%')).all():
+            # Entries lived in the user's own trash folder, or in the old shared COLLECTIONS_ROOT/trash
+            candidates = [
+                os.path.join(get_user_collections_dir(trash.user_id), trash.file_path),
+                os.path.join(COLLECTIONS_ROOT, trash.file_path)
+            ]
+            source = next((path for path in candidates if os.path.lexists(path)), None)
+            if source is None:
+                missing += 1
+                continue
+
+            storage_key = uuid.uuid4().hex
+            os.makedirs(get_user_trash_dir(trash.user_id), exist_ok=True)
+            os.rename(source, os.path.join(get_user_trash_dir(trash.user_id), storage_key))
+            trash.file_path = storage_key
+            moved += 1
+        db.session.commit()
+        print(f"Moved {moved} trash items, {missing} had no file left (they are dropped by the next purge)")
+
+        # Remove the old trash folders once they are empty
+        old_dirs = [os.path.join(COLLECTIONS_ROOT, 'trash')] + [
+            os.path.join(COLLECTIONS_ROOT, name, 'trash') for name in os.listdir(COLLECTIONS_ROOT) if name.isdigit()
+        ]
+        for old_dir in old_dirs:
+            try:
+                os.rmdir(old_dir)
+                print(f"Removed {old_dir}")
+            except OSError:
+                pass
+        print("Migration completed successfully!")
+
+if __name__ == "__main__":
+    print(f"Running database migration...")
+    migrate()
@@ -255,8 +255,8 @@ function loadCollections() {
         .then(data => {
             console.log('Collections data received:', data);
             
-            // Store collections
-            collections = data;
+            // Store collections (listings come wrapped with their paging cursor)
+            collections = Array.isArray(data) ? data : (data.collections || []);
             
             // Sort collections
             sortCollections();
@@ -485,7 +485,7 @@ function displayCollections(collectionsData) {
                     <div class="spinner"></div>
                 </div>
                 <img 
-                    src="${getFileUrl(item.path, item.owner_id)}" 
+                    src="${item.signedPreview || getFileUrl(item.path, item.owner_id)}" 
                     alt="${item.name}" 
                     loading="lazy"
                     onload="this.parentNode.querySelector('.thumbnail-loading')?.remove()"
@@ -630,6 +630,29 @@ function displayCollections(collectionsData) {
                     action: () => analyzeImage(item.path)
                 });
             }
+        } else {
+            menuOptions.push({
+                icon: 'fas fa-file-archive',
+                text: 'Download as ZIP',
+                action: () => downloadFolder(item.path, item.owner_id)
+            });
+        }
+
+        // Items in the trash can only be restored or deleted for good
+        if (item.inTrash) {
+            menuOptions.splice(0, menuOptions.length,
+                {
+                    icon: 'fas fa-undo',
+                    text: 'Restore',
+                    action: () => trashRequest('/api/collections/trash/restore', 'POST', { id: item.id })
+                },
+                {
+                    icon: 'fas fa-trash',
+                    text: 'Delete permanently',
+                    action: () => confirm(`Permanently delete ${item.name}?`) &&
+                        trashRequest(`/api/collections/trash/${item.id}`, 'DELETE')
+                }
+            );
         }
         
         // Create menu items
@@ -803,6 +826,34 @@ function deleteItem(path, name, isFolder) {
     });
 }
 
+// Restore or permanently delete a trash item, then reload the trash view
+function trashRequest(url, method, body = null) {
+    fetch(url, {
+        method: method,
+        headers: { 'Content-Type': 'application/json' },
+        body: body ? JSON.stringify(body) : null
+    })
+    .then(response => response.json().then(data => {
+        if (!response.ok || !data.success) {
+            throw new Error(data.error || 'Request failed');
+        }
+        loadCollections();
+    }))
+    .catch(error => {
+        console.error('Trash request failed:', error);
+        alert('Failed: ' + error.message);
+    });
+}
+
+// Download a folder as a ZIP streamed by the server
+function downloadFolder(path, ownerId = null) {
+    let url = `/api/collections/download?path=${encodeURIComponent(path)}`;
+    if (ownerId) {
+        url += `&owner_id=${ownerId}`;
+    }
+    window.location.href = url;
+}
+
 // Download item
 function downloadItem(path, name, ownerId = null) {
     console.log('Downloading item:', path);
@@ -1411,5 +1462,6 @@ window.previewImage = previewImage;
 window.shareItem = shareItem;
 window.deleteItem = deleteItem;
 window.downloadItem = downloadItem;
+window.downloadFolder = downloadFolder;
 window.openFolderModal = openFolderModal;
 window.createFolder = createFolder;